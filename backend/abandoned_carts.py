@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Abandoned cart report for DE---NINE Art Store
+Prints a JSON report of open carts by age and theme, and the size of the
+cart collection. With --delete-older-than-days it also deletes carts idle
+that long, in throttled batches. Progress goes to stderr, the report to stdout.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from cart_analytics import CART_COLLECTIONS, analyze_carts
+
+# Database configuration
+MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+DB_NAME = os.environ.get("DB_NAME", "denine_artstore")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--store", choices=sorted(CART_COLLECTIONS), default=os.environ.get("CART_STORE", "lines"),
+                        help="cart storage layout (default: CART_STORE or lines)")
+    parser.add_argument("--abandoned-after-hours", type=float, default=24,
+                        help="idle time after which a cart counts as abandoned (default: 24)")
+    parser.add_argument("--delete-older-than-days", type=float,
+                        help="delete carts idle for at least this many days")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="count the carts that would be deleted without deleting them")
+    parser.add_argument("--batch-size", type=int, default=500,
+                        help="carts read per batch and deleted per statement (default: 500)")
+    parser.add_argument("--pause", type=float, default=0.5,
+                        help="seconds to wait between delete batches (default: 0.5)")
+    return parser.parse_args(argv)
+
+async def report(args):
+    """Build the report and run the optional cleanup"""
+    try:
+        client = AsyncIOMotorClient(MONGO_URL)
+        db = client[DB_NAME]
+
+        print(f"Connected to MongoDB: {DB_NAME}", file=sys.stderr)
+
+        now = datetime.utcnow()
+        delete_before = None
+        if args.delete_older_than_days is not None:
+            delete_before = now - timedelta(days=args.delete_older_than_days)
+            action = "Counting" if args.dry_run else "Deleting"
+            print(f"{action} carts idle since {delete_before.isoformat()}Z", file=sys.stderr)
+
+        result = await analyze_carts(
+            db,
+            layout=args.store,
+            now=now,
+            abandoned_after=timedelta(hours=args.abandoned_after_hours),
+            delete_before=delete_before,
+            dry_run=args.dry_run,
+            batch_size=args.batch_size,
+            pause=args.pause
+        )
+        json.dump(result, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+
+        client.close()
+
+    except Exception as e:
+        print(f"Error building abandoned cart report: {str(e)}", file=sys.stderr)
+        raise
+
+if __name__ == "__main__":
+    asyncio.run(report(parse_args()))
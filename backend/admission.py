@@ -0,0 +1,189 @@
+"""
+Admission control for DE---NINE Art Store
+Assigns requests to route classes, each with its own concurrency limit and a
+short bounded wait queue. Excess load is shed with 503 instead of piling up
+on MongoDB, and limits adapt to observed latency (AIMD).
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, Optional
+
+from starlette.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class ClassConfig:
+    limit: int  # Initial concurrency limit
+    min_limit: int
+    max_limit: int
+    max_queue: int  # Waiters allowed beyond the limit
+    queue_timeout: float  # Seconds a request may wait for a slot
+    target_latency: float  # Seconds; above this the limit shrinks
+
+DEFAULT_CLASSES: Dict[str, ClassConfig] = {
+    "catalog": ClassConfig(limit=64, min_limit=8, max_limit=256, max_queue=256, queue_timeout=0.5, target_latency=0.1),
+    "cart_write": ClassConfig(limit=32, min_limit=4, max_limit=128, max_queue=64, queue_timeout=1.0, target_latency=0.25),
+    "checkout": ClassConfig(limit=8, min_limit=2, max_limit=32, max_queue=16, queue_timeout=2.0, target_latency=1.5),
+    "admin": ClassConfig(limit=4, min_limit=1, max_limit=16, max_queue=16, queue_timeout=5.0, target_latency=2.0),
+    "default": ClassConfig(limit=32, min_limit=4, max_limit=128, max_queue=64, queue_timeout=1.0, target_latency=0.25),
+}
+
+# Middleware instances are built lazily by Starlette; the registry lets
+# endpoints report their stats.
+admission_registry = []
+
+# Paths that must always be admitted (load balancer probes)
+EXEMPT_PATHS = ("/api/health",)
+
+def classify_request(method: str, path: str) -> Optional[str]:
+    """Map a request to its admission class, or None to bypass admission"""
+    if path in EXEMPT_PATHS or not path.startswith("/api"):
+        return None
+    if path.startswith("/api/admin"):
+        return "admin"
+    if path.startswith(("/api/payments", "/api/webhook")):
+        return "checkout"
+    if path.startswith("/api/cart"):
+        return "cart_write" if method != "GET" else "default"
+    if method == "GET" and path.startswith(("/api/prints", "/api/images", "/api/pages")):
+        return "catalog"
+    return "default"
+
+class AdmissionClass:
+    """Concurrency limiter with a bounded FIFO queue and AIMD limit"""
+
+    # Limits are re-evaluated after this many completed requests
+    WINDOW = 50
+
+    def __init__(self, name: str, config: ClassConfig):
+        self.name = name
+        self.config = config
+        self.limit = config.limit
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+        self._window_count = 0
+        self._window_latency = 0.0
+        self._window_saturated = False
+
+        self.admitted = 0
+        self.shed = 0
+
+    async def acquire(self) -> bool:
+        """Wait for a slot; False means the request should be shed"""
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return True
+
+        self._window_saturated = True
+        if len(self._waiters) >= self.config.max_queue:
+            self.shed += 1
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.config.queue_timeout)
+        except asyncio.TimeoutError:
+            # The slot may have been handed over as the timeout fired
+            if waiter.done() and not waiter.cancelled():
+                self.release(None)
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            self.shed += 1
+            return False
+
+        # release() transferred its slot to this waiter
+        self.admitted += 1
+        return True
+
+    def release(self, latency: Optional[float]):
+        if latency is not None:
+            self._record(latency)
+
+        while self._waiters and self.in_flight <= self.limit:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def _record(self, latency: float):
+        self._window_count += 1
+        self._window_latency += latency
+        if self._window_count < self.WINDOW:
+            return
+
+        average = self._window_latency / self._window_count
+        if average > self.config.target_latency:
+            self.limit = max(self.config.min_limit, int(self.limit * 0.8))
+        elif self._window_saturated:
+            self.limit = min(self.config.max_limit, self.limit + 1)
+
+        self._window_count = 0
+        self._window_latency = 0.0
+        self._window_saturated = False
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "admitted": self.admitted,
+            "shed": self.shed,
+        }
+
+class AdmissionControlMiddleware:
+    """ASGI middleware applying per-class admission control"""
+
+    def __init__(
+        self,
+        app,
+        classes: Dict[str, ClassConfig] = None,
+        classify: Callable[[str, str], Optional[str]] = classify_request
+    ):
+        self.app = app
+        self.classify = classify
+        self.classes = {
+            name: AdmissionClass(name, config)
+            for name, config in (classes or DEFAULT_CLASSES).items()
+        }
+        self.enabled = os.environ.get("ADMISSION_CONTROL_ENABLED", "true").lower() in ("1", "true")
+        admission_registry.append(self)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        class_name = self.classify(scope["method"], scope["path"])
+        admission_class = self.classes.get(class_name) if class_name else None
+        if admission_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not await admission_class.acquire():
+            logger.warning("Shedding %s %s (class %s)", scope["method"], scope["path"], class_name)
+            response = JSONResponse(
+                {"detail": "Server is busy, please retry shortly"},
+                status_code=503,
+                headers={"Retry-After": "1"}
+            )
+            await response(scope, receive, send)
+            return
+
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            admission_class.release(time.monotonic() - started)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {name: admission_class.stats() for name, admission_class in self.classes.items()}
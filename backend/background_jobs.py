@@ -0,0 +1,94 @@
+"""
+Background jobs for DE---NINE Art Store
+Runs work off the request path as tracked asyncio tasks with retry and
+exponential backoff. Jobs in flight are drained when the app shuts down.
+"""
+
+import asyncio
+import logging
+import random
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class BackgroundJobs:
+    """Tracks fire-and-forget jobs so they can be deduplicated and drained"""
+
+    def __init__(self, max_attempts: int = 5, base_delay: float = 0.5, max_delay: float = 30.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._tasks: set = set()
+        self._keyed: Dict[str, asyncio.Task] = {}
+        self._accepting = True
+
+        self.succeeded = 0
+        self.failed = 0
+
+    def submit(
+        self,
+        name: str,
+        func: Callable[..., Awaitable[Any]],
+        *args,
+        key: Optional[str] = None,
+        max_attempts: Optional[int] = None
+    ) -> Optional[asyncio.Task]:
+        """Schedule func(*args); a job with the same key in flight is reused"""
+        if not self._accepting:
+            logger.warning("Rejecting job %s submitted during shutdown", name)
+            return None
+
+        if key and key in self._keyed:
+            return self._keyed[key]
+
+        task = asyncio.create_task(self._run(name, func, args, max_attempts or self.max_attempts))
+        self._tasks.add(task)
+        if key:
+            self._keyed[key] = task
+
+        def forget(finished):
+            self._tasks.discard(finished)
+            if key and self._keyed.get(key) is finished:
+                del self._keyed[key]
+
+        task.add_done_callback(forget)
+        return task
+
+    async def _run(self, name: str, func, args, max_attempts: int):
+        for attempt in range(1, max_attempts + 1):
+            try:
+                await func(*args)
+                self.succeeded += 1
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if attempt == max_attempts:
+                    self.failed += 1
+                    logger.error("Job %s failed after %d attempts: %s", name, attempt, e, exc_info=True)
+                    return
+                delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+                delay *= random.uniform(0.5, 1.0)
+                logger.warning("Job %s attempt %d failed (%s), retrying in %.1fs", name, attempt, e, delay)
+                await asyncio.sleep(delay)
+
+    async def drain(self, timeout: float):
+        """Stop accepting jobs and wait for running ones, cancelling stragglers"""
+        self._accepting = False
+        if not self._tasks:
+            return
+
+        logger.info("Draining %d background jobs", len(self._tasks))
+        done, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+            logger.warning("Cancelled %d background jobs still running at shutdown", len(pending))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self._tasks),
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+        }
@@ -0,0 +1,184 @@
+"""
+Abandoned cart analytics for DE---NINE Art Store
+Streams carts grouped by session out of MongoDB and folds them into a
+fixed-size report: carts and value per age bucket, abandoned value per
+theme, and the size of the cart collection. Optionally deletes carts idle
+since a cutoff, in throttled batches.
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+
+logger = logging.getLogger(__name__)
+
+# (name, upper bound on time since the cart was last touched)
+AGE_BUCKETS = [
+    ("0-1h", timedelta(hours=1)),
+    ("1-24h", timedelta(hours=24)),
+    ("1-7d", timedelta(days=7)),
+    ("7-30d", timedelta(days=30)),
+    ("30d+", None),
+]
+
+CART_COLLECTIONS = {"lines": "cart_items", "embedded": "carts"}
+
+def age_bucket(age: timedelta) -> str:
+    for name, limit in AGE_BUCKETS:
+        if limit is None or age < limit:
+            return name
+
+def session_pipeline(layout: str) -> List[Dict[str, Any]]:
+    """One document per cart: session_id, last_activity and its lines"""
+    line = {"theme_id": "$theme_id", "quantity": "$quantity", "value": "$total_price"}
+    if layout == "lines":
+        return [
+            {"$group": {
+                "_id": "$session_id",
+                # Lines stored before timestamps were written fall back to the ObjectId's
+                "last_activity": {"$max": {"$ifNull": ["$updated_at", "$created_at", {"$toDate": "$_id"}]}},
+                "lines": {"$push": line},
+            }},
+        ]
+    return [
+        {"$project": {
+            "last_activity": {"$ifNull": ["$updated_at", "$created_at"]},
+            "lines": {"$map": {
+                "input": "$items",
+                "as": "item",
+                "in": {key: f"$$item.{field[1:]}" for key, field in line.items()},
+            }},
+        }},
+    ]
+
+class CartReport:
+    """Running totals; memory is bounded by the number of buckets and themes"""
+
+    def __init__(self, now: datetime, abandoned_after: timedelta):
+        self.now = now
+        self.abandoned_after = abandoned_after
+        self.buckets = {name: {"carts": 0, "lines": 0, "quantity": 0, "value": 0} for name, _ in AGE_BUCKETS}
+        self.themes: Dict[str, Dict[str, int]] = {}
+        self.carts = 0
+        self.abandoned = {"carts": 0, "lines": 0, "quantity": 0, "value": 0}
+
+    def add(self, cart: Dict[str, Any]) -> bool:
+        """Count one cart; returns whether it is abandoned"""
+        lines = cart.get("lines") or []
+        if not lines:
+            return False
+        last_activity = cart.get("last_activity")
+        # A cart with no timestamp at all is at least as old as the oldest bucket
+        age = self.now - last_activity if last_activity else timedelta.max
+        quantity = sum(line.get("quantity") or 0 for line in lines)
+        value = sum(line.get("value") or 0 for line in lines)
+        totals = {"carts": 1, "lines": len(lines), "quantity": quantity, "value": value}
+
+        self.carts += 1
+        bucket = self.buckets[age_bucket(age)]
+        for key, amount in totals.items():
+            bucket[key] += amount
+
+        if age < self.abandoned_after:
+            return False
+        for key, amount in totals.items():
+            self.abandoned[key] += amount
+        for theme_id in {line.get("theme_id") for line in lines}:
+            self.themes.setdefault(theme_id, {"carts": 0, "quantity": 0, "value": 0})["carts"] += 1
+        for line in lines:
+            theme = self.themes[line.get("theme_id")]
+            theme["quantity"] += line.get("quantity") or 0
+            theme["value"] += line.get("value") or 0
+        return True
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "generated_at": self.now.isoformat() + "Z",
+            "abandoned_after_hours": self.abandoned_after.total_seconds() / 3600,
+            "carts": {"total": self.carts, "abandoned": self.abandoned},
+            "age_buckets": [{"bucket": name, **self.buckets[name]} for name, _ in AGE_BUCKETS],
+            "themes": sorted(
+                ({"theme_id": theme_id, **totals} for theme_id, totals in self.themes.items()),
+                key=lambda theme: theme["value"],
+                reverse=True
+            ),
+        }
+
+async def collection_stats(collection) -> Dict[str, Any]:
+    stats = await collection.aggregate([{"$collStats": {"storageStats": {}}}]).to_list(1)
+    storage = stats[0]["storageStats"] if stats else {}
+    return {
+        "name": collection.name,
+        "documents": storage.get("count", 0),
+        "size_bytes": storage.get("size", 0),
+        "storage_bytes": storage.get("storageSize", 0),
+        "index_bytes": storage.get("totalIndexSize", 0),
+    }
+
+def idle_since_filter(layout: str, cutoff: datetime) -> Dict[str, Any]:
+    """Matches documents last touched before cutoff, as session_pipeline dates them"""
+    idle = [
+        {"updated_at": {"$lt": cutoff}},
+        {"updated_at": None, "created_at": {"$lt": cutoff}},
+    ]
+    if layout == "lines":
+        idle.append({"updated_at": None, "created_at": None, "_id": {"$lt": ObjectId.from_datetime(cutoff)}})
+    return {"$or": idle}
+
+async def delete_carts(collection, layout: str, session_ids: List[str], cutoff: datetime) -> int:
+    """Delete the given carts, skipping anything touched since the scan"""
+    key = "session_id" if layout == "lines" else "_id"
+    query = {key: {"$in": session_ids}, **idle_since_filter(layout, cutoff)}
+    result = await collection.delete_many(query)
+    return result.deleted_count
+
+async def analyze_carts(
+    db,
+    layout: str = "lines",
+    now: Optional[datetime] = None,
+    abandoned_after: timedelta = timedelta(hours=24),
+    delete_before: Optional[datetime] = None,
+    dry_run: bool = False,
+    batch_size: int = 500,
+    pause: float = 0.5
+) -> Dict[str, Any]:
+    """Report on every cart and optionally delete those idle since delete_before"""
+    collection = db[CART_COLLECTIONS[layout]]
+    report = CartReport(now or datetime.utcnow(), abandoned_after)
+    cleanup = None
+    if delete_before:
+        cleanup = {"cutoff": delete_before.isoformat() + "Z", "dry_run": dry_run, "carts": 0, "deleted_documents": 0}
+    pending: List[str] = []
+
+    async def flush():
+        cleanup["carts"] += len(pending)
+        if not dry_run:
+            cleanup["deleted_documents"] += await delete_carts(collection, layout, pending, delete_before)
+            # Spread deletes out so cleanup does not compete with checkout traffic
+            await asyncio.sleep(pause)
+        pending.clear()
+
+    cursor = collection.aggregate(session_pipeline(layout), allowDiskUse=True, batchSize=batch_size)
+    try:
+        async for cart in cursor:
+            report.add(cart)
+            last_activity = cart.get("last_activity")
+            if delete_before and last_activity and last_activity < delete_before:
+                pending.append(cart["_id"])
+                if len(pending) >= batch_size:
+                    await flush()
+    finally:
+        await cursor.close()
+    if pending:
+        await flush()
+
+    result = report.to_dict()
+    result["store"] = layout
+    result["collection"] = await collection_stats(collection)
+    result["cleanup"] = cleanup
+    if cleanup and not dry_run:
+        logger.info("Deleted %d cart documents from %d carts", cleanup["deleted_documents"], cleanup["carts"])
+    return result
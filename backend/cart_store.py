@@ -0,0 +1,142 @@
+"""
+Cart storage for DE---NINE Art Store
+Carts can be stored one document per line (cart_items, the original layout)
+or as one document per session with the lines embedded (carts). Both expose
+the same CartStore interface; CART_STORE picks one at startup. Open carts
+are not migrated when switching.
+"""
+
+import copy
+import os
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+# Upper bound on lines read per cart
+MAX_CART_ITEMS = 1000
+
+class CartStore(ABC):
+    """Cart lines are dicts shaped like CartItem documents (with _id).
+
+    Mutations return the cart's lines afterwards so handlers can respond
+    without another read where the storage layout allows it.
+    """
+
+    @abstractmethod
+    async def get_items(self, session_id: str) -> List[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def add_item(self, session_id: str, item: Dict[str, Any]) -> List[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def remove_item(self, session_id: str, item_id: ObjectId) -> Optional[List[Dict[str, Any]]]:
+        """Remove a line; None when the cart has no such line"""
+
+    @abstractmethod
+    async def clear(self, session_id: str):
+        ...
+
+class LineCartStore(CartStore):
+    """One cart_items document per line, queried by session_id"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def get_items(self, session_id: str) -> List[Dict[str, Any]]:
+        return await self.collection.find({"session_id": session_id}).to_list(MAX_CART_ITEMS)
+
+    async def add_item(self, session_id: str, item: Dict[str, Any]) -> List[Dict[str, Any]]:
+        await self.collection.insert_one(item)
+        return await self.get_items(session_id)
+
+    async def remove_item(self, session_id: str, item_id: ObjectId) -> Optional[List[Dict[str, Any]]]:
+        result = await self.collection.delete_one({"_id": item_id, "session_id": session_id})
+        if result.deleted_count == 0:
+            return None
+        return await self.get_items(session_id)
+
+    async def clear(self, session_id: str):
+        await self.collection.delete_many({"session_id": session_id})
+
+class EmbeddedCartStore(CartStore):
+    """One carts document per session (_id = session_id) with an items array.
+
+    Every operation is a single atomic round trip.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def get_items(self, session_id: str) -> List[Dict[str, Any]]:
+        cart = await self.collection.find_one({"_id": session_id}, {"items": 1})
+        return cart["items"] if cart else []
+
+    async def add_item(self, session_id: str, item: Dict[str, Any]) -> List[Dict[str, Any]]:
+        now = datetime.utcnow()
+        cart = await self.collection.find_one_and_update(
+            {"_id": session_id},
+            {
+                "$push": {"items": item},
+                "$set": {"updated_at": now},
+                "$setOnInsert": {"created_at": now}
+            },
+            projection={"items": 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return cart["items"]
+
+    async def remove_item(self, session_id: str, item_id: ObjectId) -> Optional[List[Dict[str, Any]]]:
+        cart = await self.collection.find_one_and_update(
+            {"_id": session_id, "items._id": item_id},
+            {
+                "$pull": {"items": {"_id": item_id}},
+                "$set": {"updated_at": datetime.utcnow()}
+            },
+            projection={"items": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        return cart["items"] if cart else None
+
+    async def clear(self, session_id: str):
+        await self.collection.delete_one({"_id": session_id})
+
+class MemoryCartStore(CartStore):
+    """Carts in a dict, for benchmarks and tests (see repositories.py)"""
+
+    def __init__(self):
+        self._carts: Dict[str, List[Dict[str, Any]]] = {}
+
+    async def get_items(self, session_id: str) -> List[Dict[str, Any]]:
+        return copy.deepcopy(self._carts.get(session_id, []))
+
+    async def add_item(self, session_id: str, item: Dict[str, Any]) -> List[Dict[str, Any]]:
+        self._carts.setdefault(session_id, []).append(copy.deepcopy(item))
+        return await self.get_items(session_id)
+
+    async def remove_item(self, session_id: str, item_id: ObjectId) -> Optional[List[Dict[str, Any]]]:
+        items = self._carts.get(session_id, [])
+        remaining = [item for item in items if item["_id"] != item_id]
+        if len(remaining) == len(items):
+            return None
+        self._carts[session_id] = remaining
+        return await self.get_items(session_id)
+
+    async def clear(self, session_id: str):
+        self._carts.pop(session_id, None)
+
+CART_STORES = {
+    "lines": lambda db: LineCartStore(db.cart_items),
+    "embedded": lambda db: EmbeddedCartStore(db.carts),
+}
+
+def cart_store_from_env(db) -> CartStore:
+    name = os.environ.get("CART_STORE", "lines")
+    if name not in CART_STORES:
+        raise ValueError(f"Unknown CART_STORE {name!r}, expected one of {', '.join(CART_STORES)}")
+    return CART_STORES[name](db)
@@ -0,0 +1,193 @@
+"""
+Bulk catalog import for DE---NINE Art Store
+Parses a streamed NDJSON or CSV upload into print themes and upserts them in
+chunked bulk writes through the theme repository. Bad rows are reported by
+line number rather than failing the whole import.
+
+NDJSON: one theme per line, shaped like PrintTheme (variants included).
+CSV: one variant per row with the columns in CSV_COLUMNS; rows of the same
+theme must be adjacent.
+"""
+
+import csv
+import json
+import logging
+import time
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CSV_COLUMNS = [
+    "theme_id", "theme", "description", "base_price",
+    "variant_id", "variant_name", "image_url", "featured",
+]
+
+# Keep the error report bounded for very bad uploads
+MAX_REPORTED_ERRORS = 1000
+
+class RowError(ValueError):
+    def __init__(self, line: int, message: str, theme_id: Optional[str] = None):
+        super().__init__(message)
+        self.line = line
+        self.theme_id = theme_id
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, str]]:
+    """Split a byte stream into numbered text lines without buffering it all"""
+    buffer = b""
+    number = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            number += 1
+            yield number, line.decode("utf-8-sig" if number == 1 else "utf-8").rstrip("\r")
+    if buffer:
+        number += 1
+        yield number, buffer.decode("utf-8-sig" if number == 1 else "utf-8").rstrip("\r")
+
+async def iter_ndjson_themes(lines: AsyncIterator[Tuple[int, str]]):
+    """Yield (line, theme dict) or (line, RowError) per non-blank line"""
+    async for number, line in lines:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield number, RowError(number, f"Invalid JSON: {e}")
+            continue
+        if not isinstance(record, dict):
+            yield number, RowError(number, "Expected a JSON object")
+            continue
+        yield number, record
+
+async def iter_csv_records(lines: AsyncIterator[Tuple[int, str]]):
+    """Yield (first line, row) per CSV record; quoted fields may span lines"""
+    pending: List[str] = []
+    start = 0
+    async for number, line in lines:
+        if not pending:
+            start = number
+        pending.append(line)
+        text = "\n".join(pending)
+        # An odd number of quotes means a quoted field continues on the next line
+        if text.count('"') % 2:
+            continue
+        pending = []
+        if text.strip():
+            yield start, next(csv.reader([text]))
+    if pending:
+        yield start, RowError(start, "Unterminated quoted field")
+
+async def iter_csv_themes(lines: AsyncIterator[Tuple[int, str]]):
+    """Group adjacent variant rows into themes"""
+    header = None
+    current: Optional[Tuple[int, Dict[str, Any]]] = None
+    seen = set()
+
+    async for number, row in iter_csv_records(lines):
+        if isinstance(row, RowError):
+            yield number, row
+            continue
+        if header is None:
+            header = [column.strip() for column in row]
+            missing = [column for column in CSV_COLUMNS if column not in header]
+            if missing:
+                yield number, RowError(number, f"Missing columns: {', '.join(missing)}")
+                return
+            continue
+        if len(row) != len(header):
+            yield number, RowError(number, f"Expected {len(header)} fields, got {len(row)}")
+            continue
+
+        values = dict(zip(header, row))
+        theme_id = values["theme_id"].strip()
+        if current is None or current[1]["theme_id"] != theme_id:
+            if current is not None:
+                yield current
+            if theme_id in seen:
+                current = None
+                yield number, RowError(number, "Rows for this theme must be adjacent", theme_id)
+                continue
+            seen.add(theme_id)
+            current = (number, {
+                "theme_id": theme_id,
+                "theme": values["theme"],
+                "description": values["description"],
+                "base_price": values["base_price"],
+                "variants": [],
+            })
+        current[1]["variants"].append({
+            "id": values["variant_id"],
+            "name": values["variant_name"],
+            "image_url": values["image_url"],
+            "featured": values["featured"].strip().lower() in ("1", "true", "yes"),
+        })
+
+    if current is not None:
+        yield current
+
+async def import_catalog(
+    themes_repository,
+    themes,
+    build_document: Callable[[Dict[str, Any]], Dict[str, Any]],
+    chunk_size: int = 500,
+    on_chunk: Optional[Callable[[List[Dict[str, Any]]], None]] = None
+) -> Dict[str, Any]:
+    """Validate themes and upsert them by theme_id in chunked bulk writes.
+
+    build_document validates a raw theme and returns the fields to store; it
+    raises ValueError (pydantic's ValidationError included) for bad rows.
+    """
+    started = time.monotonic()
+    stats = {"records": 0, "themes": 0, "inserted": 0, "updated": 0, "unchanged": 0, "failed": 0}
+    errors: List[Dict[str, Any]] = []
+
+    def report(error: RowError):
+        stats["failed"] += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({"line": error.line, "theme_id": error.theme_id, "error": str(error)})
+
+    batch: List[Tuple[int, Dict[str, Any]]] = []
+
+    async def flush():
+        if not batch:
+            return
+        result = await themes_repository.bulk_upsert([document for _, document in batch])
+        for index, message in result["errors"]:
+            line, document = batch[index]
+            report(RowError(line, message, document["theme_id"]))
+
+        for key in ("inserted", "updated", "unchanged"):
+            stats[key] += result[key]
+        if on_chunk:
+            on_chunk([document for _, document in batch])
+        batch.clear()
+
+    async for line, raw in themes:
+        stats["records"] += 1
+        if isinstance(raw, RowError):
+            report(raw)
+            continue
+        try:
+            document = build_document(raw)
+        except ValueError as e:
+            report(RowError(line, str(e), raw.get("theme_id")))
+            continue
+
+        stats["themes"] += 1
+        document["updated_at"] = datetime.utcnow()
+        batch.append((line, document))
+        if len(batch) >= chunk_size:
+            await flush()
+
+    await flush()
+
+    elapsed = time.monotonic() - started
+    stats["elapsed_seconds"] = round(elapsed, 3)
+    stats["themes_per_second"] = round(stats["themes"] / elapsed, 1) if elapsed else None
+    return {
+        "stats": stats,
+        "errors": errors,
+        "errors_truncated": stats["failed"] > len(errors),
+    }
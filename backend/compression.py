@@ -0,0 +1,203 @@
+"""
+Response compression for DE---NINE Art Store
+Negotiates brotli/gzip for API responses and builds precompressed payloads
+for cached catalog responses so hot reads never compress per request.
+"""
+
+import gzip
+import hashlib
+import json
+import zlib
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import Request
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+# Responses smaller than this are sent uncompressed
+MINIMUM_SIZE = 1024
+
+# On-the-fly compression favours speed, cache fills favour size
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+PRECOMPRESSED_GZIP_LEVEL = 9
+PRECOMPRESSED_BROTLI_QUALITY = 11
+
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "text/",
+)
+
+def supported_encodings() -> tuple:
+    return ("br", "gzip") if brotli else ("gzip",)
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick the best supported encoding from an Accept-Encoding header"""
+    if not accept_encoding:
+        return None
+
+    qualities: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[coding.strip().lower()] = quality
+
+    best = None
+    for coding in supported_encodings():
+        quality = qualities.get(coding, qualities.get("*", 0.0))
+        if quality > 0 and (best is None or quality > best[1]):
+            best = (coding, quality)
+    return best[0] if best else None
+
+def encode_json(content: Any, default: Callable = None) -> bytes:
+    return json.dumps(content, default=default, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+@dataclass
+class PrecompressedPayload:
+    """A JSON body together with its compressed variants"""
+    body: bytes
+    gzip: bytes
+    br: Optional[bytes]
+    etag: str
+
+    @classmethod
+    def from_body(cls, body: bytes) -> "PrecompressedPayload":
+        return cls(
+            body=body,
+            gzip=gzip.compress(body, compresslevel=PRECOMPRESSED_GZIP_LEVEL, mtime=0),
+            br=brotli.compress(body, quality=PRECOMPRESSED_BROTLI_QUALITY) if brotli else None,
+            etag=f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        )
+
+    @classmethod
+    def from_content(cls, content: Any, default: Callable = None) -> "PrecompressedPayload":
+        return cls.from_body(encode_json(content, default))
+
+    def response(self, request: Request, headers: Dict[str, str] = None) -> Response:
+        """Serve the variant matching the request's Accept-Encoding"""
+        response_headers = {"Vary": "Accept-Encoding", "ETag": self.etag, **(headers or {})}
+
+        if request.headers.get("if-none-match") == self.etag:
+            return Response(status_code=304, headers=response_headers)
+
+        body = self.body
+        if len(self.body) >= MINIMUM_SIZE:
+            encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+            if encoding == "br" and self.br is not None:
+                body = self.br
+                response_headers["Content-Encoding"] = "br"
+            elif encoding == "gzip":
+                body = self.gzip
+                response_headers["Content-Encoding"] = "gzip"
+
+        return Response(body, media_type="application/json", headers=response_headers)
+
+class _Compressor:
+    """Streaming compressor for a single response"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.process(data) + self._compressor.flush()
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self.encoding == "br":
+            return self._compressor.process(data) + self._compressor.finish()
+        return self._compressor.compress(data) + self._compressor.flush()
+
+class CompressionMiddleware:
+    """ASGI middleware compressing compressible responses with br or gzip.
+
+    Responses that already carry a Content-Encoding (e.g. precompressed
+    catalog payloads) or are below minimum_size pass through untouched.
+    Streaming responses are compressed chunk by chunk.
+    """
+
+    def __init__(self, app, minimum_size: int = MINIMUM_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"))
+        if not encoding:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor: Optional[_Compressor] = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, compressor, passthrough
+
+            if message["type"] == "http.response.start":
+                start_message = message
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "")
+                passthrough = (
+                    "content-encoding" in headers
+                    or not content_type.startswith(COMPRESSIBLE_TYPES)
+                )
+                if passthrough:
+                    await send(message)
+                return
+
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if compressor is None:
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+
+                compressor = _Compressor(encoding)
+                headers = MutableHeaders(raw=start_message["headers"])
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+
+                if not more_body:
+                    compressed = compressor.finish(body)
+                    headers["Content-Length"] = str(len(compressed))
+                    await send(start_message)
+                    await send({"type": "http.response.body", "body": compressed})
+                    return
+
+                del headers["Content-Length"]
+                await send(start_message)
+
+            if more_body:
+                await send({"type": "http.response.body", "body": compressor.compress(body), "more_body": True})
+            else:
+                await send({"type": "http.response.body", "body": compressor.finish(body)})
+
+        await self.app(scope, receive, send_wrapper)
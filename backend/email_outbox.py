@@ -0,0 +1,281 @@
+"""
+Order confirmation emails for DE---NINE Art Store
+Emails are written to an outbox collection when an order is created and sent
+by a background worker in batches over one reused SMTP connection, with
+retry and exponential backoff. Sending never blocks the request path.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import smtplib
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from typing import Any, Dict, List, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+# Outbox statuses
+PENDING = "pending"
+SENDING = "sending"
+SENT = "sent"
+FAILED = "failed"
+
+def format_amount(amount_ore: int) -> str:
+    return f"{amount_ore / 100:,.2f} kr"
+
+def order_email_address(order: Dict[str, Any]) -> str:
+    customer_info = order.get("customer_info") or {}
+    return customer_info.get("customer_email") or customer_info.get("email", "")
+
+def order_confirmation_message(order: Dict[str, Any]) -> Dict[str, str]:
+    """Subject and plain-text body for an order confirmation"""
+    lines = [
+        "Thank you for your order!",
+        "",
+        f"Order number: {order['order_number']}",
+        "",
+    ]
+    for item in order.get("items", []):
+        lines.append(
+            f"- {item.get('theme_id', 'Print')} x{item.get('quantity', 1)}: "
+            f"{format_amount(item.get('total_price', 0))}"
+        )
+    lines += [
+        "",
+        f"Total: {format_amount(order.get('total', 0))}",
+        "",
+        "We will let you know when your prints are on their way.",
+        "DE---NINE",
+    ]
+    return {
+        "subject": f"DE---NINE order confirmation {order['order_number']}",
+        "body": "\n".join(lines),
+    }
+
+async def enqueue_order_confirmation(outbox, order: Dict[str, Any]) -> bool:
+    """Write the confirmation email for an order; safe to call more than once"""
+    recipient = order_email_address(order)
+    if not recipient:
+        logger.info("Order %s has no customer email, skipping confirmation", order["order_number"])
+        return False
+
+    now = datetime.utcnow()
+    try:
+        await outbox.insert_one({
+            # One confirmation per order, however often payment processing retries
+            "_id": f"order_confirmation:{order['_id']}",
+            "kind": "order_confirmation",
+            "order_number": order["order_number"],
+            "to": recipient,
+            **order_confirmation_message(order),
+            "status": PENDING,
+            "attempts": 0,
+            "next_attempt_at": now,
+            "created_at": now,
+        })
+    except DuplicateKeyError:
+        return False
+    return True
+
+class SmtpSender:
+    """Blocking SMTP client that keeps one connection open between batches.
+
+    Methods are called from a worker thread; the connection is dropped after
+    an error or when idle for longer than idle_timeout.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int = 25,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        starttls: bool = False,
+        sender: str = "orders@denine.art",
+        timeout: float = 10.0,
+        idle_timeout: float = 60.0
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.sender = sender
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self._smtp: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+
+    @classmethod
+    def from_env(cls) -> Optional["SmtpSender"]:
+        host = os.environ.get("SMTP_HOST")
+        if not host:
+            return None
+        return cls(
+            host=host,
+            port=int(os.environ.get("SMTP_PORT", 25)),
+            username=os.environ.get("SMTP_USERNAME"),
+            password=os.environ.get("SMTP_PASSWORD"),
+            starttls=os.environ.get("SMTP_STARTTLS", "").lower() in ("1", "true"),
+            sender=os.environ.get("EMAIL_FROM", "orders@denine.art")
+        )
+
+    def _connection(self, now: float) -> smtplib.SMTP:
+        if self._smtp is not None and now - self._last_used > self.idle_timeout:
+            self.close()
+        if self._smtp is None:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password or "")
+            self._smtp = smtp
+        return self._smtp
+
+    def send_batch(self, messages: List[Dict[str, Any]], now: float) -> Dict[str, Optional[str]]:
+        """Send messages over the shared connection; returns id -> error or None"""
+        results: Dict[str, Optional[str]] = {}
+        for message in messages:
+            email = EmailMessage()
+            email["From"] = self.sender
+            email["To"] = message["to"]
+            email["Subject"] = message["subject"]
+            email.set_content(message["body"])
+            try:
+                self._connection(now).send_message(email)
+                results[message["_id"]] = None
+            except smtplib.SMTPRecipientsRefused as e:
+                # The connection is still usable; only this message failed
+                results[message["_id"]] = str(e)
+            except (smtplib.SMTPException, OSError) as e:
+                results[message["_id"]] = str(e)
+                self.close()
+        self._last_used = now
+        return results
+
+    def close(self):
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            self._smtp.close()
+        self._smtp = None
+
+class OutboxWorker:
+    """Claims due outbox messages in batches and sends them"""
+
+    def __init__(
+        self,
+        outbox,
+        sender: SmtpSender,
+        batch_size: int = 20,
+        poll_interval: float = 5.0,
+        max_attempts: int = 8,
+        base_delay: float = 30.0,
+        max_delay: float = 3600.0,
+        lease_seconds: float = 300.0
+    ):
+        self.outbox = outbox
+        self.sender = sender
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lease_seconds = lease_seconds
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._loop())
+
+    def notify(self):
+        """Wake the worker early, e.g. right after enqueueing a message"""
+        self._wakeup.set()
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await asyncio.to_thread(self.sender.close)
+
+    async def _loop(self):
+        while True:
+            try:
+                sent = await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Email outbox worker error: %s", e, exc_info=True)
+                sent = 0
+
+            # A full batch probably means more are due
+            if sent < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+    async def run_once(self) -> int:
+        """Claim and send one batch; returns the number of messages claimed"""
+        batch = await self._claim_batch()
+        if not batch:
+            return 0
+
+        loop = asyncio.get_running_loop()
+        results = await asyncio.to_thread(self.sender.send_batch, batch, loop.time())
+
+        now = datetime.utcnow()
+        for message in batch:
+            error = results.get(message["_id"], "not attempted")
+            if error is None:
+                await self.outbox.update_one(
+                    {"_id": message["_id"]},
+                    {"$set": {"status": SENT, "sent_at": now}, "$unset": {"lease_expires_at": ""}}
+                )
+            else:
+                await self._retry_later(message, error, now)
+        return len(batch)
+
+    async def _claim_batch(self) -> List[Dict[str, Any]]:
+        now = datetime.utcnow()
+        lease_expires_at = now + timedelta(seconds=self.lease_seconds)
+        batch = []
+        while len(batch) < self.batch_size:
+            message = await self.outbox.find_one_and_update(
+                {"$or": [
+                    {"status": PENDING, "next_attempt_at": {"$lte": now}},
+                    # Claimed by a worker that died mid-batch
+                    {"status": SENDING, "lease_expires_at": {"$lt": now}},
+                ]},
+                {"$set": {"status": SENDING, "lease_expires_at": lease_expires_at}, "$inc": {"attempts": 1}},
+                sort=[("next_attempt_at", 1)],
+                return_document=ReturnDocument.AFTER
+            )
+            if message is None:
+                break
+            batch.append(message)
+        return batch
+
+    async def _retry_later(self, message: Dict[str, Any], error: str, now: datetime):
+        attempts = message["attempts"]
+        if attempts >= self.max_attempts:
+            logger.error("Giving up on email %s after %d attempts: %s", message["_id"], attempts, error)
+            update = {"status": FAILED, "last_error": error}
+        else:
+            delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+            delay *= random.uniform(0.5, 1.0)
+            logger.warning("Email %s attempt %d failed (%s), retrying in %.0fs", message["_id"], attempts, error, delay)
+            update = {"status": PENDING, "last_error": error, "next_attempt_at": now + timedelta(seconds=delay)}
+        await self.outbox.update_one(
+            {"_id": message["_id"]},
+            {"$set": update, "$unset": {"lease_expires_at": ""}}
+        )
@@ -0,0 +1,156 @@
+"""
+Idempotency-Key handling for DE---NINE Art Store
+Stores the first successful response per key and replays it for retries.
+Concurrent duplicates wait for the in-flight request instead of re-executing.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict
+
+from fastapi import HTTPException
+from fastapi.responses import Response
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+# Stored responses expire via a TTL index on created_at (see init_db.py)
+IDEMPOTENCY_TTL_SECONDS = 24 * 60 * 60
+MAX_KEY_LENGTH = 255
+
+def request_fingerprint(payload: Any) -> str:
+    """Hash of the request body, used to reject keys reused for other requests"""
+    encoded = json.dumps(payload, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+class IdempotencyStore:
+    """Runs a request at most once per Idempotency-Key"""
+
+    def __init__(
+        self,
+        collection,
+        lease_seconds: float = 30.0,
+        wait_timeout: float = 10.0,
+        poll_interval: float = 0.05
+    ):
+        self.collection = collection
+        self.lease_seconds = lease_seconds
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def run(
+        self,
+        scope: str,
+        key: str,
+        fingerprint: str,
+        execute: Callable[[], Awaitable[Response]]
+    ) -> Response:
+        """Execute once, or replay the stored response for a repeated key"""
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail="Invalid Idempotency-Key header")
+
+        record_id = f"{scope}:{key}"
+
+        # Duplicates on this worker wait on the original without polling
+        local = self._inflight.get(record_id)
+        if local:
+            await asyncio.shield(local)
+
+        replay = await self._acquire(record_id, fingerprint)
+        if replay is not None:
+            return replay
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[record_id] = future
+        try:
+            response = await execute()
+        except BaseException:
+            await self.collection.delete_one({"_id": record_id, "status": "in_progress"})
+            raise
+        finally:
+            future.set_result(None)
+            del self._inflight[record_id]
+
+        if 200 <= response.status_code < 300:
+            await self.collection.update_one(
+                {"_id": record_id},
+                {"$set": {
+                    "status": "completed",
+                    "response": {
+                        "status_code": response.status_code,
+                        "media_type": response.media_type,
+                        "body": bytes(response.body)
+                    },
+                    "completed_at": datetime.utcnow()
+                }}
+            )
+        else:
+            # Failures are not replayed; the client may retry with the same key
+            await self.collection.delete_one({"_id": record_id})
+
+        return response
+
+    async def _acquire(self, record_id: str, fingerprint: str):
+        """Claim the key; return a replay Response if it already completed"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.wait_timeout
+        delay = self.poll_interval
+
+        while True:
+            now = datetime.utcnow()
+            try:
+                await self.collection.insert_one({
+                    "_id": record_id,
+                    "status": "in_progress",
+                    "fingerprint": fingerprint,
+                    "lease_expires_at": now + timedelta(seconds=self.lease_seconds),
+                    "created_at": now
+                })
+                return None
+            except DuplicateKeyError:
+                pass
+
+            record = await self.collection.find_one({"_id": record_id})
+            if record is None:
+                # Previous attempt failed and released the key
+                continue
+
+            if record["fingerprint"] != fingerprint:
+                raise HTTPException(
+                    status_code=422,
+                    detail="Idempotency-Key was already used for a different request"
+                )
+
+            if record["status"] == "completed":
+                stored = record["response"]
+                return Response(
+                    content=stored["body"],
+                    status_code=stored["status_code"],
+                    media_type=stored["media_type"],
+                    headers={"Idempotent-Replayed": "true"}
+                )
+
+            # Take over keys whose owner died mid-request
+            if record["lease_expires_at"] < now:
+                result = await self.collection.update_one(
+                    {"_id": record_id, "status": "in_progress", "lease_expires_at": record["lease_expires_at"]},
+                    {"$set": {"lease_expires_at": now + timedelta(seconds=self.lease_seconds)}}
+                )
+                if result.modified_count:
+                    logger.warning("Took over expired idempotency lease %s", record_id)
+                    return None
+                continue
+
+            if loop.time() >= deadline:
+                raise HTTPException(
+                    status_code=409,
+                    detail="A request with this Idempotency-Key is still in progress",
+                    headers={"Retry-After": "1"}
+                )
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.5)
@@ -0,0 +1,308 @@
+"""
+Image derivative service for DE---NINE Art Store
+Resizes print artwork into a fixed set of widths and formats and keeps the
+results in an on-disk, content-addressed cache with size-bounded eviction.
+"""
+
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Derivative sizes served to the frontend (hero, gallery, cart thumbnails)
+DERIVATIVE_WIDTHS = (320, 640, 1280)
+DERIVATIVE_FORMATS = ("webp", "jpeg")
+
+MEDIA_TYPES = {
+    "webp": "image/webp",
+    "jpeg": "image/jpeg",
+}
+
+# Derivatives are requested by source URL, whose artwork can be replaced, so
+# clients cache them briefly and then revalidate against the content ETag
+DERIVATIVE_CACHE_CONTROL = "public, max-age=300"
+
+# Seconds before a source URL is fetched again to pick up replaced artwork
+DEFAULT_REF_TTL = 300.0
+
+def _render_derivatives(
+    source: bytes,
+    digest: str,
+    targets: List[Tuple[int, str]],
+    out_dir: str
+) -> List[Tuple[str, int]]:
+    """Resize source image into every (width, format) target.
+
+    Runs inside a worker process, so it only touches its arguments and the
+    filesystem. Returns (path, size) for each written derivative.
+    """
+    from PIL import Image
+
+    written = []
+    with Image.open(io.BytesIO(source)) as original:
+        original.load()
+        for width, fmt in targets:
+            image = original
+            if image.width > width:
+                height = max(1, round(image.height * width / image.width))
+                image = image.resize((width, height), Image.LANCZOS)
+
+            if fmt == "jpeg" and image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            elif fmt == "webp" and image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+
+            path = Path(out_dir) / digest[:2] / f"{digest}-{width}.{fmt}"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+
+            if fmt == "webp":
+                image.save(tmp_path, "WEBP", quality=82, method=4)
+            else:
+                image.save(tmp_path, "JPEG", quality=85, optimize=True, progressive=True)
+            os.replace(tmp_path, path)
+            written.append((str(path), path.stat().st_size))
+
+    return written
+
+class ImageService:
+    """Fetches source artwork and serves cached, resized derivatives"""
+
+    def __init__(
+        self,
+        cache_dir: Path,
+        max_cache_bytes: int,
+        origin_dir: Optional[Path] = None,
+        max_workers: Optional[int] = None,
+        max_source_bytes: int = 25 * 1024 * 1024,
+        allowed_hosts: Iterable[str] = (),
+        ref_ttl: float = DEFAULT_REF_TTL
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.derivative_dir = self.cache_dir / "derivatives"
+        self.ref_dir = self.cache_dir / "refs"
+        self.max_cache_bytes = max_cache_bytes
+        self.origin_dir = Path(origin_dir).resolve() if origin_dir else None
+        self.max_workers = max_workers
+        self.max_source_bytes = max_source_bytes
+        self.allowed_hosts: Set[str] = {host.lower() for host in allowed_hosts}
+        self.ref_ttl = ref_ttl
+
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._http: Optional[httpx.AsyncClient] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._cache_bytes = 0
+        self._evicting = False
+
+    @classmethod
+    def from_env(cls) -> "ImageService":
+        root_dir = Path(__file__).parent
+        origin_dir = os.environ.get("IMAGE_ORIGIN_DIR")
+        workers = os.environ.get("IMAGE_WORKERS")
+        hosts = os.environ.get("IMAGE_SOURCE_HOSTS", "")
+        return cls(
+            cache_dir=Path(os.environ.get("IMAGE_CACHE_DIR", root_dir / "image_cache")),
+            max_cache_bytes=int(os.environ.get("IMAGE_CACHE_MAX_BYTES", 1024 * 1024 * 1024)),
+            origin_dir=Path(origin_dir) if origin_dir else None,
+            max_workers=int(workers) if workers else None,
+            allowed_hosts=[host.strip() for host in hosts.split(",") if host.strip()],
+            ref_ttl=float(os.environ.get("IMAGE_REF_TTL", DEFAULT_REF_TTL))
+        )
+
+    async def start(self):
+        """Create the worker pool and HTTP client and measure the cache"""
+        self.derivative_dir.mkdir(parents=True, exist_ok=True)
+        self.ref_dir.mkdir(parents=True, exist_ok=True)
+        self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        # No redirects: an allowed host must not bounce fetches to internal ones
+        self._http = httpx.AsyncClient(timeout=30.0, follow_redirects=False)
+        self._cache_bytes = await asyncio.to_thread(self._scan_cache_size)
+        logger.info(
+            "Image service started (cache %s, %d bytes used)",
+            self.cache_dir, self._cache_bytes
+        )
+
+    async def close(self):
+        if self._http:
+            await self._http.aclose()
+        if self._pool:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+
+    def is_allowed_source(self, src: str) -> bool:
+        """Local origin paths, or http(s) URLs on an IMAGE_SOURCE_HOSTS host"""
+        parts = urlsplit(src)
+        if not parts.scheme and not parts.netloc:
+            return True  # confined to origin_dir when read
+        return parts.scheme in ("http", "https") and (parts.hostname or "") in self.allowed_hosts
+
+    @staticmethod
+    def validate(width: int, fmt: str):
+        if width not in DERIVATIVE_WIDTHS:
+            raise ValueError(f"Unsupported width {width}, expected one of {DERIVATIVE_WIDTHS}")
+        if fmt not in DERIVATIVE_FORMATS:
+            raise ValueError(f"Unsupported format {fmt}, expected one of {DERIVATIVE_FORMATS}")
+
+    async def get_derivative(self, src: str, width: int, fmt: str) -> Tuple[Path, str]:
+        """Return (path, content digest) of a derivative, generating it on a miss"""
+        self.validate(width, fmt)
+
+        digest = await self._lookup_ref(src)
+        if digest:
+            path = self._derivative_path(digest, width, fmt)
+            if path.exists():
+                await asyncio.to_thread(os.utime, path)
+                return path, digest
+
+        digest = await self.generate(src)
+        return self._derivative_path(digest, width, fmt), digest
+
+    async def generate(self, src: str) -> str:
+        """Generate every derivative for src, deduplicating concurrent calls"""
+        inflight = self._inflight.get(src)
+        if inflight:
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[src] = future
+        try:
+            digest = await self._generate(src)
+            future.set_result(digest)
+            return digest
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so waiter-less failures do not log warnings
+            future.exception()
+            raise
+        finally:
+            del self._inflight[src]
+
+    async def pregenerate(self, image_urls: Iterable[str]):
+        """Warm the cache for new catalog images; failures are logged only"""
+        for url in dict.fromkeys(url for url in image_urls if url):
+            try:
+                await self.generate(url)
+            except Exception as e:
+                logger.warning("Failed to pre-generate derivatives for %s: %s", url, e)
+
+    async def _generate(self, src: str) -> str:
+        source = await self._read_source(src)
+        digest = hashlib.sha256(source).hexdigest()
+        targets = [
+            (width, fmt)
+            for width in DERIVATIVE_WIDTHS
+            for fmt in DERIVATIVE_FORMATS
+            if not self._derivative_path(digest, width, fmt).exists()
+        ]
+
+        if targets:
+            loop = asyncio.get_running_loop()
+            written = await loop.run_in_executor(
+                self._pool, _render_derivatives, source, digest, targets, str(self.derivative_dir)
+            )
+            self._cache_bytes += sum(size for _, size in written)
+
+        await asyncio.to_thread(self._write_ref, src, digest)
+
+        if self._cache_bytes > self.max_cache_bytes and not self._evicting:
+            self._evicting = True
+            try:
+                self._cache_bytes = await asyncio.to_thread(self._evict, digest)
+            finally:
+                self._evicting = False
+
+        return digest
+
+    async def _read_source(self, src: str) -> bytes:
+        if src.startswith(("http://", "https://")):
+            return await self._download(src)
+
+        if not self.origin_dir:
+            raise ValueError(f"Local image source without IMAGE_ORIGIN_DIR: {src}")
+
+        path = (self.origin_dir / src.lstrip("/")).resolve()
+        if self.origin_dir not in path.parents:
+            raise ValueError(f"Image source outside origin directory: {src}")
+        return await asyncio.to_thread(path.read_bytes)
+
+    async def _download(self, src: str) -> bytes:
+        """Fetch a remote source, giving up as soon as it exceeds max_source_bytes"""
+        async with self._http.stream("GET", src) as response:
+            response.raise_for_status()
+            declared = response.headers.get("content-length")
+            if declared and declared.isdigit() and int(declared) > self.max_source_bytes:
+                raise ValueError(f"Source image too large: {src}")
+            chunks, size = [], 0
+            async for chunk in response.aiter_bytes():
+                size += len(chunk)
+                if size > self.max_source_bytes:
+                    raise ValueError(f"Source image too large: {src}")
+                chunks.append(chunk)
+        return b"".join(chunks)
+
+    def _derivative_path(self, digest: str, width: int, fmt: str) -> Path:
+        return self.derivative_dir / digest[:2] / f"{digest}-{width}.{fmt}"
+
+    def _ref_path(self, src: str) -> Path:
+        return self.ref_dir / hashlib.sha256(src.encode()).hexdigest()
+
+    async def _lookup_ref(self, src: str) -> Optional[str]:
+        """Digest last seen for src; None once older than ref_ttl"""
+        return await asyncio.to_thread(self._read_ref, src)
+
+    def _read_ref(self, src: str) -> Optional[str]:
+        path = self._ref_path(src)
+        try:
+            if time.time() - path.stat().st_mtime > self.ref_ttl:
+                return None
+            return path.read_text().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _write_ref(self, src: str, digest: str):
+        path = self._ref_path(src)
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(digest)
+        os.replace(tmp_path, path)
+
+    def _scan_cache_size(self) -> int:
+        return sum(
+            path.stat().st_size
+            for path in self.derivative_dir.rglob("*")
+            if path.is_file()
+        )
+
+    def _evict(self, keep_digest: str) -> int:
+        """Delete least recently served derivatives until under 90% of the limit"""
+        entries = []
+        for path in self.derivative_dir.rglob("*"):
+            if path.is_file():
+                stat = path.stat()
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_cache_bytes * 0.9)
+        evicted = 0
+        for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+            if total <= target:
+                break
+            if path.name.startswith(keep_digest):
+                continue
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+            evicted += 1
+
+        logger.info("Evicted %d image derivatives, cache now %d bytes", evicted, total)
+        return total
@@ -173,6 +173,27 @@ print_themes_data = [
     }
 ]
 
+async def create_indexes(db):
+    """Indexes backing every query shape the API runs.
+
+    tests/test_query_plans.py checks the queries against these, so add the
+    index here when adding a query.
+    """
+    await db.print_themes.create_index("theme_id", unique=True)
+    await db.cart_items.create_index("session_id")
+    await db.payment_transactions.create_index("payment_id", unique=True)
+    await db.payment_transactions.create_index("session_id")
+    await db.payment_transactions.create_index([("session_id", 1), ("cart_hash", 1), ("created_at", -1)])
+    await db.orders.create_index("order_number", unique=True)
+    # Order history is listed newest first per session
+    await db.orders.create_index([("session_id", 1), ("created_at", -1)])
+    await db.orders.create_index("payment_transaction_id", unique=True)
+    await db.orders.create_index("created_at")
+    await db.sales_rollups.create_index([("day", 1), ("theme_id", 1)], unique=True)
+    await db.idempotency_keys.create_index("created_at", expireAfterSeconds=24 * 60 * 60)
+    await db.email_outbox.create_index([("status", 1), ("next_attempt_at", 1)])
+    await db.page_content.create_index("page_id", unique=True)
+
 async def init_database():
     """Initialize the database with print themes data"""
     try:
@@ -191,13 +212,7 @@ async def init_database():
         print(f"Inserted {len(result.inserted_ids)} print themes")
         
         # Create indexes for better performance
-        await db.print_themes.create_index("theme_id", unique=True)
-        await db.cart_items.create_index("session_id")
-        await db.payment_transactions.create_index("payment_id", unique=True)
-        await db.payment_transactions.create_index("session_id")
-        await db.orders.create_index("order_number", unique=True)
-        await db.orders.create_index("session_id")
-        
+        await create_indexes(db)
         print("Database indexes created")
         
         # Verify data
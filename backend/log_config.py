@@ -0,0 +1,149 @@
+"""
+Logging setup for DE---NINE Art Store
+Records are emitted as structured JSON by a background QueueListener thread,
+so a slow stdout or log collector never blocks the event loop. Each record
+carries the request id, route and session id of the request that logged it.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import uuid
+import zlib
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+
+from fastapi import Request
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+route_var: ContextVar[Optional[str]] = ContextVar("route", default=None)
+session_id_var: ContextVar[Optional[str]] = ContextVar("session_id", default=None)
+
+# Attributes of every LogRecord; anything else was passed via extra=
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "request_id", "route", "session_id"}
+
+class ContextFilter(logging.Filter):
+    """Copy request context onto records in the logging thread"""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        record.route = route_var.get()
+        record.session_id = session_id_var.get()
+        return True
+
+class SamplingFilter(logging.Filter):
+    """Keep a fraction of sub-WARNING records, chosen per request.
+
+    Sampling on the request id keeps or drops all of a request's info logs
+    together; warnings and errors are never sampled.
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.threshold = int(max(0.0, min(1.0, rate)) * 0xFFFFFFFF)
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or self.threshold >= 0xFFFFFFFF:
+            return True
+        key = getattr(record, "request_id", None) or f"{record.name}:{record.msg}"
+        return zlib.crc32(str(key).encode()) <= self.threshold
+
+class StructuredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that keeps exceptions separate from the message"""
+
+    def prepare(self, record):
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key in ("request_id", "route", "session_id"):
+            value = getattr(record, key, None)
+            if value:
+                entry[key] = value
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+def setup_logging() -> logging.handlers.QueueListener:
+    """Route all logging through a queue to a JSON stdout handler"""
+    level = getattr(logging, os.environ.get("LOG_LEVEL", "INFO").upper(), logging.INFO)
+    sample_rate = float(os.environ.get("LOG_INFO_SAMPLE_RATE", "1.0"))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = StructuredQueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+    queue_handler.addFilter(SamplingFilter(sample_rate))
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter())
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(level)
+
+    listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+class RequestIdMiddleware:
+    """Assign each request an id (or reuse X-Request-ID) and echo it back"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex
+
+        token = request_id_var.set(request_id)
+        route_token = route_var.set(f"{scope['method']} {scope['path']}")
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_id_var.reset(token)
+            route_var.reset(route_token)
+
+async def bind_log_context(request: Request):
+    """Router dependency: refine the route to its template and bind session id"""
+    route = request.scope.get("route")
+    if route is not None:
+        route_var.set(f"{request.method} {route.path}")
+    session_id = request.path_params.get("session_id")
+    if session_id:
+        session_id_var.set(session_id)
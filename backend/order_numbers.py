@@ -0,0 +1,54 @@
+"""
+Order number allocation for DE---NINE Art Store
+Hands out collision-free, sortable DN-YYYYMMDD-NNNNNN order numbers. Each
+worker leases a block of sequence numbers from a per-day counter document,
+so the database is hit once per block rather than once per order.
+"""
+
+import asyncio
+from datetime import datetime
+from typing import Optional
+
+from pymongo import ReturnDocument
+
+ORDER_NUMBER_PREFIX = "DN"
+
+class OrderNumberAllocator:
+    """Allocates order numbers from leased blocks of a daily counter"""
+
+    def __init__(self, counters, block_size: int = 50, prefix: str = ORDER_NUMBER_PREFIX):
+        self.counters = counters
+        self.block_size = block_size
+        self.prefix = prefix
+        self.leases = 0  # Blocks leased so far, i.e. database round-trips
+
+        self._lock = asyncio.Lock()
+        self._day: Optional[str] = None
+        self._next = 0
+        self._end = 0
+
+    async def next(self, now: Optional[datetime] = None) -> str:
+        """Return the next order number for the current UTC day"""
+        day = (now or datetime.utcnow()).strftime("%Y%m%d")
+        async with self._lock:
+            if day != self._day or self._next >= self._end:
+                await self._lease(day)
+            sequence = self._next
+            self._next += 1
+        return format_order_number(self.prefix, day, sequence)
+
+    async def _lease(self, day: str):
+        counter = await self.counters.find_one_and_update(
+            {"_id": f"order_number:{day}"},
+            {"$inc": {"value": self.block_size}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        self.leases += 1
+        self._day = day
+        self._end = counter["value"] + 1
+        self._next = self._end - self.block_size
+
+def format_order_number(prefix: str, day: str, sequence: int) -> str:
+    # Six digits keep numbers within a day lexically sortable
+    return f"{prefix}-{day}-{sequence:06d}"
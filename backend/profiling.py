@@ -0,0 +1,181 @@
+"""
+On-demand request profiling for DE---NINE Art Store
+Profiles a request when it carries X-Profile-Token matching PROFILE_TOKEN,
+or for a PROFILE_SAMPLE_RATE fraction of requests. A background thread
+samples the event loop thread's stack and the samples are written in
+folded-stack format (flamegraph.pl, speedscope, inferno) to a bounded
+directory. With neither option set the middleware is a pass-through.
+
+Samples cover the whole event loop thread while the request runs, so
+concurrent requests show up too; profile under low traffic where possible.
+"""
+
+import asyncio
+import hmac
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from log_config import request_id_var
+
+logger = logging.getLogger(__name__)
+
+PROFILE_ID_PATTERN = re.compile(r"^[0-9]+-[0-9a-f]{8}$")
+
+def fold_stack(frame) -> str:
+    """Outermost-first 'function (file:line)' frames joined with ';'"""
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(frames))
+
+class StackSampler:
+    """Samples one thread's stack at a fixed interval from a helper thread"""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.samples[fold_stack(frame)] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+
+class ProfileStore:
+    """Folded profiles plus a JSON sidecar each, keeping the newest max_profiles"""
+
+    def __init__(self, directory: Path, max_profiles: int = 50):
+        self.directory = directory
+        self.max_profiles = max_profiles
+
+    @classmethod
+    def from_env(cls) -> "ProfileStore":
+        return cls(
+            Path(os.environ.get("PROFILE_DIR", Path(__file__).parent / "profiles")),
+            max_profiles=int(os.environ.get("PROFILE_MAX_FILES", 50))
+        )
+
+    @staticmethod
+    def new_id() -> str:
+        return f"{int(time.time() * 1000)}-{random.getrandbits(32):08x}"
+
+    def save(self, profile_id: str, samples: Counter, metadata: Dict[str, Any]):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        folded = "".join(f"{stack} {count}\n" for stack, count in samples.most_common())
+        (self.directory / f"{profile_id}.folded").write_text(folded)
+        (self.directory / f"{profile_id}.json").write_text(json.dumps({"id": profile_id, **metadata}))
+        self._evict()
+
+    def _evict(self):
+        profiles = sorted(self.directory.glob("*.folded"))
+        for path in profiles[:-self.max_profiles]:
+            path.unlink(missing_ok=True)
+            path.with_suffix(".json").unlink(missing_ok=True)
+
+    def list(self) -> List[Dict[str, Any]]:
+        if not self.directory.exists():
+            return []
+        profiles = []
+        for path in sorted(self.directory.glob("*.json"), reverse=True):
+            try:
+                profiles.append(json.loads(path.read_text()))
+            except (OSError, ValueError):
+                continue
+        return profiles
+
+    def path(self, profile_id: str) -> Optional[Path]:
+        if not PROFILE_ID_PATTERN.match(profile_id):
+            return None
+        path = self.directory / f"{profile_id}.folded"
+        return path if path.exists() else None
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles opted-in or sampled requests"""
+
+    def __init__(
+        self,
+        app,
+        store: ProfileStore,
+        token: Optional[str] = None,
+        sample_rate: float = 0.0,
+        interval: float = 0.005
+    ):
+        self.app = app
+        self.store = store
+        self.token = token.encode() if token else None
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.enabled = bool(self.token) or sample_rate > 0
+        # One sampler at a time; the loop thread is shared by all requests
+        self._active = threading.Lock()
+
+    def _requested(self, scope) -> bool:
+        if self.token:
+            for name, value in scope["headers"]:
+                if name == b"x-profile-token":
+                    return hmac.compare_digest(value, self.token)
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http" or not self._requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        if not self._active.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        sampler = StackSampler(threading.get_ident(), self.interval)
+        profile_id = self.store.new_id()
+        status = {"code": None}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            samples = sampler.stop()
+            self._active.release()
+            duration = time.perf_counter() - started
+            try:
+                # Profile files are written off the event loop
+                await asyncio.to_thread(self.store.save, profile_id, samples, {
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status": status["code"],
+                    "duration_ms": round(duration * 1000, 2),
+                    "samples": sum(samples.values()),
+                    "request_id": request_id_var.get(),
+                    "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                })
+                logger.info("Profiled %s %s as %s", scope["method"], scope["path"], profile_id)
+            except OSError as e:
+                logger.warning("Could not write profile for %s %s: %s", scope["method"], scope["path"], e)
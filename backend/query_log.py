@@ -0,0 +1,271 @@
+"""
+Slow query log for DE---NINE Art Store
+A pymongo command listener that records reads and writes slower than
+SLOW_QUERY_MS in a capped collection. Filter values are redacted so the log
+holds query shapes, not customer data. The first time a shape is seen its
+plan is captured with explain, off the request path, so a COLLSCAN or an
+in-memory SORT shows up next to the query that caused it.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from pymongo import monitoring
+from pymongo.errors import CollectionInvalid
+
+from log_config import request_id_var, route_var
+
+logger = logging.getLogger(__name__)
+
+# Commands whose filter/pipeline decides the query plan
+MONITORED_COMMANDS = {"find", "aggregate", "count", "distinct", "findAndModify", "update", "delete"}
+
+# Driver and session fields that explain must not be given
+_DRIVER_FIELDS = {
+    "lsid", "txnNumber", "autocommit", "startTransaction", "writeConcern", "readConcern",
+    "$db", "$clusterTime", "$readPreference", "cursor"
+}
+
+def redact(value: Any) -> Any:
+    """Replace leaf values with '?', keeping field names and operators"""
+    if isinstance(value, dict):
+        return {key: redact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        # $in: [1, 2, 3] and $in: [4] have the same shape
+        shapes = []
+        for item in value:
+            shape = redact(item)
+            if shape not in shapes:
+                shapes.append(shape)
+        return shapes
+    return "?"
+
+def query_shape(command_name: str, command: Dict[str, Any]) -> Dict[str, Any]:
+    """Redacted filter, sort and pipeline of a monitored command"""
+    if command_name == "aggregate":
+        return {"pipeline": redact(command.get("pipeline", []))}
+    if command_name in ("update", "delete"):
+        statements = command.get("updates" if command_name == "update" else "deletes") or [{}]
+        return {"filter": redact(statements[0].get("q", {}))}
+
+    shape = {"filter": redact(command.get("filter", command.get("query", {})))}
+    if command.get("sort"):
+        # Sort directions are not sensitive and decide whether an index applies
+        shape["sort"] = dict(command["sort"])
+    if command_name == "distinct":
+        shape["key"] = command.get("key")
+    return shape
+
+def shape_id(command_name: str, collection: str, shape: Dict[str, Any]) -> str:
+    canonical = json.dumps([command_name, collection, shape], sort_keys=True, default=str)
+    return hashlib.sha1(canonical.encode()).hexdigest()[:16]
+
+def docs_returned(command_name: str, reply: Dict[str, Any]) -> Optional[int]:
+    if command_name in ("find", "aggregate"):
+        return len(reply.get("cursor", {}).get("firstBatch", []))
+    if command_name == "findAndModify":
+        return 1 if reply.get("value") is not None else 0
+    if command_name == "distinct":
+        return len(reply.get("values", []))
+    return reply.get("n")
+
+def summarize_plan(explain: Dict[str, Any]) -> Dict[str, Any]:
+    """Stages and indexes of the winning plan, outermost stage first"""
+    planner = explain.get("queryPlanner", {})
+    # Aggregations put the planner output under their first stage
+    if not planner:
+        for stage in explain.get("stages", []):
+            planner = stage.get("$cursor", {}).get("queryPlanner", {})
+            if planner:
+                break
+    stages, indexes = [], []
+    pending = [planner.get("winningPlan", {})]
+    while pending:
+        node = pending.pop(0)
+        node = node.get("queryPlan", node)  # slot-based engine nests the plan
+        if "stage" in node:
+            stages.append(node["stage"])
+        if "indexName" in node:
+            indexes.append(node["indexName"])
+        pending.extend(node.get("inputStages", []))
+        if "inputStage" in node:
+            pending.append(node["inputStage"])
+    return {
+        "stages": stages,
+        "indexes": indexes,
+        "collscan": "COLLSCAN" in stages,
+        "in_memory_sort": "SORT" in stages,
+    }
+
+def explain_command(command: Dict[str, Any], verbosity: str = "queryPlanner") -> Dict[str, Any]:
+    """An explain command for a command captured by a listener"""
+    explained = {key: value for key, value in command.items() if key not in _DRIVER_FIELDS}
+    if "aggregate" in explained:
+        explained["cursor"] = {}
+    for statements in ("updates", "deletes"):
+        # explain takes a single write statement
+        if statements in explained:
+            explained[statements] = explained[statements][:1]
+    return {"explain": explained, "verbosity": verbosity}
+
+class SlowQueryLog(monitoring.CommandListener):
+    """Command listener plus the event-loop task that persists its findings"""
+
+    def __init__(
+        self,
+        threshold_ms: float,
+        collection_name: str = "slow_queries",
+        size_bytes: int = 16 * 1024 * 1024,
+        max_pending: int = 1000,
+        max_shapes: int = 10000
+    ):
+        self.threshold_ms = threshold_ms
+        self.collection_name = collection_name
+        self.size_bytes = size_bytes
+        self.max_shapes = max_shapes
+        self.dropped = 0
+        self._max_pending = max_pending
+        self._started: Dict[Any, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._explained = set()
+        self._loop = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task = None
+        self._client = None
+        self._db = None
+        self._collection = None
+
+    @classmethod
+    def from_env(cls) -> Optional["SlowQueryLog"]:
+        threshold_ms = float(os.environ.get("SLOW_QUERY_MS", "100"))
+        if threshold_ms <= 0:
+            return None
+        return cls(
+            threshold_ms,
+            size_bytes=int(os.environ.get("SLOW_QUERY_LOG_BYTES", 16 * 1024 * 1024))
+        )
+
+    # Listener callbacks run on Motor's executor threads
+
+    def started(self, event):
+        if event.command_name not in MONITORED_COMMANDS or self._loop is None:
+            return
+        collection = event.command.get(event.command_name)
+        if collection == self.collection_name:
+            return
+        with self._lock:
+            self._started[(event.connection_id, event.request_id)] = {
+                "command": event.command,
+                "collection": collection,
+                "request_id": request_id_var.get(),
+                "route": route_var.get(),
+            }
+
+    def succeeded(self, event):
+        with self._lock:
+            started = self._started.pop((event.connection_id, event.request_id), None)
+        if started is None:
+            return
+        duration_ms = event.duration_micros / 1000
+        loop = self._loop
+        if duration_ms < self.threshold_ms or loop is None:
+            return
+        started.update(
+            command_name=event.command_name,
+            database=event.database_name,
+            duration_ms=round(duration_ms, 2),
+            docs_returned=docs_returned(event.command_name, event.reply),
+            at=datetime.now(timezone.utc),
+        )
+        try:
+            loop.call_soon_threadsafe(self._enqueue, started)
+        except RuntimeError:  # loop closed during shutdown
+            pass
+
+    def failed(self, event):
+        with self._lock:
+            self._started.pop((event.connection_id, event.request_id), None)
+
+    def _enqueue(self, entry: Dict[str, Any]):
+        try:
+            self._queue.put_nowait(entry)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    # Recording runs on the event loop
+
+    async def start(self, client, db):
+        """Begin recording slow commands; the capped collection is created lazily"""
+        self._client = client
+        self._db = db
+        self._collection = db[self.collection_name]
+        self._queue = asyncio.Queue(maxsize=self._max_pending)
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.create_task(self._run(), name="slow-query-log")
+
+    async def stop(self):
+        self._loop = None
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _create_collection(self):
+        try:
+            await self._db.create_collection(self.collection_name, capped=True, size=self.size_bytes)
+        except CollectionInvalid:
+            pass  # already exists
+
+    async def _run(self):
+        try:
+            await self._create_collection()
+        except Exception as e:
+            logger.warning("Could not create capped %s collection: %s", self.collection_name, e)
+        while True:
+            entry = await self._queue.get()
+            try:
+                await self._record(entry)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Failed to record slow query on %s: %s", entry.get("collection"), e)
+
+    async def _record(self, entry: Dict[str, Any]):
+        command = entry.pop("command")
+        shape = query_shape(entry["command_name"], command)
+        entry["shape"] = shape
+        entry["shape_id"] = shape_id(entry["command_name"], entry["collection"], shape)
+
+        if entry["shape_id"] not in self._explained:
+            if len(self._explained) >= self.max_shapes:
+                self._explained.clear()
+            self._explained.add(entry["shape_id"])
+            entry["plan"] = await self._explain(entry["database"], command)
+
+        logger.warning(
+            "Slow %s on %s took %.1fms (shape %s)",
+            entry["command_name"], entry["collection"], entry["duration_ms"], entry["shape_id"]
+        )
+        await self._collection.insert_one(entry)
+
+    async def _explain(self, database: str, command: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        try:
+            result = await self._client[database].command(explain_command(command))
+        except Exception as e:
+            logger.warning("Could not explain slow query: %s", e)
+            return None
+        return summarize_plan(result)
+
+    async def recent(self, limit: int = 50, collection: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Newest entries first"""
+        query = {"collection": collection} if collection else {}
+        cursor = self._collection.find(query, {"_id": 0}).sort("$natural", -1).limit(limit)
+        return await cursor.to_list(length=limit)
@@ -0,0 +1,193 @@
+"""
+Rate limiting for DE---NINE Art Store
+Token-bucket limits per route, keyed on session id and client IP. Buckets
+live in process memory by default, or in Redis so limits hold across workers.
+"""
+
+import logging
+import math
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, Request
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # redis is optional; the in-process store is always available
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class RateLimit:
+    rate: float  # Tokens refilled per second
+    burst: int  # Bucket capacity
+
+# Per-route budgets. Client IPs get a larger budget than sessions because
+# many shoppers can share one address behind NAT.
+ROUTE_LIMITS: Dict[str, RateLimit] = {
+    "cart_add": RateLimit(rate=2.0, burst=10),
+    "checkout": RateLimit(rate=0.2, burst=3),
+    "payment_status": RateLimit(rate=1.0, burst=10),
+}
+IP_LIMIT_MULTIPLIER = 5
+
+class MemoryBucketStore:
+    """Token buckets in a dict; idle buckets are swept once the table grows"""
+
+    def __init__(self, max_buckets: int = 100_000):
+        self.max_buckets = max_buckets
+        self._buckets: Dict[str, Tuple[float, float, float]] = {}
+
+    async def take(self, checks: List[Tuple[str, RateLimit]]) -> float:
+        """Take a token from every bucket; return 0 or seconds until allowed"""
+        now = time.monotonic()
+        refilled = []
+        retry_after = 0.0
+        for key, limit in checks:
+            tokens, updated, _ = self._buckets.get(key, (limit.burst, now, 0.0))
+            tokens = min(limit.burst, tokens + (now - updated) * limit.rate)
+            if tokens < 1:
+                retry_after = max(retry_after, (1 - tokens) / limit.rate)
+            refilled.append((key, limit, tokens))
+
+        # Only consume when every bucket allows the request
+        for key, limit, tokens in refilled:
+            if not retry_after:
+                tokens -= 1
+            full_at = now + (limit.burst - tokens) / limit.rate
+            self._buckets[key] = (tokens, now, full_at)
+
+        if len(self._buckets) > self.max_buckets:
+            self._sweep(now)
+        return retry_after
+
+    def _sweep(self, now: float):
+        """Drop buckets that have refilled completely, i.e. carry no state"""
+        self._buckets = {
+            key: bucket for key, bucket in self._buckets.items() if bucket[2] > now
+        }
+
+# Atomically refills and takes from every bucket in KEYS. ARGV holds the
+# current time followed by (rate, burst) per key. Returns retry-after in ms.
+TOKEN_BUCKET_SCRIPT = """
+local now = tonumber(ARGV[1])
+local state = {}
+local retry_after = 0
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[i * 2])
+    local burst = tonumber(ARGV[i * 2 + 1])
+    local bucket = redis.call('HMGET', key, 'tokens', 'updated')
+    local tokens = tonumber(bucket[1]) or burst
+    local updated = tonumber(bucket[2]) or now
+    tokens = math.min(burst, tokens + (now - updated) * rate)
+    if tokens < 1 then
+        retry_after = math.max(retry_after, (1 - tokens) / rate)
+    end
+    state[i] = {tokens, rate, burst}
+end
+for i, key in ipairs(KEYS) do
+    local tokens, rate, burst = state[i][1], state[i][2], state[i][3]
+    if retry_after == 0 then
+        tokens = tokens - 1
+    end
+    redis.call('HSET', key, 'tokens', tokens, 'updated', now)
+    redis.call('PEXPIRE', key, math.ceil((burst - tokens) / rate * 1000) + 1000)
+end
+return math.ceil(retry_after * 1000)
+"""
+
+class RedisBucketStore:
+    """Token buckets shared across workers through a Redis Lua script"""
+
+    def __init__(self, url: str, prefix: str = "denine:ratelimit:"):
+        self.prefix = prefix
+        self._redis = aioredis.from_url(url)
+        self._script = self._redis.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def take(self, checks: List[Tuple[str, RateLimit]]) -> float:
+        args = [time.time()]
+        for _, limit in checks:
+            args += [limit.rate, limit.burst]
+        retry_after_ms = await self._script(
+            keys=[self.prefix + key for key, _ in checks], args=args
+        )
+        return int(retry_after_ms) / 1000
+
+    async def close(self):
+        await self._redis.aclose()
+
+class RateLimiter:
+    """Checks per-route budgets for a session id and client IP"""
+
+    def __init__(
+        self,
+        limits: Dict[str, RateLimit],
+        shared_store: Optional[RedisBucketStore] = None,
+        trust_forwarded: bool = False,
+        enabled: bool = True
+    ):
+        self.limits = limits
+        self.local_store = MemoryBucketStore()
+        self.shared_store = shared_store
+        self.trust_forwarded = trust_forwarded
+        self.enabled = enabled
+
+    @classmethod
+    def from_env(cls) -> "RateLimiter":
+        redis_url = os.environ.get("RATE_LIMIT_REDIS_URL")
+        shared_store = None
+        if redis_url:
+            if aioredis is None:
+                logger.warning("RATE_LIMIT_REDIS_URL is set but redis is not installed; using in-process limits")
+            else:
+                shared_store = RedisBucketStore(redis_url)
+        return cls(
+            limits=ROUTE_LIMITS,
+            shared_store=shared_store,
+            trust_forwarded=os.environ.get("TRUST_PROXY_HEADERS", "").lower() in ("1", "true"),
+            enabled=os.environ.get("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true")
+        )
+
+    def client_ip(self, request: Request) -> str:
+        if self.trust_forwarded:
+            forwarded = request.headers.get("x-forwarded-for")
+            if forwarded:
+                return forwarded.split(",")[0].strip()
+        return request.client.host if request.client else "unknown"
+
+    async def check(self, request: Request, route: str, session_id: str):
+        """Raise 429 with Retry-After when the session or IP budget is spent"""
+        if not self.enabled:
+            return
+
+        limit = self.limits[route]
+        ip_limit = RateLimit(rate=limit.rate * IP_LIMIT_MULTIPLIER, burst=limit.burst * IP_LIMIT_MULTIPLIER)
+        checks = [
+            (f"{route}:session:{session_id}", limit),
+            (f"{route}:ip:{self.client_ip(request)}", ip_limit),
+        ]
+
+        retry_after = 0.0
+        if self.shared_store:
+            try:
+                retry_after = await self.shared_store.take(checks)
+            except Exception as e:
+                # Fall back to per-worker limits rather than failing requests
+                logger.warning("Shared rate limit store unavailable: %s", e)
+                retry_after = await self.local_store.take(checks)
+        else:
+            retry_after = await self.local_store.take(checks)
+
+        if retry_after:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+            )
+
+    async def close(self):
+        if self.shared_store:
+            await self.shared_store.close()
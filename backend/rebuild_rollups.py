@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Sales rollup backfill script for DE---NINE Art Store
+Recomputes the sales_rollups collection from all existing orders.
+Run it once after deploying rollups, or after repairing order data.
+"""
+
+import asyncio
+import os
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from sales_rollups import rebuild_rollups
+
+# Database configuration
+MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+DB_NAME = os.environ.get("DB_NAME", "denine_artstore")
+
+async def rebuild():
+    """Rebuild sales rollups from the orders collection"""
+    try:
+        client = AsyncIOMotorClient(MONGO_URL)
+        db = client[DB_NAME]
+        
+        print(f"Connected to MongoDB: {DB_NAME}")
+        
+        order_count = await db.orders.count_documents({})
+        print(f"Rebuilding rollups from {order_count} orders")
+        
+        rollup_count = await rebuild_rollups(db)
+        await db.sales_rollups.create_index([("day", 1), ("theme_id", 1)], unique=True)
+        print(f"Wrote {rollup_count} day/theme rollups")
+        
+        client.close()
+        print("Sales rollup rebuild completed successfully!")
+        
+    except Exception as e:
+        print(f"Error rebuilding sales rollups: {str(e)}")
+        raise
+
+if __name__ == "__main__":
+    print("Rebuilding DE---NINE Art Store sales rollups...")
+    asyncio.run(rebuild())
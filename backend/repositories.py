@@ -0,0 +1,560 @@
+"""
+Data access for DE---NINE Art Store
+Repositories for print themes, carts, payment transactions, orders and page
+content, with a MongoDB implementation and an in-memory one for benchmarks
+and tests. REPOSITORY_BACKEND=mongo|memory picks one at startup.
+
+The in-memory backend covers these collections only; idempotency keys,
+order number counters, sales rollups and the email outbox still use MongoDB.
+"""
+
+import copy
+import os
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from cart_store import CartStore, MemoryCartStore, cart_store_from_env
+
+# Interfaces
+
+class ThemeRepository(ABC):
+    @abstractmethod
+    async def list_all(self, projection: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def get(self, theme_id: str, projection: Dict[str, Any] = None) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def list_featured(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Theme summaries with only the featured (else first) variant"""
+
+    @abstractmethod
+    async def get_many(self, theme_ids: List[str], projection: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def create(self, document: Dict[str, Any]) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    async def update(self, theme_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Set top-level fields; returns the updated theme or None"""
+
+    @abstractmethod
+    async def update_variant(self, theme_id: str, variant_id: str, changes: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Set fields on one variant (featured=True unfeatures the others)"""
+
+    @abstractmethod
+    async def delete(self, theme_id: str) -> bool:
+        ...
+
+    @abstractmethod
+    async def bulk_upsert(self, documents: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Upsert themes by theme_id; created_at is only written on insert.
+
+        Returns counts of inserted/updated/unchanged themes and a list of
+        (index, message) write errors.
+        """
+
+class PaymentRepository(ABC):
+    @abstractmethod
+    async def get(self, payment_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def find_open(self, session_id: str, cart_hash: str, now: datetime) -> Optional[Dict[str, Any]]:
+        """Newest unexpired pending/open transaction for an identical cart"""
+
+    @abstractmethod
+    async def create(self, document: Dict[str, Any]):
+        ...
+
+    @abstractmethod
+    async def update_status(self, payment_id: str, fields: Dict[str, Any]):
+        ...
+
+class OrderRepository(ABC):
+    @abstractmethod
+    async def get_by_payment(self, payment_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def create(self, document: Dict[str, Any]):
+        """Insert an order; raises DuplicateKeyError for a repeated payment"""
+
+    @abstractmethod
+    async def claim_rollups(self, order_id: ObjectId) -> bool:
+        """Mark the order's rollups as applied; False if already claimed"""
+
+    @abstractmethod
+    async def release_rollups(self, order_id: ObjectId):
+        ...
+
+    @abstractmethod
+    async def mark_cart_cleared(self, order_id: ObjectId):
+        ...
+
+    @abstractmethod
+    async def list_for_session(self, session_id: str, projection: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        """Orders for a session, newest first"""
+
+    @abstractmethod
+    def iter_orders(
+        self,
+        status: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        batch_size: int = 500
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Orders in created_at order, fetched batch_size at a time"""
+
+class PageRepository(ABC):
+    @abstractmethod
+    async def get(self, page_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def list_all(self, limit: int = 100) -> List[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def upsert(self, page_id: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+        ...
+
+def order_query(status: Optional[str], start: Optional[datetime], end: Optional[datetime]) -> Dict[str, Any]:
+    query: Dict[str, Any] = {}
+    if status:
+        query["status"] = status
+    if start or end:
+        query["created_at"] = {}
+        if start:
+            query["created_at"]["$gte"] = start
+        if end:
+            query["created_at"]["$lt"] = end
+    return query
+
+# Theme fields and variant the landing page shows
+FEATURED_PIPELINE = [
+    {"$project": {
+        "_id": 0,
+        "theme_id": 1,
+        "theme": 1,
+        "description": 1,
+        "base_price": 1,
+        "variant": {"$ifNull": [
+            {"$arrayElemAt": [{"$filter": {"input": "$variants", "cond": "$$this.featured"}}, 0]},
+            {"$arrayElemAt": ["$variants", 0]}
+        ]}
+    }},
+    {"$project": {
+        "theme_id": 1,
+        "theme": 1,
+        "description": 1,
+        "base_price": 1,
+        "variant.id": 1,
+        "variant.name": 1,
+        "variant.image_url": 1
+    }},
+]
+
+def featured_summary(theme: Dict[str, Any]) -> Dict[str, Any]:
+    """FEATURED_PIPELINE for one theme document"""
+    variants = theme.get("variants") or []
+    variant = next((v for v in variants if v.get("featured")), variants[0] if variants else None)
+    summary = {key: theme[key] for key in ("theme_id", "theme", "description", "base_price") if key in theme}
+    if variant is not None:
+        summary["variant"] = {key: variant[key] for key in ("id", "name", "image_url") if key in variant}
+    return summary
+
+def apply_projection(document: Dict[str, Any], projection: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """An inclusion projection (dotted paths, optional _id: 0) as MongoDB applies it"""
+    if not projection:
+        return document
+    projected = {"_id": document["_id"]} if projection.get("_id", 1) and "_id" in document else {}
+    for path, included in projection.items():
+        if path != "_id" and included:
+            _project_path(document, projected, path.split("."))
+    return projected
+
+def _project_path(source: Dict[str, Any], target: Dict[str, Any], parts: List[str]):
+    if parts[0] not in source:
+        return
+    value = source[parts[0]]
+    if len(parts) == 1:
+        target[parts[0]] = value
+    elif isinstance(value, dict):
+        _project_path(value, target.setdefault(parts[0], {}), parts[1:])
+    elif isinstance(value, list):
+        # Paths into arrays project every embedded document
+        items = [item for item in value if isinstance(item, dict)]
+        projected = target.setdefault(parts[0], [{} for _ in items])
+        for item, projected_item in zip(items, projected):
+            _project_path(item, projected_item, parts[1:])
+
+# MongoDB
+
+class MongoThemeRepository(ThemeRepository):
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def list_all(self, projection: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        return await self.collection.find({}, projection).to_list(1000)
+
+    async def get(self, theme_id: str, projection: Dict[str, Any] = None) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"theme_id": theme_id}, projection)
+
+    async def list_featured(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        pipeline = ([{"$limit": limit}] if limit else []) + FEATURED_PIPELINE
+        return await self.collection.aggregate(pipeline).to_list(limit or 1000)
+
+    async def get_many(self, theme_ids: List[str], projection: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        return await self.collection.find({"theme_id": {"$in": theme_ids}}, projection).to_list(len(theme_ids))
+
+    async def create(self, document: Dict[str, Any]) -> Dict[str, Any]:
+        document = dict(document)
+        result = await self.collection.insert_one(document)
+        document["_id"] = result.inserted_id
+        return document
+
+    async def update(self, theme_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one_and_update(
+            {"theme_id": theme_id},
+            {"$set": fields},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def update_variant(self, theme_id: str, variant_id: str, changes: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        # Only the touched fields of the matching array element are written
+        update = {f"variants.$[target].{field}": value for field, value in changes.items()}
+        update["updated_at"] = datetime.utcnow()
+        array_filters = [{"target.id": variant_id}]
+        if changes.get("featured"):
+            # Keep a single featured variant per theme
+            update["variants.$[other].featured"] = False
+            array_filters.append({"other.id": {"$ne": variant_id}})
+
+        return await self.collection.find_one_and_update(
+            {"theme_id": theme_id, "variants.id": variant_id},
+            {"$set": update},
+            array_filters=array_filters,
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def delete(self, theme_id: str) -> bool:
+        result = await self.collection.delete_one({"theme_id": theme_id})
+        return result.deleted_count > 0
+
+    async def bulk_upsert(self, documents: List[Dict[str, Any]]) -> Dict[str, Any]:
+        operations = []
+        for document in documents:
+            fields = dict(document)
+            created_at = fields.pop("created_at", None) or fields.get("updated_at") or datetime.utcnow()
+            operations.append(UpdateOne(
+                {"theme_id": fields["theme_id"]},
+                {"$set": fields, "$setOnInsert": {"created_at": created_at}},
+                upsert=True
+            ))
+
+        errors: List[Tuple[int, str]] = []
+        try:
+            result = await self.collection.bulk_write(operations, ordered=False)
+            details = result.bulk_api_result
+        except BulkWriteError as e:
+            details = e.details
+            errors = [
+                (write_error["index"], write_error.get("errmsg", "Write failed"))
+                for write_error in details.get("writeErrors", [])
+            ]
+
+        return {
+            "inserted": details.get("nUpserted", 0),
+            "updated": details.get("nModified", 0),
+            "unchanged": details.get("nMatched", 0) - details.get("nModified", 0),
+            "errors": errors,
+        }
+
+class MongoPaymentRepository(PaymentRepository):
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def get(self, payment_id: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"payment_id": payment_id})
+
+    async def find_open(self, session_id: str, cart_hash: str, now: datetime) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one(
+            {
+                "session_id": session_id,
+                "cart_hash": cart_hash,
+                "status": {"$in": ["pending", "open"]},
+                "expires_at": {"$gt": now}
+            },
+            sort=[("created_at", -1)]
+        )
+
+    async def create(self, document: Dict[str, Any]):
+        await self.collection.insert_one(document)
+
+    async def update_status(self, payment_id: str, fields: Dict[str, Any]):
+        await self.collection.update_one({"payment_id": payment_id}, {"$set": fields})
+
+class MongoOrderRepository(OrderRepository):
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def get_by_payment(self, payment_id: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"payment_transaction_id": payment_id})
+
+    async def create(self, document: Dict[str, Any]):
+        await self.collection.insert_one(document)
+
+    async def claim_rollups(self, order_id: ObjectId) -> bool:
+        result = await self.collection.update_one(
+            {"_id": order_id, "rollups_applied": {"$ne": True}},
+            {"$set": {"rollups_applied": True}}
+        )
+        return result.modified_count > 0
+
+    async def release_rollups(self, order_id: ObjectId):
+        await self.collection.update_one({"_id": order_id}, {"$unset": {"rollups_applied": ""}})
+
+    async def mark_cart_cleared(self, order_id: ObjectId):
+        await self.collection.update_one({"_id": order_id}, {"$set": {"cart_cleared": True}})
+
+    async def list_for_session(self, session_id: str, projection: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        cursor = self.collection.find({"session_id": session_id}, projection).sort("created_at", -1)
+        return await cursor.to_list(1000)
+
+    async def iter_orders(self, status=None, start=None, end=None, batch_size=500):
+        cursor = self.collection.find(order_query(status, start, end)).sort("created_at", 1).batch_size(batch_size)
+        try:
+            async for order in cursor:
+                yield order
+        finally:
+            await cursor.close()
+
+class MongoPageRepository(PageRepository):
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def get(self, page_id: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"page_id": page_id})
+
+    async def list_all(self, limit: int = 100) -> List[Dict[str, Any]]:
+        return await self.collection.find({}).to_list(limit)
+
+    async def upsert(self, page_id: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+        return await self.collection.find_one_and_update(
+            {"page_id": page_id},
+            {"$set": fields},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+
+# In memory. Documents are copied on the way in and out, as a database
+# round trip would, so callers can mutate what they get back.
+
+class MemoryThemeRepository(ThemeRepository):
+    def __init__(self):
+        self._themes: Dict[str, Dict[str, Any]] = {}
+
+    async def list_all(self, projection: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        return copy.deepcopy([apply_projection(theme, projection) for theme in self._themes.values()])
+
+    async def get(self, theme_id: str, projection: Dict[str, Any] = None) -> Optional[Dict[str, Any]]:
+        theme = self._themes.get(theme_id)
+        return copy.deepcopy(apply_projection(theme, projection)) if theme else None
+
+    async def list_featured(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        themes = list(self._themes.values())[:limit]
+        return copy.deepcopy([featured_summary(theme) for theme in themes])
+
+    async def get_many(self, theme_ids: List[str], projection: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        return [
+            copy.deepcopy(apply_projection(self._themes[theme_id], projection))
+            for theme_id in theme_ids if theme_id in self._themes
+        ]
+
+    async def create(self, document: Dict[str, Any]) -> Dict[str, Any]:
+        if document["theme_id"] in self._themes:
+            raise DuplicateKeyError(f"Duplicate theme_id {document['theme_id']}")
+        document = {"_id": ObjectId(), **copy.deepcopy(document)}
+        self._themes[document["theme_id"]] = document
+        return copy.deepcopy(document)
+
+    async def update(self, theme_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        theme = self._themes.get(theme_id)
+        if theme is None:
+            return None
+        new_id = fields.get("theme_id", theme_id)
+        if new_id != theme_id:
+            # theme_id is unique, as in the MongoDB index
+            if new_id in self._themes:
+                raise DuplicateKeyError(f"Duplicate theme_id {new_id}")
+            self._themes[new_id] = self._themes.pop(theme_id)
+        theme.update(copy.deepcopy(fields))
+        return copy.deepcopy(theme)
+
+    async def update_variant(self, theme_id: str, variant_id: str, changes: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        theme = self._themes.get(theme_id)
+        variants = theme.get("variants", []) if theme else []
+        if not any(variant["id"] == variant_id for variant in variants):
+            return None
+        for variant in variants:
+            if variant["id"] == variant_id:
+                variant.update(changes)
+            elif changes.get("featured"):
+                variant["featured"] = False
+        theme["updated_at"] = datetime.utcnow()
+        return copy.deepcopy(theme)
+
+    async def delete(self, theme_id: str) -> bool:
+        return self._themes.pop(theme_id, None) is not None
+
+    async def bulk_upsert(self, documents: List[Dict[str, Any]]) -> Dict[str, Any]:
+        counts = {"inserted": 0, "updated": 0, "unchanged": 0, "errors": []}
+        for document in documents:
+            fields = copy.deepcopy(document)
+            created_at = fields.pop("created_at", None) or fields.get("updated_at") or datetime.utcnow()
+            theme = self._themes.get(fields["theme_id"])
+            if theme is None:
+                self._themes[fields["theme_id"]] = {"_id": ObjectId(), **fields, "created_at": created_at}
+                counts["inserted"] += 1
+            elif all(theme.get(key) == value for key, value in fields.items()):
+                counts["unchanged"] += 1
+            else:
+                theme.update(fields)
+                counts["updated"] += 1
+        return counts
+
+class MemoryPaymentRepository(PaymentRepository):
+    def __init__(self):
+        self._payments: Dict[str, Dict[str, Any]] = {}
+
+    async def get(self, payment_id: str) -> Optional[Dict[str, Any]]:
+        return copy.deepcopy(self._payments.get(payment_id))
+
+    async def find_open(self, session_id: str, cart_hash: str, now: datetime) -> Optional[Dict[str, Any]]:
+        candidates = [
+            payment for payment in self._payments.values()
+            if payment["session_id"] == session_id
+            and payment.get("cart_hash") == cart_hash
+            and payment.get("status") in ("pending", "open")
+            and payment.get("expires_at") and payment["expires_at"] > now
+        ]
+        newest = max(candidates, key=lambda payment: payment["created_at"], default=None)
+        return copy.deepcopy(newest)
+
+    async def create(self, document: Dict[str, Any]):
+        if document["payment_id"] in self._payments:
+            raise DuplicateKeyError(f"Duplicate payment_id {document['payment_id']}")
+        self._payments[document["payment_id"]] = copy.deepcopy(document)
+
+    async def update_status(self, payment_id: str, fields: Dict[str, Any]):
+        if payment_id in self._payments:
+            self._payments[payment_id].update(copy.deepcopy(fields))
+
+class MemoryOrderRepository(OrderRepository):
+    def __init__(self):
+        self._orders: Dict[ObjectId, Dict[str, Any]] = {}
+
+    async def get_by_payment(self, payment_id: str) -> Optional[Dict[str, Any]]:
+        for order in self._orders.values():
+            if order.get("payment_transaction_id") == payment_id:
+                return copy.deepcopy(order)
+        return None
+
+    async def create(self, document: Dict[str, Any]):
+        payment_id = document.get("payment_transaction_id")
+        if payment_id and await self.get_by_payment(payment_id):
+            raise DuplicateKeyError(f"Duplicate payment_transaction_id {payment_id}")
+        self._orders[document["_id"]] = copy.deepcopy(document)
+
+    async def claim_rollups(self, order_id: ObjectId) -> bool:
+        order = self._orders.get(order_id)
+        if order is None or order.get("rollups_applied"):
+            return False
+        order["rollups_applied"] = True
+        return True
+
+    async def release_rollups(self, order_id: ObjectId):
+        if order_id in self._orders:
+            self._orders[order_id].pop("rollups_applied", None)
+
+    async def mark_cart_cleared(self, order_id: ObjectId):
+        if order_id in self._orders:
+            self._orders[order_id]["cart_cleared"] = True
+
+    async def list_for_session(self, session_id: str, projection: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        orders = [order for order in self._orders.values() if order["session_id"] == session_id]
+        orders.sort(key=lambda order: order["created_at"], reverse=True)
+        return copy.deepcopy([apply_projection(order, projection) for order in orders])
+
+    async def iter_orders(self, status=None, start=None, end=None, batch_size=500):
+        orders = sorted(self._orders.values(), key=lambda order: order["created_at"])
+        for order in orders:
+            if status and order.get("status") != status:
+                continue
+            if start and order["created_at"] < start:
+                continue
+            if end and order["created_at"] >= end:
+                continue
+            yield copy.deepcopy(order)
+
+class MemoryPageRepository(PageRepository):
+    def __init__(self):
+        self._pages: Dict[str, Dict[str, Any]] = {}
+
+    async def get(self, page_id: str) -> Optional[Dict[str, Any]]:
+        return copy.deepcopy(self._pages.get(page_id))
+
+    async def list_all(self, limit: int = 100) -> List[Dict[str, Any]]:
+        return copy.deepcopy(list(self._pages.values())[:limit])
+
+    async def upsert(self, page_id: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+        page = self._pages.setdefault(page_id, {"_id": ObjectId(), "page_id": page_id})
+        page.update(copy.deepcopy(fields))
+        return copy.deepcopy(page)
+
+@dataclass
+class Repositories:
+    themes: ThemeRepository
+    carts: CartStore
+    payments: PaymentRepository
+    orders: OrderRepository
+    pages: PageRepository
+
+    @classmethod
+    def mongo(cls, db) -> "Repositories":
+        return cls(
+            themes=MongoThemeRepository(db.print_themes),
+            carts=cart_store_from_env(db),
+            payments=MongoPaymentRepository(db.payment_transactions),
+            orders=MongoOrderRepository(db.orders),
+            pages=MongoPageRepository(db.page_content)
+        )
+
+    @classmethod
+    def memory(cls) -> "Repositories":
+        return cls(
+            themes=MemoryThemeRepository(),
+            carts=MemoryCartStore(),
+            payments=MemoryPaymentRepository(),
+            orders=MemoryOrderRepository(),
+            pages=MemoryPageRepository()
+        )
+
+def repositories_from_env(db) -> Repositories:
+    backend = os.environ.get("REPOSITORY_BACKEND", "mongo")
+    if backend == "memory":
+        return Repositories.memory()
+    if backend != "mongo":
+        raise ValueError(f"Unknown REPOSITORY_BACKEND {backend!r}, expected mongo or memory")
+    return Repositories.mongo(db)
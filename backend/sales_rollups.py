@@ -0,0 +1,143 @@
+"""
+Sales rollups for DE---NINE Art Store
+Maintains per-day, per-theme revenue totals in the sales_rollups collection so
+analytics never have to aggregate the live orders collection.
+"""
+
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+ROLLUP_COLLECTION = "sales_rollups"
+
+class PartialRollupError(Exception):
+    """Some of an order's increments were written before a write failed.
+
+    Applying the order again would count those themes twice, so callers keep
+    the order marked as applied; rebuild_rollups repairs the missing themes.
+    """
+
+    def __init__(self, applied: List[str], missing: List[str], error: BulkWriteError):
+        super().__init__(f"applied {applied}, missing {missing}: {error}")
+        self.applied = applied
+        self.missing = missing
+
+def rollup_day(value: datetime) -> str:
+    """Rollups are bucketed by UTC calendar day"""
+    return value.strftime("%Y-%m-%d")
+
+def order_rollup_increments(order: Dict[str, Any]) -> Dict[str, Dict[str, int]]:
+    """Compute the per-theme increments an order contributes"""
+    increments: Dict[str, Dict[str, int]] = {}
+    for item in order.get("items", []):
+        theme_id = item.get("theme_id")
+        if not theme_id:
+            continue
+        theme = increments.setdefault(theme_id, {"revenue": 0, "quantity": 0, "orders": 1})
+        theme["revenue"] += item.get("total_price", 0)
+        theme["quantity"] += item.get("quantity", 0)
+    return increments
+
+async def apply_order_to_rollups(db, order: Dict[str, Any]):
+    """Add a newly created order to the rollups with $inc upserts.
+
+    All themes go in one ordered bulk write, so a failure leaves a prefix of
+    them applied; PartialRollupError says which when that prefix is not empty.
+    """
+    day = rollup_day(order["created_at"])
+    now = datetime.utcnow()
+    increments = order_rollup_increments(order)
+    if not increments:
+        return
+    try:
+        await db[ROLLUP_COLLECTION].bulk_write([
+            UpdateOne(
+                {"day": day, "theme_id": theme_id},
+                {"$inc": theme_increments, "$set": {"updated_at": now}},
+                upsert=True
+            )
+            for theme_id, theme_increments in increments.items()
+        ], ordered=True)
+    except BulkWriteError as e:
+        theme_ids = list(increments)
+        failed_at = min((error["index"] for error in e.details.get("writeErrors", [])), default=0)
+        if failed_at:
+            raise PartialRollupError(theme_ids[:failed_at], theme_ids[failed_at:], e) from e
+        raise
+
+async def rebuild_rollups(db) -> int:
+    """Recompute all rollups from orders on the server and swap them in.
+
+    Intended for backfills only. Runs a single aggregation that writes to
+    sales_rollups via $out, so the client never holds the orders in memory.
+    """
+    pipeline = [
+        {"$unwind": "$items"},
+        {"$group": {
+            "_id": {
+                "order": "$_id",
+                "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}},
+                "theme_id": "$items.theme_id"
+            },
+            "revenue": {"$sum": "$items.total_price"},
+            "quantity": {"$sum": "$items.quantity"}
+        }},
+        {"$group": {
+            "_id": {"day": "$_id.day", "theme_id": "$_id.theme_id"},
+            "revenue": {"$sum": "$revenue"},
+            "quantity": {"$sum": "$quantity"},
+            "orders": {"$sum": 1}
+        }},
+        {"$project": {
+            "_id": 0,
+            "day": "$_id.day",
+            "theme_id": "$_id.theme_id",
+            "revenue": 1,
+            "quantity": 1,
+            "orders": 1,
+            "updated_at": "$$NOW"
+        }},
+        {"$out": ROLLUP_COLLECTION}
+    ]
+    await db.orders.aggregate(pipeline, allowDiskUse=True).to_list(None)
+    return await db[ROLLUP_COLLECTION].count_documents({})
+
+async def read_rollups(db, start: date, end: date, theme_id: str = None) -> Dict[str, Any]:
+    """Summarise rollups for an inclusive date range"""
+    query: Dict[str, Any] = {
+        "day": {"$gte": start.isoformat(), "$lte": end.isoformat()}
+    }
+    if theme_id:
+        query["theme_id"] = theme_id
+
+    max_rows = ((end - start).days + 1) * 1000
+    rows = await db[ROLLUP_COLLECTION].find(
+        query, {"_id": 0, "updated_at": 0}
+    ).sort([("day", 1), ("theme_id", 1)]).to_list(max_rows)
+
+    days: Dict[str, Dict[str, int]] = defaultdict(lambda: {"revenue": 0, "quantity": 0, "orders": 0})
+    themes: Dict[str, Dict[str, int]] = defaultdict(lambda: {"revenue": 0, "quantity": 0, "orders": 0})
+    for row in rows:
+        for key in ("revenue", "quantity", "orders"):
+            days[row["day"]][key] += row[key]
+            themes[row["theme_id"]][key] += row[key]
+
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "rows": rows,
+        "days": [{"day": day, **totals} for day, totals in sorted(days.items())],
+        "themes": [{"theme_id": theme, **totals} for theme, totals in sorted(themes.items())],
+        "totals": {
+            "revenue": sum(row["revenue"] for row in rows),
+            "quantity": sum(row["quantity"] for row in rows),
+        }
+    }
+
+def default_range(days: int = 30) -> Tuple[date, date]:
+    """The last `days` days, ending today (UTC)"""
+    end = datetime.utcnow().date()
+    return end - timedelta(days=days - 1), end
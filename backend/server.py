@@ -1,26 +1,48 @@
-from fastapi import FastAPI, APIRouter, Depends, HTTPException, Request, BackgroundTasks
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, Request, Query, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, FileResponse, StreamingResponse, Response, JSONResponse
 from motor.motor_asyncio import AsyncIOMotorClient
 from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 import os
+import asyncio
 import logging
+import time
 from pathlib import Path
-from datetime import datetime
-import uuid
+from datetime import datetime, date, timedelta
 from typing import Optional, Dict, Any, List
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, AliasChoices, BeforeValidator
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 from emergentintegrations.payments.stripe.checkout import StripeCheckout, CheckoutSessionResponse, CheckoutStatusResponse, CheckoutSessionRequest
 import json
+import csv
+import hashlib
+import hmac
+import io
+from image_service import ImageService, DERIVATIVE_CACHE_CONTROL, MEDIA_TYPES
+from sales_rollups import apply_order_to_rollups, read_rollups, default_range, PartialRollupError
+from compression import CompressionMiddleware, PrecompressedPayload, MINIMUM_SIZE
+from rate_limit import RateLimiter
+from admission import AdmissionControlMiddleware, admission_registry
+from idempotency import IdempotencyStore, request_fingerprint
+from order_numbers import OrderNumberAllocator
+from log_config import setup_logging, RequestIdMiddleware, bind_log_context
+from background_jobs import BackgroundJobs
+from email_outbox import SmtpSender, OutboxWorker, enqueue_order_confirmation
+from catalog_import import iter_lines, iter_ndjson_themes, iter_csv_themes, import_catalog
+from repositories import repositories_from_env
+from shared_cache import SharedCache, cache_metrics, pack_payload, unpack_payload
+from profiling import ProfilingMiddleware, ProfileStore
+from query_log import SlowQueryLog
 
 # Load environment variables
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# Logging setup
-logging.basicConfig(level=logging.INFO)
+# Logging setup (JSON records written from a background thread,
+# flushed at interpreter exit)
+log_listener = setup_logging()
 logger = logging.getLogger(__name__)
 
 # Database setup
@@ -32,14 +54,51 @@ db = None
 # Global payment clients
 stripe_checkout = None
 
+# Image derivative service
+image_service = None
+
+# Post-payment work and other jobs that run off the request path
+background_jobs = BackgroundJobs()
+
+# Sends queued order confirmation emails; None when SMTP is not configured
+email_worker = None
+
+# Per-session/IP rate limiter for cart and checkout routes
+rate_limiter = None
+
+# Idempotency-Key replay store for cart writes and checkout
+idempotency_store = None
+
+# Block-leasing order number allocator
+order_number_allocator = None
+
+# Data access for themes, carts, payments, orders and pages
+repositories = None
+
+# Optional Redis tier behind the in-process caches (CACHE_REDIS_URL)
+shared_cache = None
+
+# Commands slower than SLOW_QUERY_MS, with explain plans (0 disables)
+slow_query_log = SlowQueryLog.from_env()
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    global client, db, stripe_checkout
+    global client, db, stripe_checkout, image_service, rate_limiter, idempotency_store
+    global order_number_allocator, email_worker, repositories, shared_cache
     
     # Initialize MongoDB
-    client = AsyncIOMotorClient(mongo_url)
+    client = AsyncIOMotorClient(
+        mongo_url, event_listeners=[slow_query_log] if slow_query_log else []
+    )
     db = client[database_name]
+    if slow_query_log:
+        await slow_query_log.start(client, db)
+    idempotency_store = IdempotencyStore(db.idempotency_keys)
+    repositories = repositories_from_env(db)
+    order_number_allocator = OrderNumberAllocator(
+        db.counters, block_size=int(os.environ.get("ORDER_NUMBER_BLOCK_SIZE", 50))
+    )
     
     # Initialize Stripe
     stripe_api_key = os.environ.get('STRIPE_API_KEY')
@@ -49,11 +108,43 @@ async def lifespan(app: FastAPI):
         stripe_checkout = StripeCheckout(api_key=stripe_api_key, webhook_url=webhook_url)
         logger.info("Stripe checkout initialized")
     
+    # Initialize image derivative service
+    image_service = ImageService.from_env()
+    await image_service.start()
+    
+    # Initialize rate limiter
+    rate_limiter = RateLimiter.from_env()
+    
+    # Initialize shared cache tier
+    shared_cache = SharedCache.from_env()
+    if shared_cache:
+        logger.info("Shared cache tier enabled")
+    
+    # Initialize order confirmation emails
+    smtp_sender = SmtpSender.from_env()
+    if smtp_sender:
+        email_worker = OutboxWorker(
+            db.email_outbox, smtp_sender, batch_size=int(os.environ.get("EMAIL_BATCH_SIZE", 20))
+        )
+        email_worker.start()
+        logger.info("Email outbox worker started (SMTP %s:%s)", smtp_sender.host, smtp_sender.port)
+    else:
+        logger.info("SMTP_HOST not set; confirmation emails stay queued in the outbox")
+    
     logger.info("Database and payment services initialized")
     
     yield
     
     # Shutdown
+    await background_jobs.drain(timeout=float(os.environ.get("BACKGROUND_DRAIN_TIMEOUT", 20)))
+    if email_worker:
+        await email_worker.stop()
+    await image_service.close()
+    await rate_limiter.close()
+    if shared_cache:
+        await shared_cache.close()
+    if slow_query_log:
+        await slow_query_log.stop()
     if client:
         client.close()
     logger.info("Application shutdown complete")
@@ -66,6 +157,9 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Admission control (registered first so CORS headers wrap shed responses)
+app.add_middleware(AdmissionControlMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -75,8 +169,28 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compression middleware (brotli when available, gzip otherwise)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.environ.get("COMPRESSION_MIN_SIZE", MINIMUM_SIZE))
+)
+
+# On-demand profiling (X-Profile-Token or PROFILE_SAMPLE_RATE; off by default)
+profile_store = ProfileStore.from_env()
+profile_token = os.environ.get("PROFILE_TOKEN")
+app.add_middleware(
+    ProfilingMiddleware,
+    store=profile_store,
+    token=profile_token,
+    sample_rate=float(os.environ.get("PROFILE_SAMPLE_RATE", "0")),
+    interval=float(os.environ.get("PROFILE_INTERVAL_MS", "5")) / 1000
+)
+
+# Request ids for structured logs (outermost, so every log line has one)
+app.add_middleware(RequestIdMiddleware)
+
 # Create API router
-api_router = APIRouter(prefix="/api")
+api_router = APIRouter(prefix="/api", dependencies=[Depends(bind_log_context)])
 
 # Pydantic models
 from pydantic import ConfigDict
@@ -97,7 +211,7 @@ class PyObjectId(ObjectId):
         return ObjectId(value)
 
     def __str__(self):
-        return str(self)
+        return ObjectId.__str__(self)
 
 class PrintVariant(BaseModel):
     id: str
@@ -145,6 +259,9 @@ class PaymentTransaction(BaseModel):
     payment_status: str = "initiated"
     items: List[Dict[str, Any]] = []
     metadata: Dict[str, str] = {}
+    cart_hash: Optional[str] = None  # Content hash of the cart at checkout
+    checkout_url: Optional[str] = None
+    expires_at: Optional[datetime] = None  # Until when checkout_url may be reused
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
@@ -177,146 +294,548 @@ class CheckoutRequest(BaseModel):
     customer_info: Dict[str, str]
     payment_method: str = "stripe"
 
+class PrintVariantUpdate(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+    
+    name: Optional[str] = None
+    image_url: Optional[str] = None
+    featured: Optional[bool] = None
+
+# Read models: validated straight from Mongo documents and serialised by
+# pydantic-core, mapping _id to id on the way. Fields not declared here
+# (bookkeeping such as rollups_applied or cart_cleared) are dropped.
+ObjectIdStr = Annotated[str, BeforeValidator(str)]
+
+class MongoDocument(BaseModel):
+    model_config = ConfigDict(populate_by_name=True, extra="ignore")
+    
+    id: ObjectIdStr = Field(validation_alias=AliasChoices("_id", "id"))
+
+class PrintVariantResponse(BaseModel):
+    # created_at stays null for variants stored without one
+    id: str
+    name: str
+    image_url: str
+    featured: bool = False
+    created_at: Optional[datetime] = None
+
+class PrintThemeResponse(MongoDocument):
+    theme_id: str
+    theme: str
+    description: str = ""
+    base_price: int
+    variants: List[PrintVariantResponse] = []
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+class PrintsResponse(BaseModel):
+    prints: List[PrintThemeResponse]
+
+class CartThemeSummary(BaseModel):
+    theme_id: str
+    theme: str
+    base_price: int
+    thumbnail_url: Optional[str] = None
+
+class CartVariantSummary(BaseModel):
+    id: str
+    name: str
+    image_url: str
+
+class FeaturedPrintResponse(BaseModel):
+    theme_id: str
+    theme: str
+    description: str = ""
+    base_price: int
+    variant: Optional[CartVariantSummary] = None
+
+class FeaturedPrintsResponse(BaseModel):
+    prints: List[FeaturedPrintResponse]
+
+class CartItemResponse(MongoDocument):
+    session_id: str
+    user_id: Optional[str] = None
+    theme_id: str
+    selected_variants: List[str]
+    quantity: int
+    unit_price: int
+    total_price: int
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    # Only present with ?expand=themes
+    theme: Optional[CartThemeSummary] = None
+    variants: Optional[List[CartVariantSummary]] = None
+
+class CartResponse(BaseModel):
+    subtotal: int
+    shipping: int
+    total: int
+    items: List[CartItemResponse]
+
+class OrderResponse(MongoDocument):
+    order_number: str
+    session_id: str
+    user_id: Optional[str] = None
+    items: List[Dict[str, Any]]
+    subtotal: int
+    shipping_cost: int = 0
+    total: int
+    status: str
+    payment_transaction_id: Optional[str] = None
+    shipping_address: Optional[Dict[str, str]] = None
+    customer_info: Optional[Dict[str, str]] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+class OrdersResponse(BaseModel):
+    orders: List[OrderResponse]
+
+class PageContentResponse(MongoDocument):
+    # Page content is free-form; every stored field is returned
+    model_config = ConfigDict(extra="allow")
+
+    page_id: str
+    updated_at: Optional[datetime] = None
+
+class PagesResponse(BaseModel):
+    pages: List[PageContentResponse]
+
 # Database dependency
 async def get_database():
     return db
 
+async def get_repositories():
+    return repositories
+
+# Catalog response cache
+class CatalogCache:
+    """In-process cache of encoded catalog responses.
+
+    Entries hold the JSON body with its gzip/brotli variants built at fill
+    time. Admin writes invalidate the local worker; the TTL bounds staleness
+    on other workers.
+    """
+
+    def __init__(self, name: str, ttl: float):
+        self.name = name
+        self.ttl = ttl
+        self._entries: Dict[str, tuple] = {}
+
+    def get(self, key: str) -> Optional[PrecompressedPayload]:
+        entry = self._entries.get(key)
+        hit = bool(entry and entry[0] > time.monotonic())
+        cache_metrics.record("local", self.name, hit)
+        return entry[1] if hit else None
+
+    def set(self, key: str, payload: PrecompressedPayload):
+        self._entries[key] = (time.monotonic() + self.ttl, payload)
+
+    def invalidate(self):
+        self._entries.clear()
+
+catalog_cache = CatalogCache("catalog", ttl=float(os.environ.get("CATALOG_CACHE_TTL", "60")))
+
+# Marketing pages change rarely; admin updates refresh the local entry
+page_cache = CatalogCache("pages", ttl=float(os.environ.get("PAGE_CACHE_TTL", "300")))
+
+# Shared tier TTLs; writes invalidate explicitly, these bound anything missed
+SHARED_CACHE_TTL = float(os.environ.get("SHARED_CACHE_TTL", "600"))
+CART_CACHE_TTL = float(os.environ.get("CART_CACHE_TTL", "900"))
+
+# Open Stripe sessions are reused for identical carts within this window,
+# well inside Stripe's own 24h session expiry
+CHECKOUT_REUSE_SECONDS = int(os.environ.get("CHECKOUT_REUSE_SECONDS", 30 * 60))
+
 # Helper functions
-def generate_order_number() -> str:
-    """Generate unique order number"""
-    return f"DN-{datetime.now().strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
+def json_default(value):
+    """Encode BSON/datetime values for JSON output"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
 
-async def calculate_cart_total(session_id: str) -> Dict[str, Any]:
-    """Calculate cart totals"""
-    cart_items = await db.cart_items.find({"session_id": session_id}).to_list(1000)
+def model_response(model: BaseModel, **dump_options) -> Response:
+    """Serialise a read model with pydantic-core, bypassing jsonable_encoder"""
+    return Response(model.model_dump_json(**dump_options), media_type="application/json")
+
+async def build_catalog_payload(model: BaseModel) -> PrecompressedPayload:
+    """Encode and compress a catalog response off the event loop"""
+    return await asyncio.to_thread(
+        lambda: PrecompressedPayload.from_body(model.model_dump_json().encode())
+    )
+
+# Theme fields embedded in cart items when the cart is expanded
+CART_THEME_PROJECTION = {
+    "_id": 0,
+    "theme_id": 1,
+    "theme": 1,
+    "base_price": 1,
+    "variants.id": 1,
+    "variants.name": 1,
+    "variants.image_url": 1,
+    "variants.featured": 1,
+}
+
+# Fields selectable with ?fields=; "variants.name" style entries pick
+# fields of embedded documents
+THEME_FIELDS = set(PrintThemeResponse.model_fields) | {f"variants.{name}" for name in PrintVariantResponse.model_fields}
+ORDER_FIELDS = set(OrderResponse.model_fields)
+CART_ITEM_FIELDS = set(CartItemResponse.model_fields)
+
+def parse_fields(fields: Optional[str], allowed: set) -> Optional[List[str]]:
+    """Parse a comma separated ?fields= value; None selects every field"""
+    if not fields:
+        return None
+    selected = {part.strip() for part in fields.split(",") if part.strip()}
+    unknown = sorted(selected - allowed)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    # "variants" already covers "variants.name"; MongoDB rejects both together
+    selected = {field for field in selected if "." not in field or field.split(".")[0] not in selected}
+    return sorted(selected) or None
+
+def fields_projection(selected: List[str]) -> Dict[str, int]:
+    """MongoDB projection for parsed ?fields= (id is the document _id)"""
+    projection = {field: 1 for field in selected if field != "id"}
+    projection["_id"] = 1 if "id" in selected else 0
+    return projection
+
+def sparse_document(document: Dict[str, Any]) -> Dict[str, Any]:
+    """A projected document shaped like its read model (_id becomes id)"""
+    if "_id" in document:
+        return {"id": str(document.pop("_id")), **document}
+    return document
+
+def sparse_json(body: Dict[str, Any]) -> bytes:
+    return json.dumps(body, default=json_default).encode()
+
+def parse_expand(expand: Optional[str]) -> set:
+    """Parse a comma separated ?expand= value"""
+    if not expand:
+        return set()
+    return {part.strip() for part in expand.split(",") if part.strip()}
+
+async def expand_cart_themes(cart_items: List[Dict[str, Any]]) -> None:
+    """Embed theme details in cart items using a single batched lookup"""
+    theme_ids = list({item["theme_id"] for item in cart_items})
+    if not theme_ids:
+        return
+    
+    themes = await repositories.themes.get_many(theme_ids, CART_THEME_PROJECTION)
+    themes_by_id = {theme["theme_id"]: theme for theme in themes}
     
-    # Convert ObjectId to string for JSON serialization
     for item in cart_items:
-        item["id"] = str(item["_id"])
-        del item["_id"]
+        theme = themes_by_id.get(item["theme_id"])
+        if not theme:
+            item["theme"] = None
+            item["variants"] = []
+            continue
+        
+        variants = {variant["id"]: variant for variant in theme.get("variants", [])}
+        featured = next(
+            (variant for variant in theme.get("variants", []) if variant.get("featured")),
+            None
+        )
+        item["theme"] = {
+            "theme_id": theme["theme_id"],
+            "theme": theme["theme"],
+            "base_price": theme["base_price"],
+            "thumbnail_url": featured["image_url"] if featured else None
+        }
+        item["variants"] = [
+            {
+                "id": variants[variant_id]["id"],
+                "name": variants[variant_id]["name"],
+                "image_url": variants[variant_id]["image_url"]
+            }
+            for variant_id in item["selected_variants"]
+            if variant_id in variants
+        ]
+
+def schedule_image_pregeneration(image_urls: List[str]):
+    """Generate derivatives for new catalog images without delaying the response"""
+    if not image_service or not image_urls:
+        return
+    # pregenerate logs its own failures, so there is nothing to retry
+    background_jobs.submit("image_pregeneration", image_service.pregenerate, image_urls, max_attempts=1)
+
+async def calculate_cart_total(
+    session_id: str,
+    expand_themes: bool = False,
+    use_cache: bool = True
+) -> CartResponse:
+    """Calculate cart totals, optionally embedding theme details"""
+    cache_key = f"{session_id}:{'themes' if expand_themes else 'plain'}"
+    version = -1
+    if shared_cache and use_cache:
+        cached, version = await shared_cache.get("cart", cache_key, session_id)
+        if cached is not None:
+            return CartResponse.model_validate_json(cached)
+    
+    cart_items = await repositories.carts.get_items(session_id)
+    cart_data = await build_cart(cart_items, expand_themes)
+    
+    if shared_cache and use_cache:
+        await shared_cache.set(
+            "cart", cache_key, version, cart_data.model_dump_json(exclude_unset=True).encode(), CART_CACHE_TTL
+        )
+    return cart_data
+
+async def invalidate_cart(session_id: str):
+    """Drop shared cart summaries after a cart write"""
+    if shared_cache:
+        await shared_cache.invalidate("cart", session_id, CART_CACHE_TTL)
+
+async def cached_payload(cache: CatalogCache, key: str, build) -> PrecompressedPayload:
+    """Serve from the worker cache, then the shared tier, then build()"""
+    payload = cache.get(key)
+    if payload is not None:
+        return payload
+    
+    version = -1
+    if shared_cache:
+        cached, version = await shared_cache.get(cache.name, key, "all")
+        if cached is not None:
+            payload = unpack_payload(cached)
+    
+    if payload is None:
+        payload = await build()
+        if shared_cache:
+            await shared_cache.set(cache.name, key, version, pack_payload(payload), SHARED_CACHE_TTL)
+    
+    cache.set(key, payload)
+    return payload
+
+async def invalidate_cached_payloads(cache: CatalogCache):
+    """Drop a cache on this worker and in the shared tier"""
+    cache.invalidate()
+    if shared_cache:
+        await shared_cache.invalidate(cache.name, "all", SHARED_CACHE_TTL)
+
+async def build_cart(cart_items: List[Dict[str, Any]], expand_themes: bool = False) -> CartResponse:
+    """Totals for cart lines already read from the cart store"""
+    if expand_themes:
+        await expand_cart_themes(cart_items)
     
     subtotal = sum(item["total_price"] for item in cart_items)
     shipping = 0  # Free shipping
     total = subtotal + shipping
     
-    return {
-        "subtotal": subtotal,
-        "shipping": shipping,
-        "total": total,
-        "items": cart_items
+    return CartResponse(
+        subtotal=subtotal,
+        shipping=shipping,
+        total=total,
+        items=cart_items
+    )
+
+def cart_content_hash(cart_data: CartResponse, checkout_request: CheckoutSessionRequest) -> str:
+    """Hash of everything that would end up in a Stripe checkout session"""
+    items = sorted(
+        (item.theme_id, sorted(item.selected_variants), item.quantity, item.unit_price, item.total_price)
+        for item in cart_data.items
+    )
+    content = {
+        "items": items,
+        "total": cart_data.total,
+        "currency": checkout_request.currency,
+        "success_url": checkout_request.success_url,
+        "metadata": checkout_request.metadata,
     }
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()
+
+def cart_response(cart_data: CartResponse, item_fields: Optional[List[str]] = None) -> Response:
+    # exclude_unset drops the expand-only fields from unexpanded carts
+    include = None
+    if item_fields:
+        include = {"subtotal": True, "shipping": True, "total": True, "items": {"__all__": set(item_fields)}}
+    return model_response(cart_data, exclude_unset=True, include=include)
 
 # API Endpoints
 
 # Print Management
-@api_router.get("/prints")
-async def get_all_prints(db=Depends(get_database)):
-    """Get all print themes with their variants"""
+@api_router.get("/prints", response_model=PrintsResponse)
+async def get_all_prints(request: Request, fields: Optional[str] = None, repos=Depends(get_repositories)):
+    """Get all print themes with their variants (?fields= selects fields)"""
+    selected = parse_fields(fields, THEME_FIELDS)
     try:
-        prints_cursor = db.print_themes.find({})
-        prints = await prints_cursor.to_list(1000)
+        async def load():
+            if selected is None:
+                prints = await repos.themes.list_all()
+                return await build_catalog_payload(PrintsResponse(prints=prints))
+            prints = await repos.themes.list_all(fields_projection(selected))
+            body = {"prints": [sparse_document(print_theme) for print_theme in prints]}
+            return await asyncio.to_thread(PrecompressedPayload.from_body, sparse_json(body))
         
-        # Convert ObjectId to string for JSON serialization
-        for print_item in prints:
-            print_item["id"] = str(print_item["_id"])
-            del print_item["_id"]
-            
-        return {"prints": prints}
+        key = f"prints?fields={','.join(selected)}" if selected else "prints"
+        payload = await cached_payload(catalog_cache, key, load)
+        return payload.response(request)
     except Exception as e:
-        logger.error(f"Error fetching prints: {str(e)}")
+        logger.error("Error fetching prints: %s", e)
         raise HTTPException(status_code=500, detail="Failed to fetch prints")
 
-@api_router.get("/prints/{theme_id}")
-async def get_print_theme(theme_id: str, db=Depends(get_database)):
-    """Get specific print theme with all variants"""
+# Declared before /prints/{theme_id} so "featured" is not taken for a theme id
+@api_router.get("/prints/featured", response_model=FeaturedPrintsResponse)
+async def get_featured_prints(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=100),
+    repos=Depends(get_repositories)
+):
+    """Get themes with only their featured variant, for the landing page"""
     try:
-        print_theme = await db.print_themes.find_one({"theme_id": theme_id})
-        if not print_theme:
-            raise HTTPException(status_code=404, detail="Print theme not found")
-            
-        print_theme["id"] = str(print_theme["_id"])
-        del print_theme["_id"]
+        async def load():
+            prints = await repos.themes.list_featured(limit)
+            return await build_catalog_payload(FeaturedPrintsResponse(prints=prints))
+        
+        payload = await cached_payload(catalog_cache, f"featured:{limit or 'all'}", load)
+        return payload.response(request)
+    except Exception as e:
+        logger.error("Error fetching featured prints: %s", e)
+        raise HTTPException(status_code=500, detail="Failed to fetch featured prints")
+
+@api_router.get("/prints/{theme_id}", response_model=PrintThemeResponse)
+async def get_print_theme(
+    theme_id: str,
+    request: Request,
+    fields: Optional[str] = None,
+    repos=Depends(get_repositories)
+):
+    """Get specific print theme with all variants (?fields= selects fields)"""
+    selected = parse_fields(fields, THEME_FIELDS)
+    try:
+        async def load():
+            projection = fields_projection(selected) if selected else None
+            print_theme = await repos.themes.get(theme_id, projection)
+            if not print_theme:
+                raise HTTPException(status_code=404, detail="Print theme not found")
+            if selected:
+                return await asyncio.to_thread(PrecompressedPayload.from_body, sparse_json(sparse_document(print_theme)))
+            return await build_catalog_payload(PrintThemeResponse.model_validate(print_theme))
         
-        return print_theme
+        key = f"prints:{theme_id}?fields={','.join(selected)}" if selected else f"prints:{theme_id}"
+        payload = await cached_payload(catalog_cache, key, load)
+        return payload.response(request)
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error fetching print theme {theme_id}: {str(e)}")
+        logger.error("Error fetching print theme %s: %s", theme_id, e)
         raise HTTPException(status_code=500, detail="Failed to fetch print theme")
 
+# Page content
+@api_router.get("/pages/{page_id}", response_model=PageContentResponse)
+async def get_page(page_id: str, request: Request, repos=Depends(get_repositories)):
+    """Get published content for a page"""
+    try:
+        async def load():
+            page = await repos.pages.get(page_id)
+            if not page:
+                raise HTTPException(status_code=404, detail="Page not found")
+            return await build_catalog_payload(PageContentResponse.model_validate(page))
+        
+        payload = await cached_payload(page_cache, f"pages:{page_id}", load)
+        return payload.response(request)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error fetching page %s: %s", page_id, e)
+        raise HTTPException(status_code=500, detail="Failed to fetch page")
+
 # Cart Management
-@api_router.get("/cart/{session_id}")
-async def get_cart(session_id: str, db=Depends(get_database)):
-    """Get cart contents for session"""
+@api_router.get("/cart/{session_id}", response_model=CartResponse)
+async def get_cart(
+    session_id: str,
+    expand: Optional[str] = None,
+    fields: Optional[str] = None,
+    repos=Depends(get_repositories)
+):
+    """Get cart contents for session (?expand=themes embeds theme details,
+    ?fields= selects item fields; totals are always included)"""
+    item_fields = parse_fields(fields, CART_ITEM_FIELDS)
     try:
-        cart_data = await calculate_cart_total(session_id)
-        return cart_data
+        cart_data = await calculate_cart_total(
+            session_id, expand_themes="themes" in parse_expand(expand)
+        )
+        return cart_response(cart_data, item_fields)
     except Exception as e:
-        logger.error(f"Error fetching cart for session {session_id}: {str(e)}")
+        logger.error("Error fetching cart for session %s: %s", session_id, e)
         raise HTTPException(status_code=500, detail="Failed to fetch cart")
 
-@api_router.post("/cart/{session_id}/add")
+@api_router.post("/cart/{session_id}/add", response_model=CartResponse)
 async def add_to_cart(
     session_id: str, 
     item_data: Dict[str, Any], 
-    db=Depends(get_database)
+    request: Request,
+    expand: Optional[str] = None,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    repos=Depends(get_repositories)
 ):
-    """Add item to cart"""
-    try:
-        # Create cart item
-        cart_item = CartItem(
-            session_id=session_id,
-            theme_id=item_data["theme_id"],
-            selected_variants=item_data["selected_variants"],
-            quantity=item_data["quantity"],
-            unit_price=item_data["unit_price"],
-            total_price=item_data["unit_price"] * item_data["quantity"]
+    """Add item to cart (retries with the same Idempotency-Key are replayed)"""
+    await rate_limiter.check(request, "cart_add", session_id)
+    
+    async def add_item() -> Response:
+        try:
+            # Create cart item
+            cart_item = CartItem(
+                session_id=session_id,
+                theme_id=item_data["theme_id"],
+                selected_variants=item_data["selected_variants"],
+                quantity=item_data["quantity"],
+                unit_price=item_data["unit_price"],
+                total_price=item_data["unit_price"] * item_data["quantity"]
+            )
+            
+            # Store the line and return the updated cart
+            cart_items = await repos.carts.add_item(session_id, cart_item.model_dump(by_alias=True))
+            await invalidate_cart(session_id)
+            cart_data = await build_cart(cart_items, expand_themes="themes" in parse_expand(expand))
+            return cart_response(cart_data)
+        except Exception as e:
+            logger.error("Error adding item to cart: %s", e)
+            raise HTTPException(status_code=500, detail="Failed to add item to cart")
+    
+    if idempotency_key:
+        return await idempotency_store.run(
+            f"cart_add:{session_id}",
+            idempotency_key,
+            request_fingerprint({"item": item_data, "expand": expand}),
+            add_item
         )
-        
-        # Insert into database
-        await db.cart_items.insert_one(cart_item.dict(by_alias=True, exclude_unset=True))
-        
-        # Return updated cart
-        cart_data = await calculate_cart_total(session_id)
-        return cart_data
-    except Exception as e:
-        logger.error(f"Error adding item to cart: {str(e)}")
-        raise HTTPException(status_code=500, detail="Failed to add item to cart")
+    return await add_item()
 
-@api_router.delete("/cart/{session_id}/item/{item_id}")
+@api_router.delete("/cart/{session_id}/item/{item_id}", response_model=CartResponse)
 async def remove_from_cart(
     session_id: str, 
     item_id: str, 
-    db=Depends(get_database)
+    expand: Optional[str] = None,
+    repos=Depends(get_repositories)
 ):
     """Remove item from cart"""
     try:
         # Remove item
-        result = await db.cart_items.delete_one({
-            "_id": ObjectId(item_id),
-            "session_id": session_id
-        })
+        cart_items = await repos.carts.remove_item(session_id, ObjectId(item_id))
         
-        if result.deleted_count == 0:
+        if cart_items is None:
             raise HTTPException(status_code=404, detail="Cart item not found")
+        await invalidate_cart(session_id)
         
         # Return updated cart
-        cart_data = await calculate_cart_total(session_id)
-        return cart_data
+        cart_data = await build_cart(cart_items, expand_themes="themes" in parse_expand(expand))
+        return cart_response(cart_data)
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error removing item from cart: {str(e)}")
+        logger.error("Error removing item from cart: %s", e)
         raise HTTPException(status_code=500, detail="Failed to remove item from cart")
 
 @api_router.delete("/cart/{session_id}")
-async def clear_cart(session_id: str, db=Depends(get_database)):
+async def clear_cart(session_id: str, repos=Depends(get_repositories)):
     """Clear entire cart"""
     try:
-        await db.cart_items.delete_many({"session_id": session_id})
+        await repos.carts.clear(session_id)
+        await invalidate_cart(session_id)
         return {"message": "Cart cleared successfully"}
     except Exception as e:
-        logger.error(f"Error clearing cart: {str(e)}")
+        logger.error("Error clearing cart: %s", e)
         raise HTTPException(status_code=500, detail="Failed to clear cart")
 
 # Payment endpoints
@@ -324,97 +843,126 @@ async def clear_cart(session_id: str, db=Depends(get_database)):
 async def create_checkout_session(
     request: Request,
     checkout_data: CheckoutRequest,
-    db=Depends(get_database)
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    repos=Depends(get_repositories)
 ):
-    """Create payment checkout session"""
-    try:
-        # Get cart data
-        cart_data = await calculate_cart_total(checkout_data.session_id)
-        
-        if not cart_data["items"]:
-            raise HTTPException(status_code=400, detail="Cart is empty")
-        
-        # Get host URL from request
-        host_url = str(request.base_url).rstrip('/')
-        
-        # Prepare checkout session
-        amount = float(cart_data["total"]) / 100  # Convert øre to kroner
-        success_url = f"{host_url.replace('8001', '3000')}/payment/success?session_id={{CHECKOUT_SESSION_ID}}"
-        cancel_url = f"{host_url.replace('8001', '3000')}/payment/cancel"
-        
-        checkout_request = CheckoutSessionRequest(
-            amount=amount,
-            currency="NOK",
-            success_url=success_url,
-            cancel_url=cancel_url,
-            metadata={
-                "session_id": checkout_data.session_id,
-                "payment_method": checkout_data.payment_method,
-                "customer_email": checkout_data.customer_info.get("email", ""),
-                "item_count": str(len(cart_data["items"]))
-            }
-        )
-        
-        # Create Stripe checkout session
-        if checkout_data.payment_method == "stripe":
-            session = await stripe_checkout.create_checkout_session(checkout_request)
+    """Create payment checkout session (retries with the same Idempotency-Key are replayed)"""
+    await rate_limiter.check(request, "checkout", checkout_data.session_id)
+    
+    async def create_session() -> Response:
+        try:
+            # Get cart data, bypassing caches so the charge matches the cart
+            cart_data = await calculate_cart_total(checkout_data.session_id, use_cache=False)
             
-            # Create payment transaction record
-            payment_transaction = PaymentTransaction(
-                session_id=checkout_data.session_id,
-                payment_method="stripe",
-                payment_id=session.session_id,
-                amount=cart_data["total"],
-                currency="NOK",
-                status="pending",
-                payment_status="initiated",
-                items=cart_data["items"],
-                metadata=checkout_request.metadata or {}
-            )
+            if not cart_data.items:
+                raise HTTPException(status_code=400, detail="Cart is empty")
+            
+            # Get host URL from request
+            host_url = str(request.base_url).rstrip('/')
             
-            await db.payment_transactions.insert_one(
-                payment_transaction.dict(by_alias=True, exclude_unset=True)
+            # Prepare checkout session
+            amount = float(cart_data.total) / 100  # Convert øre to kroner
+            success_url = f"{host_url.replace('8001', '3000')}/payment/success?session_id={{CHECKOUT_SESSION_ID}}"
+            cancel_url = f"{host_url.replace('8001', '3000')}/payment/cancel"
+            
+            checkout_request = CheckoutSessionRequest(
+                amount=amount,
+                currency="NOK",
+                success_url=success_url,
+                cancel_url=cancel_url,
+                metadata={
+                    "session_id": checkout_data.session_id,
+                    "payment_method": checkout_data.payment_method,
+                    "customer_email": checkout_data.customer_info.get("email", ""),
+                    "item_count": str(len(cart_data.items))
+                }
             )
             
-            return {
-                "checkout_url": session.url,
-                "session_id": session.session_id,
-                "amount": amount,
-                "currency": "NOK"
-            }
-        
-        else:
-            raise HTTPException(status_code=400, detail="Payment method not supported yet")
+            # Create Stripe checkout session
+            if checkout_data.payment_method == "stripe":
+                # Reuse a still-open session for an identical cart
+                cart_hash = cart_content_hash(cart_data, checkout_request)
+                open_transaction = await repos.payments.find_open(
+                    checkout_data.session_id, cart_hash, datetime.utcnow()
+                )
+                if open_transaction and open_transaction.get("checkout_url"):
+                    return JSONResponse({
+                        "checkout_url": open_transaction["checkout_url"],
+                        "session_id": open_transaction["payment_id"],
+                        "amount": amount,
+                        "currency": "NOK"
+                    })
+                
+                session = await stripe_checkout.create_checkout_session(checkout_request)
+                
+                # Create payment transaction record
+                payment_transaction = PaymentTransaction(
+                    session_id=checkout_data.session_id,
+                    payment_method="stripe",
+                    payment_id=session.session_id,
+                    amount=cart_data.total,
+                    currency="NOK",
+                    status="pending",
+                    payment_status="initiated",
+                    items=[item.model_dump(exclude_unset=True) for item in cart_data.items],
+                    metadata=checkout_request.metadata or {},
+                    cart_hash=cart_hash,
+                    checkout_url=session.url,
+                    expires_at=datetime.utcnow() + timedelta(seconds=CHECKOUT_REUSE_SECONDS)
+                )
+                
+                await repos.payments.create(
+                    payment_transaction.model_dump(by_alias=True)
+                )
+                
+                return JSONResponse({
+                    "checkout_url": session.url,
+                    "session_id": session.session_id,
+                    "amount": amount,
+                    "currency": "NOK"
+                })
             
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error creating checkout session: {str(e)}")
-        raise HTTPException(status_code=500, detail="Failed to create checkout session")
+            else:
+                raise HTTPException(status_code=400, detail="Payment method not supported yet")
+                
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error("Error creating checkout session: %s", e)
+            raise HTTPException(status_code=500, detail="Failed to create checkout session")
+    
+    if idempotency_key:
+        return await idempotency_store.run(
+            f"checkout:{checkout_data.session_id}",
+            idempotency_key,
+            request_fingerprint(checkout_data.model_dump()),
+            create_session
+        )
+    return await create_session()
 
 @api_router.get("/payments/status/{session_id}")
 async def get_payment_status(
     session_id: str,
+    request: Request,
     db=Depends(get_database)
 ):
     """Get payment status"""
+    await rate_limiter.check(request, "payment_status", session_id)
+    
     try:
         # Check payment status with Stripe
         checkout_status = await stripe_checkout.get_checkout_status(session_id)
         
         # Update payment transaction in database
-        await db.payment_transactions.update_one(
-            {"payment_id": session_id},
-            {"$set": {
-                "status": "completed" if checkout_status.payment_status == "paid" else checkout_status.status,
-                "payment_status": checkout_status.payment_status,
-                "updated_at": datetime.utcnow()
-            }}
-        )
+        await repositories.payments.update_status(session_id, {
+            "status": "completed" if checkout_status.payment_status == "paid" else checkout_status.status,
+            "payment_status": checkout_status.payment_status,
+            "updated_at": datetime.utcnow()
+        })
         
-        # If payment is successful, create order
+        # If payment is successful, create the order in the background
         if checkout_status.payment_status == "paid":
-            await process_successful_payment(session_id, db)
+            await schedule_payment_processing(session_id, db)
         
         return {
             "session_id": session_id,
@@ -425,27 +973,26 @@ async def get_payment_status(
         }
         
     except Exception as e:
-        logger.error(f"Error getting payment status: {str(e)}")
+        logger.error("Error getting payment status: %s", e)
         raise HTTPException(status_code=500, detail="Failed to get payment status")
 
 async def process_successful_payment(payment_session_id: str, db):
-    """Process successful payment and create order"""
-    try:
-        # Get payment transaction
-        payment = await db.payment_transactions.find_one({"payment_id": payment_session_id})
-        if not payment:
-            logger.error(f"Payment transaction not found: {payment_session_id}")
-            return
-        
-        # Check if order already exists
-        existing_order = await db.orders.find_one({"payment_transaction_id": payment_session_id})
-        if existing_order:
-            logger.info(f"Order already exists for payment: {payment_session_id}")
-            return
-        
-        # Create order
-        order = Order(
-            order_number=generate_order_number(),
+    """Create the order for a paid checkout and run its follow-up steps.
+    
+    Runs as a background job: every step is idempotent so a retry can start
+    from the top, and errors propagate so the job is retried.
+    """
+    # Get payment transaction
+    payment = await repositories.payments.get(payment_session_id)
+    if not payment:
+        logger.error("Payment transaction not found: %s", payment_session_id)
+        return
+    
+    # Create order unless an earlier attempt already did
+    order = await repositories.orders.get_by_payment(payment_session_id)
+    if not order:
+        new_order = Order(
+            order_number=await order_number_allocator.next(),
             session_id=payment["session_id"],
             items=payment["items"],
             subtotal=payment["amount"],
@@ -454,16 +1001,55 @@ async def process_successful_payment(payment_session_id: str, db):
             payment_transaction_id=payment_session_id,
             customer_info=payment.get("metadata", {})
         )
-        
-        await db.orders.insert_one(order.dict(by_alias=True, exclude_unset=True))
-        
-        # Clear cart
-        await db.cart_items.delete_many({"session_id": payment["session_id"]})
-        
-        logger.info(f"Order created successfully: {order.order_number}")
-        
-    except Exception as e:
-        logger.error(f"Error processing successful payment: {str(e)}")
+        order = new_order.model_dump(by_alias=True)
+        # Only the run that creates the order empties the cart; later runs
+        # for the same payment must not touch a cart the customer refilled
+        order["cart_cleared"] = False
+        try:
+            await repositories.orders.create(order)
+            logger.info("Order created successfully: %s", new_order.order_number)
+        except DuplicateKeyError:
+            # A concurrent job (webhook vs. status poll) created it first and
+            # runs the follow-up steps itself; a retry finishes what it misses
+            logger.info("Order for payment %s already created by another job", payment_session_id)
+            return
+    
+    # Queue the confirmation email; the outbox worker sends it
+    if await enqueue_order_confirmation(db.email_outbox, order) and email_worker:
+        email_worker.notify()
+    
+    # Clear the cart this order was paid for, once
+    if order.get("cart_cleared") is False:
+        await repositories.carts.clear(payment["session_id"])
+        await invalidate_cart(payment["session_id"])
+        await repositories.orders.mark_cart_cleared(order["_id"])
+    
+    # Update sales rollups for analytics, once per order
+    if not order.get("rollups_applied") and await repositories.orders.claim_rollups(order["_id"]):
+        try:
+            await apply_order_to_rollups(db, order)
+        except PartialRollupError as e:
+            # Keep the claim: a retry would count the applied themes twice
+            logger.error(
+                "Rollups for order %s missing themes %s; run rebuild_rollups.py: %s",
+                order["_id"], e.missing, e
+            )
+        except Exception:
+            await repositories.orders.release_rollups(order["_id"])
+            raise
+
+async def schedule_payment_processing(payment_session_id: str, db):
+    """Run post-payment work off the request path, once per payment"""
+    order = await repositories.orders.get_by_payment(payment_session_id)
+    if order and order.get("rollups_applied") and order.get("cart_cleared") is not False:
+        return  # Already fully processed; repeat polls and webhooks are no-ops
+    background_jobs.submit(
+        "process_successful_payment",
+        process_successful_payment,
+        payment_session_id,
+        db,
+        key=f"payment:{payment_session_id}"
+    )
 
 # Stripe webhook endpoint
 @api_router.post("/webhook/stripe")
@@ -481,229 +1067,294 @@ async def stripe_webhook(
         
         # Process webhook event
         if webhook_response.event_type == "checkout.session.completed":
-            await process_successful_payment(webhook_response.session_id, db)
+            await schedule_payment_processing(webhook_response.session_id, db)
         
         return {"received": True}
         
     except Exception as e:
-        logger.error(f"Error processing Stripe webhook: {str(e)}")
+        logger.error("Error processing Stripe webhook: %s", e)
         raise HTTPException(status_code=500, detail="Webhook processing failed")
 
 # Orders endpoint
-@api_router.get("/orders/{session_id}")
+@api_router.get("/orders/{session_id}", response_model=OrdersResponse)
 async def get_orders(
     session_id: str,
-    db=Depends(get_database)
+    fields: Optional[str] = None,
+    repos=Depends(get_repositories)
 ):
-    """Get orders for session"""
+    """Get orders for session (?fields= selects fields)"""
+    selected = parse_fields(fields, ORDER_FIELDS)
     try:
-        orders_cursor = db.orders.find({"session_id": session_id}).sort("created_at", -1)
-        orders = await orders_cursor.to_list(1000)
+        if selected:
+            orders = await repos.orders.list_for_session(session_id, fields_projection(selected))
+            body = {"orders": [sparse_document(order) for order in orders]}
+            return Response(sparse_json(body), media_type="application/json")
         
-        # Convert ObjectId to string
-        for order in orders:
-            order["id"] = str(order["_id"])
-            del order["_id"]
-            
-        return {"orders": orders}
+        orders = await repos.orders.list_for_session(session_id)
+        
+        return model_response(OrdersResponse(orders=orders))
     except Exception as e:
-        logger.error(f"Error fetching orders: {str(e)}")
+        logger.error("Error fetching orders: %s", e)
         raise HTTPException(status_code=500, detail="Failed to fetch orders")
 
-# Admin endpoints
-@api_router.get("/admin/prints")
-async def admin_get_prints(db=Depends(get_database)):
-    """Admin: Get all prints with full details"""
+# Order export
+ORDER_EXPORT_COLUMNS = [
+    "id", "order_number", "created_at", "status", "session_id",
+    "payment_transaction_id", "customer_email", "item_count",
+    "subtotal", "shipping_cost", "total"
+]
+
+def order_export_row(order: Dict[str, Any]) -> List[Any]:
+    customer_info = order.get("customer_info") or {}
+    created_at = order.get("created_at")
+    return [
+        str(order["_id"]),
+        order.get("order_number"),
+        created_at.isoformat() if isinstance(created_at, datetime) else created_at,
+        order.get("status"),
+        order.get("session_id"),
+        order.get("payment_transaction_id"),
+        customer_info.get("customer_email") or customer_info.get("email", ""),
+        sum(item.get("quantity", 1) for item in order.get("items", [])),
+        order.get("subtotal"),
+        order.get("shipping_cost", 0),
+        order.get("total"),
+    ]
+
+async def stream_orders(orders, export_format: str, batch_size: int):
+    """Yield encoded orders one cursor batch at a time"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if export_format == "csv" else None
+    if writer:
+        writer.writerow(ORDER_EXPORT_COLUMNS)
+    
+    pending = 0
     try:
-        prints_cursor = db.print_themes.find({})
-        prints = await prints_cursor.to_list(1000)
-        
-        # Convert ObjectId to string for JSON serialization
-        for print_item in prints:
-            print_item["id"] = str(print_item["_id"])
-            del print_item["_id"]
+        async for order in orders:
+            if writer:
+                writer.writerow(order_export_row(order))
+            else:
+                order["id"] = str(order.pop("_id"))
+                buffer.write(json.dumps(order, default=json_default))
+                buffer.write("\n")
             
-        return {"prints": prints}
+            pending += 1
+            if pending >= batch_size:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                pending = 0
+        
+        if buffer.tell():
+            yield buffer.getvalue()
     except Exception as e:
-        logger.error(f"Error fetching prints for admin: {str(e)}")
-        raise HTTPException(status_code=500, detail="Failed to fetch prints")
+        logger.error("Error streaming order export: %s", e)
+        raise
+    finally:
+        await orders.aclose()
 
-@api_router.put("/admin/prints/{theme_id}")
-async def admin_update_print(
-    theme_id: str,
-    update_data: Dict[str, Any],
-    db=Depends(get_database)
+@api_router.get("/admin/orders/export")
+async def admin_export_orders(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    status: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    batch_size: int = Query(500, ge=1, le=10000),
+    repos=Depends(get_repositories)
 ):
-    """Admin: Update print theme"""
-    try:
-        # Update the print theme
-        result = await db.print_themes.update_one(
-            {"theme_id": theme_id},
-            {
-                "$set": {
-                    **update_data,
-                    "updated_at": datetime.utcnow()
-                }
-            }
-        )
-        
-        if result.matched_count == 0:
-            raise HTTPException(status_code=404, detail="Print theme not found")
-        
-        # Return updated print
-        updated_print = await db.print_themes.find_one({"theme_id": theme_id})
-        updated_print["id"] = str(updated_print["_id"])
-        del updated_print["_id"]
-        
-        return updated_print
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error updating print {theme_id}: {str(e)}")
-        raise HTTPException(status_code=500, detail="Failed to update print")
+    """Admin: Stream orders as NDJSON or CSV with constant memory"""
+    orders = repos.orders.iter_orders(status, start, end, batch_size)
+    
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    filename = f"orders-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.{format}"
+    return StreamingResponse(
+        stream_orders(orders, format, batch_size),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
 
-@api_router.post("/admin/prints")
-async def admin_create_print(
-    print_data: Dict[str, Any],
+# Sales analytics
+@api_router.get("/admin/analytics/sales")
+async def admin_sales_analytics(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    theme_id: Optional[str] = None,
     db=Depends(get_database)
 ):
-    """Admin: Create new print theme"""
+    """Admin: Revenue per day per theme, read from the sales rollups"""
+    default_start, default_end = default_range()
+    start = start or default_start
+    end = end or default_end
+    
+    if end < start:
+        raise HTTPException(status_code=400, detail="end must not be before start")
+    if (end - start).days > 366:
+        raise HTTPException(status_code=400, detail="Date range is limited to one year")
+    
     try:
-        # Create new print theme with default variants
-        new_print = {
-            "theme_id": print_data["theme_id"],
-            "theme": print_data["theme"],
-            "description": print_data.get("description", ""),
-            "base_price": print_data.get("base_price", 19900),
-            "variants": [
-                {
-                    "id": f"{print_data['theme_id']}-v1",
-                    "name": f"{print_data['theme']} I",
-                    "image_url": "https://via.placeholder.com/500x700?text=Upload+Image",
-                    "featured": True,
-                    "created_at": datetime.utcnow()
-                },
-                {
-                    "id": f"{print_data['theme_id']}-v2",
-                    "name": f"{print_data['theme']} II",
-                    "image_url": "https://via.placeholder.com/500x700?text=Upload+Image",
-                    "featured": False,
-                    "created_at": datetime.utcnow()
-                },
-                {
-                    "id": f"{print_data['theme_id']}-v3",
-                    "name": f"{print_data['theme']} III",
-                    "image_url": "https://via.placeholder.com/500x700?text=Upload+Image",
-                    "featured": False,
-                    "created_at": datetime.utcnow()
-                }
-            ],
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow()
-        }
-        
-        # Insert into database
-        result = await db.print_themes.insert_one(new_print)
-        
-        # Return created print
-        created_print = await db.print_themes.find_one({"_id": result.inserted_id})
-        created_print["id"] = str(created_print["_id"])
-        del created_print["_id"]
-        
-        return created_print
+        return await read_rollups(db, start, end, theme_id)
     except Exception as e:
-        logger.error(f"Error creating print: {str(e)}")
-        raise HTTPException(status_code=500, detail="Failed to create print")
+        logger.error("Error fetching sales analytics: %s", e)
+        raise HTTPException(status_code=500, detail="Failed to fetch sales analytics")
 
-@api_router.delete("/admin/prints/{theme_id}")
-async def admin_delete_print(
-    theme_id: str,
-    db=Depends(get_database)
+# Admission control stats
+@api_router.get("/admin/admission")
+async def admin_admission_stats():
+    """Admin: Current concurrency limits, queues and shed counts per route class"""
+    return {
+        "classes": admission_registry[0].stats() if admission_registry else {}
+    }
+
+# Request profiles
+def require_profile_token(authorization: Optional[str] = Header(None)):
+    """Profiles hold stack traces and paths; reading them needs PROFILE_TOKEN.
+
+    Sent as "Authorization: Bearer <token>" so fetching profiles does not
+    itself get profiled the way X-Profile-Token would.
+    """
+    scheme, _, supplied = (authorization or "").partition(" ")
+    if not profile_token or scheme.lower() != "bearer" or not hmac.compare_digest(
+        supplied.strip().encode(), profile_token.encode()
+    ):
+        raise HTTPException(status_code=403, detail="Profile token required")
+
+@api_router.get("/admin/profiles", dependencies=[Depends(require_profile_token)])
+async def admin_list_profiles():
+    """Admin: Recent request profiles, newest first"""
+    return {"profiles": await asyncio.to_thread(profile_store.list)}
+
+@api_router.get("/admin/profiles/{profile_id}", dependencies=[Depends(require_profile_token)])
+async def admin_download_profile(profile_id: str):
+    """Admin: Download a profile in folded-stack format"""
+    path = await asyncio.to_thread(profile_store.path, profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=f"{profile_id}.folded")
+
+# Cache stats
+@api_router.get("/admin/cache")
+async def admin_cache_stats():
+    """Admin: Hit ratios per cache tier (this worker's counters)"""
+    return {
+        "tiers": cache_metrics.stats(),
+        "shared": {
+            "enabled": shared_cache is not None,
+            "errors": shared_cache.errors if shared_cache else 0
+        }
+    }
+
+# Slow query log
+@api_router.get("/admin/slow-queries")
+async def admin_slow_queries(
+    limit: int = Query(50, ge=1, le=500),
+    collection: Optional[str] = None
 ):
-    """Admin: Delete print theme"""
+    """Admin: Recent slow MongoDB commands with redacted filters and plans"""
+    if not slow_query_log:
+        return {"enabled": False, "queries": []}
     try:
-        result = await db.print_themes.delete_one({"theme_id": theme_id})
-        
-        if result.deleted_count == 0:
-            raise HTTPException(status_code=404, detail="Print theme not found")
-        
-        return {"message": "Print theme deleted successfully"}
-    except HTTPException:
-        raise
+        return {
+            "enabled": True,
+            "threshold_ms": slow_query_log.threshold_ms,
+            "dropped": slow_query_log.dropped,
+            "queries": await slow_query_log.recent(limit, collection)
+        }
     except Exception as e:
-        logger.error(f"Error deleting print {theme_id}: {str(e)}")
-        raise HTTPException(status_code=500, detail="Failed to delete print")
+        logger.error("Error reading slow query log: %s", e)
+        raise HTTPException(status_code=500, detail="Failed to read slow query log")
 
 # Admin endpoints
-@api_router.get("/admin/prints")
-async def admin_get_prints(db=Depends(get_database)):
+@api_router.get("/admin/prints", response_model=PrintsResponse)
+async def admin_get_prints(repos=Depends(get_repositories)):
     """Admin: Get all prints with full details"""
     try:
-        prints_cursor = db.print_themes.find({})
-        prints = await prints_cursor.to_list(1000)
+        prints = await repos.themes.list_all()
         
-        # Convert ObjectId to string for JSON serialization
-        for print_item in prints:
-            print_item["id"] = str(print_item["_id"])
-            del print_item["_id"]
-            
-        return {"prints": prints}
+        return model_response(PrintsResponse(prints=prints))
     except Exception as e:
-        logger.error(f"Error fetching prints for admin: {str(e)}")
+        logger.error("Error fetching prints for admin: %s", e)
         raise HTTPException(status_code=500, detail="Failed to fetch prints")
 
-@api_router.put("/admin/prints/{theme_id}")
+@api_router.put("/admin/prints/{theme_id}", response_model=PrintThemeResponse)
 async def admin_update_print(
     theme_id: str,
     update_data: Dict[str, Any],
-    db=Depends(get_database)
+    repos=Depends(get_repositories)
 ):
     """Admin: Update print theme"""
     try:
-        # Update the print theme
-        result = await db.print_themes.update_one(
-            {"theme_id": theme_id},
-            {
-                "$set": {
-                    **update_data,
-                    "updated_at": datetime.utcnow()
-                }
-            }
-        )
+        # Update the print theme, returning the new document
+        updated_print = await repos.themes.update(theme_id, {
+            **update_data,
+            "updated_at": datetime.utcnow()
+        })
         
-        if result.matched_count == 0:
+        if not updated_print:
             raise HTTPException(status_code=404, detail="Print theme not found")
         
-        # Return updated print
-        updated_print = await db.print_themes.find_one({"theme_id": theme_id})
-        updated_print["id"] = str(updated_print["_id"])
-        del updated_print["_id"]
+        await invalidate_cached_payloads(catalog_cache)
+        schedule_image_pregeneration([
+            variant.get("image_url")
+            for variant in update_data.get("variants", [])
+            if isinstance(variant, dict)
+        ])
         
-        return updated_print
+        return model_response(PrintThemeResponse.model_validate(updated_print))
     except HTTPException:
         raise
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="A print theme with that theme_id already exists")
     except Exception as e:
-        logger.error(f"Error updating print {theme_id}: {str(e)}")
+        logger.error("Error updating print %s: %s", theme_id, e)
         raise HTTPException(status_code=500, detail="Failed to update print")
 
+@api_router.patch("/admin/prints/{theme_id}/variants/{variant_id}", response_model=PrintThemeResponse)
+async def admin_update_print_variant(
+    theme_id: str,
+    variant_id: str,
+    variant_update: PrintVariantUpdate,
+    repos=Depends(get_repositories)
+):
+    """Admin: Update a single variant in place"""
+    changes = variant_update.model_dump(exclude_unset=True)
+    if not changes or None in changes.values():
+        raise HTTPException(status_code=400, detail="Provide name, image_url or featured")
+    
+    try:
+        updated_print = await repos.themes.update_variant(theme_id, variant_id, changes)
+        
+        if not updated_print:
+            raise HTTPException(status_code=404, detail="Print variant not found")
+        
+        await invalidate_cached_payloads(catalog_cache)
+        if "image_url" in changes:
+            schedule_image_pregeneration([changes["image_url"]])
+        
+        return model_response(PrintThemeResponse.model_validate(updated_print))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error updating variant %s of print %s: %s", variant_id, theme_id, e)
+        raise HTTPException(status_code=500, detail="Failed to update print variant")
+
 @api_router.delete("/admin/prints/{theme_id}")
-async def admin_delete_print(theme_id: str, db=Depends(get_database)):
+async def admin_delete_print(theme_id: str, repos=Depends(get_repositories)):
     """Admin: Delete print theme"""
     try:
-        result = await db.print_themes.delete_one({"theme_id": theme_id})
-        
-        if result.deleted_count == 0:
+        if not await repos.themes.delete(theme_id):
             raise HTTPException(status_code=404, detail="Print theme not found")
         
+        await invalidate_cached_payloads(catalog_cache)
+        
         return {"message": "Print theme deleted successfully"}
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error deleting print {theme_id}: {str(e)}")
+        logger.error("Error deleting print %s: %s", theme_id, e)
         raise HTTPException(status_code=500, detail="Failed to delete print")
 
-@api_router.post("/admin/prints")
-async def admin_create_print(print_data: Dict[str, Any], db=Depends(get_database)):
+@api_router.post("/admin/prints", response_model=PrintThemeResponse)
+async def admin_create_print(print_data: Dict[str, Any], repos=Depends(get_repositories)):
     """Admin: Create new print theme"""
     try:
         # Create new print theme with default variants
@@ -740,64 +1391,142 @@ async def admin_create_print(print_data: Dict[str, Any], db=Depends(get_database
         }
         
         # Insert into database
-        result = await db.print_themes.insert_one(new_print)
+        created_print = await repos.themes.create(new_print)
+        await invalidate_cached_payloads(catalog_cache)
         
-        # Return created print
-        created_print = await db.print_themes.find_one({"_id": result.inserted_id})
-        created_print["id"] = str(created_print["_id"])
-        del created_print["_id"]
+        schedule_image_pregeneration([variant["image_url"] for variant in new_print["variants"]])
         
-        return created_print
+        return model_response(PrintThemeResponse.model_validate(created_print))
     except Exception as e:
-        logger.error(f"Error creating print: {str(e)}")
+        logger.error("Error creating print: %s", e)
         raise HTTPException(status_code=500, detail="Failed to create print")
 
+def print_theme_document(raw: Dict[str, Any]) -> Dict[str, Any]:
+    """Validate an imported theme; raises ValueError for bad rows"""
+    theme = PrintTheme.model_validate(raw)
+    if not theme.variants:
+        raise ValueError("A theme needs at least one variant")
+    return theme.model_dump(exclude={"id"})
+
+def pregenerate_imported_images(documents: List[Dict[str, Any]]):
+    schedule_image_pregeneration([
+        variant["image_url"] for document in documents for variant in document["variants"]
+    ])
+
+@api_router.post("/admin/prints/import")
+async def admin_import_prints(
+    request: Request,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    chunk_size: int = Query(500, ge=1, le=5000),
+    repos=Depends(get_repositories)
+):
+    """Admin: Upsert print themes from a streamed NDJSON or CSV upload"""
+    lines = iter_lines(request.stream())
+    themes = iter_csv_themes(lines) if format == "csv" else iter_ndjson_themes(lines)
+    try:
+        report = await import_catalog(
+            repos.themes,
+            themes,
+            print_theme_document,
+            chunk_size=chunk_size,
+            on_chunk=pregenerate_imported_images
+        )
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Upload must be UTF-8 encoded")
+    except Exception as e:
+        logger.error("Error importing prints: %s", e)
+        raise HTTPException(status_code=500, detail="Failed to import prints")
+    finally:
+        # Earlier chunks may have been written even if the import failed
+        await invalidate_cached_payloads(catalog_cache)
+    
+    stats = report["stats"]
+    logger.info(
+        "Imported %d themes (%d inserted, %d updated, %d failed) in %.2fs",
+        stats["themes"], stats["inserted"], stats["updated"], stats["failed"], stats["elapsed_seconds"]
+    )
+    return report
+
+# Image derivatives
+async def catalog_image_urls(repos) -> set:
+    """Variant image URLs of the catalog, cached alongside catalog payloads"""
+    urls = catalog_cache.get("image_urls")
+    if urls is None:
+        themes = await repos.themes.list_all({"_id": 0, "variants.image_url": 1})
+        urls = {variant.get("image_url") for theme in themes for variant in theme.get("variants", [])}
+        catalog_cache.set("image_urls", urls)
+    return urls
+
+@api_router.get("/images/{width}/{fmt}")
+async def get_image_derivative(
+    width: int,
+    fmt: str,
+    src: str,
+    request: Request,
+    repos=Depends(get_repositories)
+):
+    """Serve a resized derivative of a catalog image"""
+    try:
+        ImageService.validate(width, fmt)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # Only catalog images (or IMAGE_SOURCE_HOSTS), never arbitrary URLs
+    if not image_service.is_allowed_source(src) and src not in await catalog_image_urls(repos):
+        raise HTTPException(status_code=403, detail="Image source not allowed")
+    
+    try:
+        path, digest = await image_service.get_derivative(src, width, fmt)
+        headers = {
+            "Cache-Control": DERIVATIVE_CACHE_CONTROL,
+            "ETag": f'"{digest}-{width}-{fmt}"'
+        }
+        if request.headers.get("if-none-match") == headers["ETag"]:
+            return Response(status_code=304, headers=headers)
+        return FileResponse(path, media_type=MEDIA_TYPES[fmt], headers=headers)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error("Error generating image derivative for %s: %s", src, e)
+        raise HTTPException(status_code=502, detail="Failed to load source image")
+
 # Page content management
-@api_router.get("/admin/pages")
-async def admin_get_pages(db=Depends(get_database)):
+@api_router.get("/admin/pages", response_model=PagesResponse)
+async def admin_get_pages(repos=Depends(get_repositories)):
     """Admin: Get page content"""
     try:
-        pages = await db.page_content.find({}).to_list(100)
+        pages = await repos.pages.list_all(100)
         
-        # Convert ObjectId to string
-        for page in pages:
-            page["id"] = str(page["_id"])
-            del page["_id"]
-            
-        return {"pages": pages}
+        return model_response(PagesResponse(pages=pages))
     except Exception as e:
-        logger.error(f"Error fetching pages: {str(e)}")
+        logger.error("Error fetching pages: %s", e)
         raise HTTPException(status_code=500, detail="Failed to fetch pages")
 
 @api_router.put("/admin/pages/{page_id}")
 async def admin_update_page(
     page_id: str,
     page_data: Dict[str, Any],
-    db=Depends(get_database)
+    repos=Depends(get_repositories)
 ):
     """Admin: Update page content"""
     try:
-        # Update or insert page content
-        result = await db.page_content.update_one(
-            {"page_id": page_id},
-            {
-                "$set": {
-                    **page_data,
-                    "updated_at": datetime.utcnow()
-                }
-            },
-            upsert=True
-        )
+        # The path is authoritative for page_id (unique index)
+        fields = {key: value for key, value in page_data.items() if key not in ("_id", "page_id")}
+        
+        # Update or insert page content, returning the new document
+        updated_page = await repos.pages.upsert(page_id, {
+            **fields,
+            "updated_at": datetime.utcnow()
+        })
         
-        # Return updated page
-        updated_page = await db.page_content.find_one({"page_id": page_id})
-        if updated_page:
-            updated_page["id"] = str(updated_page["_id"])
-            del updated_page["_id"]
+        # Refresh the public cache so the next read costs no query
+        page = PageContentResponse.model_validate(updated_page)
+        await invalidate_cached_payloads(page_cache)
+        page_cache.set(f"pages:{page_id}", await build_catalog_payload(page))
         
-        return updated_page or {"message": "Page updated successfully"}
+        return model_response(page)
     except Exception as e:
-        logger.error(f"Error updating page {page_id}: {str(e)}")
+        logger.error("Error updating page %s: %s", page_id, e)
         raise HTTPException(status_code=500, detail="Failed to update page")
 
 # Root endpoint
@@ -0,0 +1,133 @@
+"""
+Shared cache tier for DE---NINE Art Store
+A Redis-backed cache that sits behind the per-worker caches, so a cold
+worker can serve catalog payloads another worker already built and cart
+summaries are shared across workers. Redis errors degrade to cache misses.
+
+Entries are stamped with a version read alongside them. Writes bump the
+version instead of deleting keys, so a reader that fetched data before a
+write cannot store it as current afterwards.
+"""
+
+import logging
+import os
+from typing import Dict, Optional, Tuple
+
+from compression import PrecompressedPayload
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # redis is optional; without it only the in-process tier is used
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+class CacheMetrics:
+    """Hit/miss counters per tier and namespace"""
+
+    def __init__(self):
+        self._counts: Dict[str, Dict[str, Dict[str, int]]] = {}
+
+    def record(self, tier: str, namespace: str, hit: bool):
+        counts = self._counts.setdefault(tier, {}).setdefault(namespace, {"hits": 0, "misses": 0})
+        counts["hits" if hit else "misses"] += 1
+
+    def stats(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        report = {}
+        for tier, namespaces in self._counts.items():
+            report[tier] = {}
+            for namespace, counts in namespaces.items():
+                total = counts["hits"] + counts["misses"]
+                report[tier][namespace] = {
+                    **counts,
+                    "hit_ratio": round(counts["hits"] / total, 4) if total else None,
+                }
+        return report
+
+cache_metrics = CacheMetrics()
+
+def pack_payload(payload: PrecompressedPayload) -> bytes:
+    br = payload.br or b""
+    header = f"{len(payload.body)} {len(payload.gzip)} {len(br)} {payload.etag}\n".encode()
+    return header + payload.body + payload.gzip + br
+
+def unpack_payload(data: bytes) -> PrecompressedPayload:
+    header, _, rest = data.partition(b"\n")
+    body_length, gzip_length, br_length, etag = header.decode().split(" ", 3)
+    body_end = int(body_length)
+    gzip_end = body_end + int(gzip_length)
+    return PrecompressedPayload(
+        body=rest[:body_end],
+        gzip=rest[body_end:gzip_end],
+        br=rest[gzip_end:gzip_end + int(br_length)] or None,
+        etag=etag
+    )
+
+class SharedCache:
+    """Versioned, namespaced entries with TTLs in Redis"""
+
+    def __init__(self, client, prefix: str = "denine:cache:"):
+        self.prefix = prefix
+        self._redis = client
+        self.errors = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["SharedCache"]:
+        url = os.environ.get("CACHE_REDIS_URL")
+        if not url:
+            return None
+        if aioredis is None:
+            logger.warning("CACHE_REDIS_URL is set but redis is not installed; using in-process caches only")
+            return None
+        # Short timeouts: a slow cache must not be slower than a miss
+        timeout = float(os.environ.get("CACHE_REDIS_TIMEOUT", "0.25"))
+        return cls(aioredis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout))
+
+    def _failed(self, operation: str, error: Exception):
+        self.errors += 1
+        logger.warning("Shared cache %s failed: %s", operation, error)
+
+    async def get(self, namespace: str, key: str, version_key: str) -> Tuple[Optional[bytes], int]:
+        """Return (value or None, current version) in one round trip"""
+        try:
+            value, version = await self._redis.mget(
+                f"{self.prefix}{namespace}:{key}", f"{self.prefix}{namespace}:version:{version_key}"
+            )
+        except Exception as e:
+            self._failed("get", e)
+            cache_metrics.record("shared", namespace, False)
+            return None, -1
+
+        version = int(version or 0)
+        if value is not None:
+            stamp, _, value = value.partition(b"\n")
+            if int(stamp) != version:
+                value = None
+        cache_metrics.record("shared", namespace, value is not None)
+        return value, version
+
+    async def set(self, namespace: str, key: str, version: int, value: bytes, ttl: float):
+        """Store a value computed from data read at the given version"""
+        if version < 0:
+            return
+        try:
+            await self._redis.set(
+                f"{self.prefix}{namespace}:{key}", b"%d\n%s" % (version, value), px=int(ttl * 1000)
+            )
+        except Exception as e:
+            self._failed("set", e)
+
+    async def invalidate(self, namespace: str, version_key: str, ttl: float):
+        """Make every entry stamped with the current version stale"""
+        redis_key = f"{self.prefix}{namespace}:version:{version_key}"
+        try:
+            async with self._redis.pipeline(transaction=True) as pipe:
+                pipe.incr(redis_key)
+                # Outlive the entries so an expired version cannot match them again
+                pipe.pexpire(redis_key, int(ttl * 2000))
+                await pipe.execute()
+        except Exception as e:
+            self._failed("invalidate", e)
+
+    async def close(self):
+        await self._redis.aclose()
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""
+DE---NINE Art Print Store Backend Benchmarks
+Micro-benchmarks for backend hot paths. Run a single benchmark by name:
+
+    python backend_benchmark.py compression
+    python backend_benchmark.py serialization
+    python backend_benchmark.py cart_store   # needs MongoDB at MONGO_URL
+    python backend_benchmark.py http         # in-memory repositories, no MongoDB
+"""
+
+import asyncio
+import gzip
+import os
+import sys
+import time
+import timeit
+from copy import deepcopy
+from datetime import datetime
+from pathlib import Path
+
+# Benchmarks import backend modules directly; only cart_store contacts a database
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "denine_artstore_bench")
+
+class Colors:
+    GREEN = '\033[92m'
+    BLUE = '\033[94m'
+    ENDC = '\033[0m'
+    BOLD = '\033[1m'
+
+def print_bench_header(name):
+    print(f"\n{Colors.BLUE}{Colors.BOLD}{'='*72}{Colors.ENDC}")
+    print(f"{Colors.BLUE}{Colors.BOLD}Benchmark: {name}{Colors.ENDC}")
+    print(f"{Colors.BLUE}{Colors.BOLD}{'='*72}{Colors.ENDC}")
+
+def time_per_call(func):
+    """Best-of-three average seconds per call, auto-scaling the iteration count"""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=3, number=number)) / number
+
+# Sample payloads
+def sample_catalog(copies=1):
+    """Catalog response shaped like GET /api/prints"""
+    from init_db import print_themes_data
+
+    prints = []
+    for copy in range(copies):
+        for theme in print_themes_data:
+            item = deepcopy(theme)
+            item["id"] = f"{copy:08x}{len(prints):016x}"
+            item["theme_id"] = f"{theme['theme_id']}-{copy}"
+            prints.append(item)
+    return {"prints": prints}
+
+def sample_cart(item_count=10):
+    """Expanded cart response shaped like GET /api/cart/{id}?expand=themes"""
+    from init_db import print_themes_data
+
+    items = []
+    for index in range(item_count):
+        theme = print_themes_data[index % len(print_themes_data)]
+        items.append({
+            "id": f"{index:024x}",
+            "session_id": "bench_session_0123456789",
+            "user_id": None,
+            "theme_id": theme["theme_id"],
+            "selected_variants": [variant["id"] for variant in theme["variants"]],
+            "quantity": 1 + index % 3,
+            "unit_price": theme["base_price"] * 3,
+            "total_price": theme["base_price"] * 3 * (1 + index % 3),
+            "created_at": datetime.utcnow(),
+            "updated_at": datetime.utcnow(),
+            "theme": {
+                "theme_id": theme["theme_id"],
+                "theme": theme["theme"],
+                "base_price": theme["base_price"],
+                "thumbnail_url": theme["variants"][0]["image_url"],
+            },
+            "variants": [
+                {"id": variant["id"], "name": variant["name"], "image_url": variant["image_url"]}
+                for variant in theme["variants"]
+            ],
+        })
+    subtotal = sum(item["total_price"] for item in items)
+    return {"subtotal": subtotal, "shipping": 0, "total": subtotal, "items": items}
+
+def sample_orders(order_count=20):
+    """Order documents shaped like GET /api/orders/{id}"""
+    cart = sample_cart(3)
+    orders = []
+    for index in range(order_count):
+        orders.append({
+            "id": f"{index:024x}",
+            "order_number": f"DN-20251017-{index:06d}",
+            "session_id": "bench_session_0123456789",
+            "user_id": None,
+            "items": [
+                {key: value for key, value in item.items() if key not in ("theme", "variants")}
+                for item in cart["items"]
+            ],
+            "subtotal": cart["subtotal"],
+            "shipping_cost": 0,
+            "total": cart["total"],
+            "status": "processing",
+            "payment_transaction_id": f"cs_test_{index:032x}",
+            "shipping_address": None,
+            "customer_info": {"session_id": "bench_session_0123456789", "customer_email": "buyer@example.com"},
+            "created_at": datetime.utcnow(),
+            "updated_at": datetime.utcnow(),
+        })
+    return {"orders": orders}
+
+def as_mongo_documents(documents):
+    """Replace string ids with ObjectId _id, as documents come out of Motor"""
+    from bson import ObjectId
+
+    raw = []
+    for document in documents:
+        document = dict(document)
+        del document["id"]
+        raw.append({"_id": ObjectId(), **document})
+    return raw
+
+# Benchmarks
+def bench_compression():
+    """CPU cost vs bytes saved for catalog and cart responses"""
+    from compression import encode_json, brotli
+    from server import json_default
+
+    print_bench_header("Response compression (CPU cost vs bytes saved)")
+
+    codecs = [("gzip-1", lambda body: gzip.compress(body, 1, mtime=0)),
+              ("gzip-6", lambda body: gzip.compress(body, 6, mtime=0)),
+              ("gzip-9", lambda body: gzip.compress(body, 9, mtime=0))]
+    if brotli:
+        codecs += [("br-4", lambda body: brotli.compress(body, quality=4)),
+                   ("br-8", lambda body: brotli.compress(body, quality=8)),
+                   ("br-11", lambda body: brotli.compress(body, quality=11))]
+    else:
+        print("brotli not installed, benchmarking gzip only")
+
+    payloads = [
+        ("catalog (5 themes)", sample_catalog(1)),
+        ("catalog (100 themes)", sample_catalog(20)),
+        ("cart (10 items, expanded)", sample_cart(10)),
+    ]
+
+    print(f"{'payload':<28}{'codec':<9}{'bytes':>10}{'saved':>9}{'cpu/op':>12}{'MB/s':>9}")
+    for name, content in payloads:
+        body = encode_json(content, json_default)
+        print(f"{name:<28}{'identity':<9}{len(body):>10}{'':>9}{'':>12}{'':>9}")
+        for codec_name, codec in codecs:
+            compressed = codec(body)
+            seconds = time_per_call(lambda: codec(body))
+            saved = 1 - len(compressed) / len(body)
+            throughput = len(body) / seconds / 1e6
+            print(f"{'':<28}{codec_name:<9}{len(compressed):>10}{saved:>8.1%}"
+                  f"{seconds * 1e6:>10.1f}us{throughput:>9.1f}")
+
+    print("\nCached catalog payloads are compressed once per fill with gzip-9/br-11;")
+    print("uncached responses use gzip-6/br-4 per request.")
+
+def bench_serialization():
+    """Typed read models vs the legacy _id loop + jsonable_encoder path"""
+    import json
+    from fastapi.encoders import jsonable_encoder
+    from server import PrintsResponse, CartResponse, OrdersResponse
+
+    print_bench_header("Response serialisation (legacy dict path vs typed models)")
+
+    def legacy(key, documents, extra):
+        # What the handlers did before: rename _id in a loop, then let
+        # FastAPI run jsonable_encoder and JSONResponse.render
+        documents = [dict(document) for document in documents]
+        for document in documents:
+            document["id"] = str(document["_id"])
+            del document["_id"]
+        content = jsonable_encoder({**extra, key: documents})
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+    def typed(model, key, documents, extra):
+        documents = [dict(document) for document in documents]
+        return model.model_validate({**extra, key: documents}).model_dump_json(exclude_unset=True)
+
+    cart = sample_cart(10)
+    cases = [
+        ("GET /api/prints (100 themes)", PrintsResponse, "prints",
+         as_mongo_documents(sample_catalog(20)["prints"]), {}),
+        ("GET /api/cart/{id} (10 items)", CartResponse, "items",
+         as_mongo_documents(cart["items"]),
+         {"subtotal": cart["subtotal"], "shipping": 0, "total": cart["total"]}),
+        ("GET /api/orders/{id} (20 orders)", OrdersResponse, "orders",
+         as_mongo_documents(sample_orders(20)["orders"]), {}),
+    ]
+
+    print(f"{'endpoint':<36}{'legacy':>12}{'typed':>12}{'speedup':>10}")
+    for name, model, key, documents, extra in cases:
+        legacy_seconds = time_per_call(lambda: legacy(key, documents, extra))
+        typed_seconds = time_per_call(lambda: typed(model, key, documents, extra))
+        print(f"{name:<36}{legacy_seconds * 1e6:>10.1f}us{typed_seconds * 1e6:>10.1f}us"
+              f"{legacy_seconds / typed_seconds:>9.2f}x")
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def bench_cart_store(shoppers=200, items_per_cart=5, reads_per_cart=5):
+    """Line-per-document vs embedded carts under concurrent shoppers"""
+    from bson import ObjectId
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from cart_store import CART_STORES
+
+    print_bench_header(f"Cart store ({shoppers} concurrent shoppers, {items_per_cart} items each)")
+
+    cart = sample_cart(items_per_cart)
+    lines = [
+        {key: value for key, value in item.items() if key not in ("id", "theme", "variants")}
+        for item in cart["items"]
+    ]
+
+    async def shopper(store, index, timings):
+        session_id = f"bench_session_{index:06d}"
+
+        async def timed(operation, call):
+            started = time.perf_counter()
+            result = await call
+            timings.setdefault(operation, []).append(time.perf_counter() - started)
+            return result
+
+        added = []
+        for line in lines:
+            item = {**line, "_id": ObjectId(), "session_id": session_id}
+            await timed("add", store.add_item(session_id, item))
+            added.append(item["_id"])
+        for _ in range(reads_per_cart):
+            await timed("get", store.get_items(session_id))
+        await timed("remove", store.remove_item(session_id, added[0]))
+        await timed("clear", store.clear(session_id))
+
+    async def run():
+        client = AsyncIOMotorClient(os.environ["MONGO_URL"], serverSelectionTimeoutMS=2000)
+        try:
+            await client.admin.command("ping")
+        except Exception:
+            print(f"MongoDB not reachable at {os.environ['MONGO_URL']}; skipping")
+            return
+
+        db = client[os.environ["DB_NAME"]]
+        await db.cart_items.create_index("session_id")
+        operations = ["add", "get", "remove", "clear"]
+        print(f"{'store':<10}{'ops/s':>9}" + "".join(f"{op + ' p50/p99':>20}" for op in operations))
+        try:
+            for name, factory in CART_STORES.items():
+                store = factory(db)
+                timings = {}
+                started = time.perf_counter()
+                await asyncio.gather(*(shopper(store, index, timings) for index in range(shoppers)))
+                elapsed = time.perf_counter() - started
+                total_ops = sum(len(samples) for samples in timings.values())
+                row = f"{name:<10}{total_ops / elapsed:>9.0f}"
+                for op in operations:
+                    p50 = percentile(timings[op], 0.5) * 1e3
+                    p99 = percentile(timings[op], 0.99) * 1e3
+                    row += f"{p50:>11.2f}/{p99:>6.2f}ms"
+                print(row)
+            print("\nadd/remove return the updated cart: one round trip for embedded, two for lines.")
+        finally:
+            await client.drop_database(os.environ["DB_NAME"])
+            client.close()
+
+    asyncio.run(run())
+
+def bench_http(requests_per_case=2000, concurrency=50):
+    """Requests/s through routing, middleware and serialisation alone"""
+    import httpx
+
+    # Memory repositories take the database out of the measurement; the
+    # rate limiter would otherwise throttle the single benchmark client
+    os.environ["REPOSITORY_BACKEND"] = "memory"
+    os.environ["RATE_LIMIT_ENABLED"] = "false"
+    os.environ["ADMISSION_CONTROL_ENABLED"] = "false"
+    import logging
+    import server
+    from init_db import print_themes_data
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    print_bench_header(f"HTTP layer on in-memory repositories ({concurrency} concurrent clients)")
+
+    theme = print_themes_data[0]
+    cart_item = {
+        "theme_id": theme["theme_id"],
+        "selected_variants": [variant["id"] for variant in theme["variants"]],
+        "quantity": 1,
+        "unit_price": theme["base_price"],
+    }
+    cases = [
+        ("GET /api/prints", "GET", "/api/prints", None),
+        ("GET /api/prints/{id}", "GET", f"/api/prints/{theme['theme_id']}", None),
+        ("GET /api/prints/featured?limit=3", "GET", "/api/prints/featured?limit=3", None),
+        ("GET /api/cart/{id}?expand=themes", "GET", "/api/cart/bench_session?expand=themes", None),
+        ("POST /api/cart/{id}/add", "POST", "/api/cart/bench_add_{index}/add", cart_item),
+    ]
+
+    async def run():
+        async with server.app.router.lifespan_context(server.app):
+            for document in print_themes_data:
+                await server.repositories.themes.create(deepcopy(document))
+            for _ in range(5):
+                await server.repositories.carts.add_item("bench_session", {
+                    **cart_item, "_id": server.ObjectId(), "session_id": "bench_session",
+                    "total_price": cart_item["unit_price"]
+                })
+
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                print(f"{'endpoint':<36}{'req/s':>10}{'p50':>10}{'p99':>10}")
+                for name, method, path, body in cases:
+                    # Warm up, so catalog cache fills are not measured
+                    await client.request(method, path.format(index=0), json=body)
+                    latencies = []
+                    counter = iter(range(requests_per_case))
+
+                    async def worker():
+                        for index in counter:
+                            started = time.perf_counter()
+                            response = await client.request(
+                                method, path.format(index=index % 100), json=body,
+                                headers={"Accept-Encoding": "gzip"}
+                            )
+                            response.raise_for_status()
+                            latencies.append(time.perf_counter() - started)
+
+                    started = time.perf_counter()
+                    await asyncio.gather(*(worker() for _ in range(concurrency)))
+                    elapsed = time.perf_counter() - started
+                    print(f"{name:<36}{len(latencies) / elapsed:>10.0f}"
+                          f"{percentile(latencies, 0.5) * 1e3:>8.2f}ms{percentile(latencies, 0.99) * 1e3:>8.2f}ms")
+
+    asyncio.run(run())
+
+BENCHMARKS = {
+    "compression": bench_compression,
+    "serialization": bench_serialization,
+    "cart_store": bench_cart_store,
+    "http": bench_http,
+}
+
+def run_benchmarks(names):
+    started = time.perf_counter()
+    for name in names:
+        BENCHMARKS[name]()
+    print(f"\n{Colors.GREEN}Completed {len(names)} benchmark(s) in "
+          f"{time.perf_counter() - started:.1f}s{Colors.ENDC}")
+
+if __name__ == "__main__":
+    selected = sys.argv[1:] or list(BENCHMARKS)
+    unknown = [name for name in selected if name not in BENCHMARKS]
+    if unknown:
+        print(f"Unknown benchmark(s): {', '.join(unknown)}. Available: {', '.join(BENCHMARKS)}")
+        sys.exit(1)
+    run_benchmarks(selected)
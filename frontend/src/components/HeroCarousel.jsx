@@ -25,14 +25,13 @@ export const HeroCarousel = () => {
 
   const fetchPrints = async () => {
     try {
-      const response = await axios.get(`${API}/prints`);
+      const response = await axios.get(`${API}/prints/featured`);
       const prints = response.data.prints || [];
       
       // Get featured images from all prints for the carousel
       const images = prints.map(print => {
-        const featuredVariant = print.variants.find(v => v.featured);
         return {
-          image: featuredVariant?.image_url,
+          image: print.variant?.image_url,
           theme: print.theme,
           description: print.description
         };
@@ -18,7 +18,7 @@ export const HomePage = () => {
 
   const fetchPrints = async () => {
     try {
-      const response = await axios.get(`${API}/prints`);
+      const response = await axios.get(`${API}/prints/featured?limit=3`);
       setPrints(response.data.prints || []);
     } catch (err) {
       console.error('Error fetching prints:', err);
@@ -56,7 +56,7 @@ export const HomePage = () => {
           
           <div className="artist-grid">
             {prints.slice(0, 3).map((print, index) => {
-              const featuredVariant = print.variants.find(v => v.featured);
+              const featuredVariant = print.variant;
               return (
                 <div key={print.theme_id} className={`card-artworld fade-in-up stagger-${index + 1}`}>
                   <Link to={`/print/${print.theme_id}`}>
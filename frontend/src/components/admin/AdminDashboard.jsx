@@ -684,8 +684,26 @@ const EditPageModal = ({ page, onClose, onSave }) => {
   );
 };
 const Analytics = ({ prints, orders }) => {
+  const [sales, setSales] = useState(null);
   const totalCollections = prints.length;
   const totalVariants = prints.reduce((sum, print) => sum + print.variants.length, 0);
+
+  useEffect(() => {
+    fetchSales();
+  }, []);
+
+  // Reads precomputed daily rollups; never aggregates the orders collection
+  const fetchSales = async () => {
+    try {
+      const response = await axios.get(`${API}/admin/analytics/sales`);
+      setSales(response.data);
+    } catch (error) {
+      console.error('Error fetching sales analytics:', error);
+    }
+  };
+
+  const themeSales = (themeId) =>
+    sales?.themes.find(theme => theme.theme_id === themeId) || { revenue: 0, quantity: 0 };
   
   return (
     <div>
@@ -712,6 +730,15 @@ const Analytics = ({ prints, orders }) => {
             <div className="nav-link">Total Orders</div>
           </div>
         </div>
+
+        <div className="card-artworld">
+          <div style={{padding: 'var(--spacing-lg)', textAlign: 'center'}}>
+            <div className="hero-title" style={{fontSize: '3rem', marginBottom: 'var(--spacing-sm)'}}>
+              {sales ? (sales.totals.revenue / 100).toFixed(0) : '–'}
+            </div>
+            <div className="nav-link">Revenue (NOK, 30 days)</div>
+          </div>
+        </div>
       </div>
       
       <div className="card-artworld">
@@ -721,7 +748,9 @@ const Analytics = ({ prints, orders }) => {
             {prints.map(print => (
               <div key={print.theme_id} style={{display: 'flex', justifyContent: 'space-between', alignItems: 'center', padding: 'var(--spacing-sm)', borderBottom: '1px solid var(--color-gray-200)'}}>
                 <span className="body-text">{print.theme}</span>
-                <span className="caption-text">NOK {(print.base_price / 100).toFixed(0)}</span>
+                <span className="caption-text">
+                  {themeSales(print.theme_id).quantity} sold · NOK {(themeSales(print.theme_id).revenue / 100).toFixed(0)}
+                </span>
               </div>
             ))}
           </div>
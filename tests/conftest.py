@@ -0,0 +1,30 @@
+import os
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+
+# Backend modules are imported as top-level modules, as uvicorn does
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+TEST_MONGO_URL = os.environ.get("TEST_MONGO_URL", "mongodb://localhost:27017")
+
+@pytest.fixture
+def mongo_db_name():
+    """Name of a throwaway database on TEST_MONGO_URL; skips without MongoDB"""
+    pymongo = pytest.importorskip("pymongo")
+
+    client = pymongo.MongoClient(TEST_MONGO_URL, serverSelectionTimeoutMS=500)
+    try:
+        client.admin.command("ping")
+    except Exception:
+        client.close()
+        pytest.skip(f"MongoDB not available at {TEST_MONGO_URL}")
+
+    name = f"denine_test_{uuid.uuid4().hex[:8]}"
+    yield name
+
+    client.drop_database(name)
+    client.close()
@@ -0,0 +1,256 @@
+import os
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from bson import ObjectId
+
+pytest.importorskip("emergentintegrations")
+
+from fastapi.testclient import TestClient
+
+@pytest.fixture(scope="module")
+def client():
+    """App on in-memory repositories; no MongoDB needed for these routes"""
+    os.environ["REPOSITORY_BACKEND"] = "memory"
+    os.environ["RATE_LIMIT_ENABLED"] = "false"
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    os.environ.setdefault("DB_NAME", "denine_artstore_test")
+    import server
+    from init_db import print_themes_data
+
+    with TestClient(server.app) as test_client:
+        for theme in print_themes_data:
+            test_client.portal.call(server.repositories.themes.create, theme)
+        server.catalog_cache.invalidate()
+        yield test_client
+
+def test_catalog_supports_conditional_get(client):
+    response = client.get("/api/prints")
+    assert response.status_code == 200
+    assert len(response.json()["prints"]) == 5
+
+    cached = client.get("/api/prints", headers={"If-None-Match": response.headers["etag"]})
+    assert cached.status_code == 304
+
+def test_cart_add_and_remove(client):
+    theme = client.get("/api/prints").json()["prints"][0]
+    item = {
+        "theme_id": theme["theme_id"],
+        "selected_variants": [theme["variants"][0]["id"]],
+        "quantity": 2,
+        "unit_price": theme["base_price"],
+    }
+
+    cart = client.post("/api/cart/api_test/add?expand=themes", json=item).json()
+    assert cart["total"] == 2 * theme["base_price"]
+    assert cart["items"][0]["theme"]["theme_id"] == theme["theme_id"]
+
+    cart = client.delete(f"/api/cart/api_test/item/{cart['items'][0]['id']}").json()
+    assert cart["items"] == [] and cart["total"] == 0
+
+def test_pages_are_served_after_update(client):
+    assert client.get("/api/pages/about").status_code == 404
+
+    client.put("/api/admin/pages/about", json={"title": "About DE---NINE"})
+    page = client.get("/api/pages/about")
+    assert page.status_code == 200 and page.json()["title"] == "About DE---NINE"
+
+def test_featured_prints_carry_one_variant(client):
+    full = client.get("/api/prints")
+    featured = client.get("/api/prints/featured?limit=3")
+    assert featured.status_code == 200
+
+    prints = featured.json()["prints"]
+    assert len(prints) == 3
+    first = full.json()["prints"][0]
+    expected = next(v for v in first["variants"] if v["featured"])
+    assert prints[0]["variant"] == {key: expected[key] for key in ("id", "name", "image_url")}
+    assert len(featured.content) * 3 < len(full.content)
+
+def test_fields_select_catalog_and_order_fields(client):
+    prints = client.get("/api/prints?fields=theme_id,variants.image_url").json()["prints"]
+    assert set(prints[0]) == {"theme_id", "variants"}
+    assert set(prints[0]["variants"][0]) == {"image_url"}
+
+    theme = client.get(f"/api/prints/{prints[0]['theme_id']}?fields=id,theme").json()
+    assert set(theme) == {"id", "theme"}
+    assert client.get("/api/prints?fields=secret").status_code == 400
+
+    import server
+    client.portal.call(server.repositories.orders.create, {
+        "_id": ObjectId(), "order_number": "DN-1", "session_id": "fields_test", "payment_transaction_id": "cs_fields",
+        "items": [], "subtotal": 100, "total": 100, "status": "processing", "created_at": datetime(2026, 1, 1),
+    })
+    orders = client.get("/api/orders/fields_test?fields=order_number,total").json()["orders"]
+    assert orders == [{"order_number": "DN-1", "total": 100}]
+
+    cart = client.get("/api/cart/fields_test?fields=theme_id").json()
+    assert cart == {"subtotal": 0, "shipping": 0, "total": 0, "items": []}
+
+def test_responses_leave_out_internal_fields(client):
+    import server
+    client.portal.call(server.repositories.orders.create, {
+        "_id": ObjectId(), "order_number": "DN-2", "session_id": "internal_test", "payment_transaction_id": "cs_internal",
+        "items": [], "subtotal": 100, "total": 100, "status": "processing", "created_at": datetime(2026, 1, 1),
+        "rollups_applied": True, "cart_cleared": True,
+    })
+    [order] = client.get("/api/orders/internal_test").json()["orders"]
+    assert order["order_number"] == "DN-2"
+    assert not {"rollups_applied", "cart_cleared"} & set(order)
+
+    # Page content is free-form and keeps its extra fields
+    client.put("/api/admin/pages/faq", json={"title": "FAQ", "sections": [{"q": "Frames?", "a": "No"}]})
+    assert client.get("/api/pages/faq").json()["sections"] == [{"q": "Frames?", "a": "No"}]
+
+def test_variants_without_created_at_are_served_as_stored(client):
+    import server
+    client.portal.call(server.repositories.themes.create, {
+        "theme_id": "untimed", "theme": "Untimed", "base_price": 100,
+        "variants": [{"id": "untimed-v1", "name": "V1", "image_url": "https://img/untimed.jpg"}],
+    })
+    server.catalog_cache.invalidate()
+    [variant] = client.get("/api/prints/untimed").json()["variants"]
+    assert variant["created_at"] is None
+    client.portal.call(server.repositories.themes.delete, "untimed")
+    server.catalog_cache.invalidate()
+
+def test_repeated_payment_processing_keeps_a_refilled_cart(client, monkeypatch):
+    import server
+
+    class Allocator:
+        async def next(self):
+            return "DN-REPEAT"
+
+    async def skip(*args):
+        return False
+
+    # Order numbers, the outbox and rollups live in MongoDB only
+    monkeypatch.setattr(server, "order_number_allocator", Allocator())
+    monkeypatch.setattr(server, "enqueue_order_confirmation", skip)
+    monkeypatch.setattr(server, "apply_order_to_rollups", skip)
+
+    theme = client.get("/api/prints").json()["prints"][0]
+    item = {"theme_id": theme["theme_id"], "selected_variants": [], "quantity": 1, "unit_price": 100}
+    client.portal.call(server.repositories.payments.create, {
+        "payment_id": "cs_repeat", "session_id": "repeat_test", "items": [], "amount": 100,
+        "status": "completed", "created_at": datetime.utcnow(),
+    })
+
+    client.post("/api/cart/repeat_test/add", json=item)
+    client.portal.call(server.process_successful_payment, "cs_repeat", SimpleNamespace(email_outbox=None))
+    assert client.get("/api/cart/repeat_test").json()["total"] == 0
+
+    client.post("/api/cart/repeat_test/add", json=item)
+    client.portal.call(server.process_successful_payment, "cs_repeat", SimpleNamespace(email_outbox=None))
+    assert client.get("/api/cart/repeat_test").json()["total"] == 100
+
+def test_losing_a_concurrent_order_insert_leaves_the_cart_alone(client, monkeypatch):
+    import server
+    from pymongo.errors import DuplicateKeyError
+
+    class Allocator:
+        async def next(self):
+            return "DN-RACE"
+
+    calls = []
+
+    async def record(*args):
+        calls.append(args)
+        return False
+
+    create = server.repositories.orders.create
+
+    async def create_after_winner(order):
+        # The other job inserted and finished first
+        await create({**order, "_id": ObjectId(), "cart_cleared": True, "rollups_applied": True})
+        await create(order)
+
+    monkeypatch.setattr(server, "order_number_allocator", Allocator())
+    monkeypatch.setattr(server, "enqueue_order_confirmation", record)
+    monkeypatch.setattr(server, "apply_order_to_rollups", record)
+    monkeypatch.setattr(server.repositories.orders, "create", create_after_winner)
+
+    theme = client.get("/api/prints").json()["prints"][0]
+    client.portal.call(server.repositories.payments.create, {
+        "payment_id": "cs_race", "session_id": "race_test", "items": [], "amount": 100,
+        "status": "completed", "created_at": datetime.utcnow(),
+    })
+    item = {"theme_id": theme["theme_id"], "selected_variants": [], "quantity": 1, "unit_price": 100}
+    client.post("/api/cart/race_test/add", json=item)
+
+    client.portal.call(server.process_successful_payment, "cs_race", SimpleNamespace(email_outbox=None))
+    assert client.get("/api/cart/race_test").json()["total"] == 100
+    assert calls == []
+
+def test_partly_applied_rollups_are_not_retried(client, monkeypatch):
+    import server
+    from sales_rollups import PartialRollupError
+
+    class Allocator:
+        async def next(self):
+            return "DN-PARTIAL"
+
+    async def skip(*args):
+        return False
+
+    async def partly_apply(db, order):
+        raise PartialRollupError(["terra-flow"], ["mineral-veins"], Exception("boom"))
+
+    monkeypatch.setattr(server, "order_number_allocator", Allocator())
+    monkeypatch.setattr(server, "enqueue_order_confirmation", skip)
+    monkeypatch.setattr(server, "apply_order_to_rollups", partly_apply)
+
+    client.portal.call(server.repositories.payments.create, {
+        "payment_id": "cs_partial", "session_id": "partial_test", "items": [], "amount": 100,
+        "status": "completed", "created_at": datetime.utcnow(),
+    })
+    client.portal.call(server.process_successful_payment, "cs_partial", SimpleNamespace(email_outbox=None))
+    order = client.portal.call(server.repositories.orders.get_by_payment, "cs_partial")
+    assert order["rollups_applied"]
+
+def test_image_derivatives_refuse_arbitrary_sources(client):
+    for src in ("http://169.254.169.254/latest/meta-data/", "http://127.0.0.1:27017/"):
+        assert client.get("/api/images/320/webp", params={"src": src}).status_code == 403
+
+def test_image_derivatives_revalidate_against_the_content_etag(client, monkeypatch, tmp_path):
+    import server
+
+    derivative = tmp_path / "terra-320.webp"
+    derivative.write_bytes(b"webp")
+
+    async def get_derivative(src, width, fmt):
+        return derivative, "abc123"
+
+    monkeypatch.setattr(server.image_service, "get_derivative", get_derivative)
+    params = {"src": "prints/terra.jpg"}
+    response = client.get("/api/images/320/webp", params=params)
+    assert response.status_code == 200 and response.content == b"webp"
+    assert "immutable" not in response.headers["cache-control"]
+
+    headers = {"If-None-Match": response.headers["etag"]}
+    assert client.get("/api/images/320/webp", params=params, headers=headers).status_code == 304
+
+def test_profiles_require_the_profile_token(client, monkeypatch):
+    import server
+
+    monkeypatch.setattr(server, "profile_token", None)
+    assert client.get("/api/admin/profiles").status_code == 403
+
+    monkeypatch.setattr(server, "profile_token", "secret")
+    for headers in ({}, {"Authorization": "Bearer wrong"}, {"Authorization": "secret"}):
+        assert client.get("/api/admin/profiles", headers=headers).status_code == 403
+        assert client.get("/api/admin/profiles/1-0000abcd", headers=headers).status_code == 403
+
+    authorized = {"Authorization": "Bearer secret"}
+    assert client.get("/api/admin/profiles", headers=authorized).status_code == 200
+    assert client.get("/api/admin/profiles/1-0000abcd", headers=authorized).status_code == 404
+
+def test_app_starts_with_slow_query_logging_off(client, monkeypatch):
+    import server
+
+    monkeypatch.setenv("SLOW_QUERY_MS", "0")
+    assert server.SlowQueryLog.from_env() is None
+    monkeypatch.setattr(server, "slow_query_log", None)
+    with TestClient(server.app) as restarted:
+        assert restarted.get("/api/prints").status_code == 200
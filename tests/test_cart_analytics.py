@@ -0,0 +1,79 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from cart_analytics import CartReport, age_bucket, analyze_carts
+from tests.conftest import TEST_MONGO_URL
+
+NOW = datetime(2026, 6, 1, 12)
+
+def cart(session_id, idle, *lines):
+    return {
+        "_id": session_id,
+        "last_activity": NOW - idle,
+        "lines": [{"theme_id": theme_id, "quantity": quantity, "value": quantity * 100} for theme_id, quantity in lines],
+    }
+
+def test_report_buckets_carts_and_totals_abandoned_value_per_theme():
+    report = CartReport(NOW, abandoned_after=timedelta(hours=24))
+    assert not report.add(cart("fresh", timedelta(minutes=5), ("terra", 1)))
+    assert report.add(cart("idle", timedelta(days=3), ("terra", 2), ("mineral", 1)))
+    assert report.add(cart("old", timedelta(days=45), ("terra", 1)))
+    assert not report.add(cart("empty", timedelta(days=2)))
+
+    result = report.to_dict()
+    buckets = {bucket["bucket"]: bucket for bucket in result["age_buckets"]}
+    assert (buckets["0-1h"]["carts"], buckets["1-7d"]["value"], buckets["30d+"]["carts"]) == (1, 300, 1)
+    assert result["carts"] == {"total": 3, "abandoned": {"carts": 2, "lines": 3, "quantity": 4, "value": 400}}
+    assert result["themes"] == [
+        {"theme_id": "terra", "carts": 2, "quantity": 3, "value": 300},
+        {"theme_id": "mineral", "carts": 1, "quantity": 1, "value": 100},
+    ]
+    assert age_bucket(timedelta(hours=1)) == "1-24h"
+
+def test_carts_without_any_timestamp_count_as_oldest():
+    report = CartReport(NOW, abandoned_after=timedelta(hours=24))
+    assert report.add({"_id": "legacy", "last_activity": None, "lines": [{"theme_id": "terra", "quantity": 1, "value": 100}]})
+    assert report.to_dict()["age_buckets"][-1] == {"bucket": "30d+", "carts": 1, "lines": 1, "quantity": 1, "value": 100}
+
+@pytest.mark.parametrize("layout", ["lines", "embedded"])
+def test_cleanup_deletes_only_carts_idle_past_the_cutoff(mongo_db_name, layout):
+    motor = pytest.importorskip("motor.motor_asyncio")
+
+    def line(session_id, idle):
+        touched = NOW - idle
+        return {"_id": ObjectId(), "session_id": session_id, "theme_id": "terra", "quantity": 1,
+                "total_price": 19900, "created_at": touched, "updated_at": touched}
+
+    async def run():
+        client = motor.AsyncIOMotorClient(TEST_MONGO_URL)
+        db = client[mongo_db_name]
+        try:
+            lines = [line(f"s{i}", timedelta(days=i)) for i in range(10)]
+            # Written before carts carried timestamps
+            legacy = line("legacy", timedelta(days=20))
+            del legacy["created_at"], legacy["updated_at"]
+            if layout == "lines":
+                legacy["_id"] = ObjectId.from_datetime(NOW - timedelta(days=20))
+                await db.cart_items.insert_many(lines + [legacy])
+                remaining = lambda: db.cart_items.distinct("session_id")
+            else:
+                await db.carts.insert_many([
+                    {"_id": item["session_id"], "items": [item], "updated_at": item["updated_at"]} for item in lines
+                ] + [{"_id": "legacy", "items": [legacy], "created_at": NOW - timedelta(days=20)}])
+                remaining = lambda: db.carts.distinct("_id")
+
+            result = await analyze_carts(
+                db, layout=layout, now=NOW, delete_before=NOW - timedelta(days=7), batch_size=2, pause=0
+            )
+            return result, sorted(await remaining())
+        finally:
+            client.close()
+
+    result, remaining = asyncio.run(run())
+    assert result["carts"]["total"] == 11
+    assert result["carts"]["abandoned"]["value"] == 10 * 19900
+    assert result["cleanup"]["carts"] == result["cleanup"]["deleted_documents"] == 3
+    assert remaining == [f"s{i}" for i in range(8)]
@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+from bson import ObjectId
+
+from cart_store import CART_STORES, CartStore, MemoryCartStore
+from tests.conftest import TEST_MONGO_URL
+
+def cart_line(session_id: str, theme_id: str, quantity: int = 1):
+    return {
+        "_id": ObjectId(),
+        "session_id": session_id,
+        "theme_id": theme_id,
+        "selected_variants": [f"{theme_id}-v1"],
+        "quantity": quantity,
+        "unit_price": 19900,
+        "total_price": 19900 * quantity,
+    }
+
+@pytest.mark.parametrize("store_name", sorted(CART_STORES))
+def test_cart_store_round_trip(mongo_db_name, store_name):
+    motor = pytest.importorskip("motor.motor_asyncio")
+
+    async def run():
+        client = motor.AsyncIOMotorClient(TEST_MONGO_URL)
+        store = CART_STORES[store_name](client[mongo_db_name])
+        try:
+            first = cart_line("s1", "terra-flow", 2)
+            second = cart_line("s1", "mineral-veins")
+            other = cart_line("s2", "arctic-formations")
+            await store.add_item("s2", other)
+
+            assert await store.get_items("s1") == []
+            assert [i["_id"] for i in await store.add_item("s1", first)] == [first["_id"]]
+            items = await store.add_item("s1", second)
+            assert [i["_id"] for i in items] == [first["_id"], second["_id"]]
+            assert items[0]["total_price"] == 39800
+
+            remaining = await store.remove_item("s1", first["_id"])
+            assert [i["_id"] for i in remaining] == [second["_id"]]
+            assert await store.remove_item("s1", first["_id"]) is None
+            # Lines of another session cannot be removed
+            assert await store.remove_item("s1", other["_id"]) is None
+            assert [i["_id"] for i in await store.get_items("s2")] == [other["_id"]]
+
+            await store.clear("s1")
+            assert await store.get_items("s1") == []
+            assert [i["_id"] for i in await store.get_items("s2")] == [other["_id"]]
+        finally:
+            client.close()
+
+    asyncio.run(run())
+
+def test_cart_stores_implement_the_whole_interface():
+    class Partial(CartStore):
+        async def get_items(self, session_id):
+            return []
+
+    with pytest.raises(TypeError):
+        Partial()
+    assert isinstance(MemoryCartStore(), CartStore)
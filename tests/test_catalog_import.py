@@ -0,0 +1,81 @@
+import asyncio
+import json
+
+import pytest
+
+from catalog_import import import_catalog, iter_csv_themes, iter_lines, iter_ndjson_themes, RowError
+from repositories import MongoThemeRepository
+from tests.conftest import TEST_MONGO_URL
+
+async def byte_chunks(data: bytes, size: int = 7):
+    """Deliver data in small chunks so lines straddle chunk boundaries"""
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+def collect(themes):
+    async def run():
+        return [item async for item in themes]
+    return asyncio.run(run())
+
+CSV_UPLOAD = (
+    "﻿theme_id,theme,description,base_price,variant_id,variant_name,image_url,featured\r\n"
+    'terra-flow,Terra Flow,"Earth and\nwater",19900,terra-flow-v1,Terra Flow I,https://img/1.jpg,true\r\n'
+    "terra-flow,Terra Flow,,19900,terra-flow-v2,Terra Flow II,https://img/2.jpg,false\r\n"
+    "mineral-veins,Mineral Veins,Geology,24900,mineral-veins-v1,Mineral Veins I,https://img/3.jpg,1\r\n"
+    "terra-flow,Terra Flow,,19900,terra-flow-v3,Terra Flow III,https://img/4.jpg,false\r\n"
+).encode()
+
+def test_csv_rows_are_grouped_into_themes():
+    items = collect(iter_csv_themes(iter_lines(byte_chunks(CSV_UPLOAD))))
+
+    (line, terra), (_, veins), (error_line, error) = items
+    assert line == 2
+    assert terra["description"] == "Earth and\nwater"
+    assert [v["id"] for v in terra["variants"]] == ["terra-flow-v1", "terra-flow-v2"]
+    assert [v["featured"] for v in terra["variants"]] == [True, False]
+    assert veins["variants"][0]["featured"] is True
+    # The quoted newline makes the last record start on line 6
+    assert isinstance(error, RowError) and error_line == 6
+
+def test_ndjson_reports_bad_lines():
+    upload = b'{"theme_id": "a"}\n\nnot json\n[1, 2]\n{"theme_id": "b"}'
+    items = collect(iter_ndjson_themes(iter_lines(byte_chunks(upload))))
+
+    assert [line for line, _ in items] == [1, 3, 4, 5]
+    assert [isinstance(item, RowError) for _, item in items] == [False, True, True, False]
+
+def test_import_upserts_in_chunks(mongo_db_name):
+    motor = pytest.importorskip("motor.motor_asyncio")
+
+    def build_document(raw):
+        if "theme" not in raw:
+            raise ValueError("theme is required")
+        return dict(raw)
+
+    themes = [{"theme_id": f"t{i}", "theme": f"Theme {i}", "variants": []} for i in range(7)]
+    themes.insert(3, {"theme_id": "broken"})
+    upload = "\n".join(json.dumps(theme) for theme in themes).encode()
+
+    async def run():
+        client = motor.AsyncIOMotorClient(TEST_MONGO_URL)
+        collection = client[mongo_db_name].print_themes
+        await collection.create_index("theme_id", unique=True)
+        await collection.insert_one({"theme_id": "t0", "theme": "Old", "variants": []})
+        chunks = []
+        try:
+            report = await import_catalog(
+                MongoThemeRepository(collection),
+                iter_ndjson_themes(iter_lines(byte_chunks(upload))),
+                build_document,
+                chunk_size=3,
+                on_chunk=chunks.append
+            )
+            return report, chunks, await collection.count_documents({}), await collection.find_one({"theme_id": "t0"})
+        finally:
+            client.close()
+
+    report, chunks, count, t0 = asyncio.run(run())
+    assert report["stats"]["inserted"] == 6 and report["stats"]["updated"] == 1
+    assert report["errors"] == [{"line": 4, "theme_id": "broken", "error": "theme is required"}]
+    assert [len(chunk) for chunk in chunks] == [3, 3, 1]
+    assert count == 7 and t0["theme"] == "Theme 0"
@@ -0,0 +1,116 @@
+import asyncio
+import socket
+import socketserver
+import threading
+from datetime import datetime
+from email import message_from_bytes
+
+import pytest
+
+from email_outbox import SENT, OutboxWorker, SmtpSender, enqueue_order_confirmation
+from tests.conftest import TEST_MONGO_URL
+
+class SmtpSinkHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP to accept messages and record them"""
+
+    def reply(self, line: str):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply("220 sink ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                self.reply("250 sink")
+            elif command == "DATA":
+                self.reply("354 end with .")
+                data = b""
+                while True:
+                    chunk = self.rfile.readline()
+                    if chunk == b".\r\n":
+                        break
+                    data += chunk
+                self.server.messages.append(message_from_bytes(data))
+                self.reply("250 queued")
+            elif command == "QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("250 ok")
+
+@pytest.fixture
+def smtp_sink():
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), SmtpSinkHandler)
+    server.daemon_threads = True
+    server.connections = 0
+    server.messages = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def make_order(number: str, email: str = "buyer@example.com"):
+    return {
+        "_id": f"order-{number}",
+        "order_number": number,
+        "items": [{"theme_id": "terra-flow", "quantity": 2, "total_price": 39800}],
+        "total": 39800,
+        "customer_info": {"customer_email": email},
+    }
+
+def test_send_batch_reuses_one_connection(smtp_sink):
+    sender = SmtpSender("127.0.0.1", smtp_sink.server_address[1])
+    messages = [
+        {"_id": f"m{i}", "to": f"buyer{i}@example.com", "subject": f"Order {i}", "body": "Thanks"}
+        for i in range(5)
+    ]
+
+    first = sender.send_batch(messages[:3], now=0.0)
+    second = sender.send_batch(messages[3:], now=1.0)
+    sender.close()
+
+    assert set(first.values()) == {None} and set(second.values()) == {None}
+    assert [m["Subject"] for m in smtp_sink.messages] == [f"Order {i}" for i in range(5)]
+    assert smtp_sink.connections == 1
+
+def test_send_batch_reports_unreachable_server():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+
+    sender = SmtpSender("127.0.0.1", port, timeout=1.0)
+    results = sender.send_batch([{"_id": "m1", "to": "a@example.com", "subject": "s", "body": "b"}], now=0.0)
+
+    assert results["m1"] is not None
+
+def test_outbox_worker_sends_each_order_once(mongo_db_name, smtp_sink):
+    motor = pytest.importorskip("motor.motor_asyncio")
+
+    async def run():
+        client = motor.AsyncIOMotorClient(TEST_MONGO_URL)
+        outbox = client[mongo_db_name].email_outbox
+        worker = OutboxWorker(outbox, SmtpSender("127.0.0.1", smtp_sink.server_address[1]), batch_size=2)
+        try:
+            for number in ("DN-1", "DN-2", "DN-3"):
+                assert await enqueue_order_confirmation(outbox, make_order(number))
+            # Retried payment processing must not queue a second email
+            assert not await enqueue_order_confirmation(outbox, make_order("DN-1"))
+            assert not await enqueue_order_confirmation(outbox, make_order("DN-4", email=""))
+
+            assert await worker.run_once() == 2
+            assert await worker.run_once() == 1
+            assert await worker.run_once() == 0
+            return await outbox.find({}, {"status": 1, "sent_at": 1}).to_list(None)
+        finally:
+            await worker.stop()
+            client.close()
+
+    records = asyncio.run(run())
+    assert len(records) == 3
+    assert all(r["status"] == SENT and isinstance(r["sent_at"], datetime) for r in records)
+    assert sorted(m["To"] for m in smtp_sink.messages) == ["buyer@example.com"] * 3
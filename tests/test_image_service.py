@@ -0,0 +1,93 @@
+import asyncio
+import io
+import os
+import time
+
+import httpx
+import pytest
+
+from image_service import ImageService
+
+def service(tmp_path, handler, max_source_bytes=1024):
+    images = ImageService(
+        tmp_path, max_cache_bytes=10 * 1024 * 1024, max_source_bytes=max_source_bytes,
+        allowed_hosts=["cdn.example.com"]
+    )
+    images._http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return images
+
+def test_only_allowlisted_hosts_are_accepted(tmp_path):
+    images = ImageService(tmp_path, max_cache_bytes=0, allowed_hosts=["CDN.example.com"])
+    assert images.is_allowed_source("https://cdn.example.com/prints/terra.jpg")
+    assert images.is_allowed_source("prints/terra.jpg")
+    for src in (
+        "http://169.254.169.254/latest/meta-data/",
+        "http://localhost:27017/",
+        "https://cdn.example.com.evil.test/x.jpg",
+        "https://evil.test@127.0.0.1/x.jpg",
+        "file:///etc/passwd",
+        "//internal/x.jpg",
+    ):
+        assert not images.is_allowed_source(src), src
+
+def test_oversize_sources_are_abandoned_mid_stream(tmp_path):
+    sent = []
+
+    async def body():
+        for _ in range(100):
+            sent.append(1)
+            yield b"x" * 256
+
+    images = service(tmp_path, lambda request: httpx.Response(200, content=body()))
+    with pytest.raises(ValueError, match="too large"):
+        asyncio.run(images.generate("https://cdn.example.com/huge.jpg"))
+    assert len(sent) < 10
+
+    declared = service(tmp_path, lambda request: httpx.Response(200, headers={"Content-Length": "4096"}))
+    with pytest.raises(ValueError, match="too large"):
+        asyncio.run(declared.generate("https://cdn.example.com/declared.jpg"))
+
+def test_redirects_are_not_followed(tmp_path):
+    def handler(request):
+        if request.url.host == "cdn.example.com":
+            return httpx.Response(302, headers={"Location": "http://169.254.169.254/latest/"})
+        raise AssertionError(f"followed redirect to {request.url}")
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(service(tmp_path, handler).generate("https://cdn.example.com/moved.jpg"))
+
+def test_replaced_artwork_is_picked_up_once_the_ref_expires(tmp_path):
+    image = pytest.importorskip("PIL.Image")
+
+    def png(color):
+        buffer = io.BytesIO()
+        image.new("RGB", (400, 200), color).save(buffer, "PNG")
+        return buffer.getvalue()
+
+    artwork = {"body": png("red")}
+
+    async def run():
+        images = ImageService(
+            tmp_path, max_cache_bytes=10 * 1024 * 1024, allowed_hosts=["cdn.example.com"], ref_ttl=60
+        )
+        await images.start()
+        serve = lambda request: httpx.Response(200, content=artwork["body"])
+        images._http = httpx.AsyncClient(transport=httpx.MockTransport(serve))
+        try:
+            src = "https://cdn.example.com/terra.jpg"
+            _, first = await images.get_derivative(src, 320, "webp")
+            artwork["body"] = png("blue")
+            _, cached = await images.get_derivative(src, 320, "webp")
+
+            # Age the ref past ref_ttl
+            ref = images._ref_path(src)
+            stale = time.time() - 120
+            os.utime(ref, (stale, stale))
+            _, refreshed = await images.get_derivative(src, 320, "webp")
+            return first, cached, refreshed
+        finally:
+            await images.close()
+
+    first, cached, refreshed = asyncio.run(run())
+    assert cached == first
+    assert refreshed != first
@@ -0,0 +1,78 @@
+import asyncio
+import math
+import re
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("motor")
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from tests.conftest import TEST_MONGO_URL
+from order_numbers import OrderNumberAllocator
+
+ORDER_NUMBER_PATTERN = re.compile(r"^DN-\d{8}-\d{6}$")
+
+async def allocate(db_name, count, block_size, concurrency=10):
+    """Allocate count numbers through one allocator, like one worker would"""
+    client = AsyncIOMotorClient(TEST_MONGO_URL)
+    try:
+        allocator = OrderNumberAllocator(client[db_name].counters, block_size=block_size)
+        numbers = []
+
+        async def shopper(share):
+            for _ in range(share):
+                numbers.append(await allocator.next())
+
+        await asyncio.gather(*(shopper(count // concurrency) for _ in range(concurrency)))
+        return numbers, allocator.leases
+    finally:
+        client.close()
+
+def allocate_in_worker(db_name, count, block_size):
+    return asyncio.run(allocate(db_name, count, block_size))
+
+def test_numbers_are_formatted_and_sortable(mongo_db_name):
+    numbers, leases = asyncio.run(allocate(mongo_db_name, 120, block_size=50))
+
+    assert all(ORDER_NUMBER_PATTERN.match(number) for number in numbers)
+    assert numbers == sorted(numbers)
+    assert leases == math.ceil(120 / 50)
+
+def test_sequence_restarts_each_day(mongo_db_name):
+    async def run():
+        client = AsyncIOMotorClient(TEST_MONGO_URL)
+        try:
+            allocator = OrderNumberAllocator(client[mongo_db_name].counters, block_size=10)
+            first = await allocator.next(datetime(2025, 10, 17, 23, 59))
+            second = await allocator.next(datetime(2025, 10, 18, 0, 1))
+            return first, second, allocator.leases
+        finally:
+            client.close()
+
+    first, second, leases = asyncio.run(run())
+
+    assert first == "DN-20251017-000001"
+    assert second == "DN-20251018-000001"
+    assert leases == 2
+
+def test_concurrent_workers_never_collide(mongo_db_name):
+    workers, per_worker, block_size = 4, 200, 25
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(
+            allocate_in_worker,
+            [mongo_db_name] * workers,
+            [per_worker] * workers,
+            [block_size] * workers
+        ))
+
+    numbers = [number for worker_numbers, _ in results for number in worker_numbers]
+    assert len(numbers) == workers * per_worker
+    assert len(set(numbers)) == len(numbers)
+
+    # One round-trip per block, never per order
+    for _, leases in results:
+        assert leases == per_worker // block_size
@@ -0,0 +1,48 @@
+import asyncio
+import time
+from collections import Counter
+
+from profiling import ProfileStore, ProfilingMiddleware
+
+async def slow_app(scope, receive, send):
+    time.sleep(0.05)
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+def call(middleware, headers=()):
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": "/api/prints", "headers": list(headers)}
+    asyncio.run(middleware(scope, receive, send))
+    return dict(sent[0]["headers"])
+
+def test_store_keeps_newest_profiles(tmp_path):
+    store = ProfileStore(tmp_path, max_profiles=2)
+    ids = [f"{1000 + i}-0000000{i}" for i in range(3)]
+    for profile_id in ids:
+        store.save(profile_id, Counter({"main;handler": 3}), {"path": "/"})
+
+    assert [p["id"] for p in store.list()] == ids[:0:-1]
+    assert store.path(ids[0]) is None
+    assert store.path(ids[2]).read_text() == "main;handler 3\n"
+    assert store.path("../../etc/passwd") is None
+
+def test_only_requests_with_the_token_are_profiled(tmp_path):
+    store = ProfileStore(tmp_path)
+    middleware = ProfilingMiddleware(slow_app, store=store, token="secret", interval=0.001)
+
+    assert b"x-profile-id" not in call(middleware)
+    assert b"x-profile-id" not in call(middleware, [(b"x-profile-token", b"wrong")])
+    headers = call(middleware, [(b"x-profile-token", b"secret")])
+
+    profile_id = headers[b"x-profile-id"].decode()
+    [profile] = store.list()
+    assert (profile["id"], profile["path"], profile["status"]) == (profile_id, "/api/prints", 200)
+    assert profile["samples"] > 0
+    assert "slow_app" in store.path(profile_id).read_text()
@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+from query_log import SlowQueryLog, query_shape, redact, shape_id, summarize_plan
+from tests.conftest import TEST_MONGO_URL
+
+def test_shapes_redact_values_but_keep_structure():
+    first = query_shape("find", {
+        "find": "orders",
+        "filter": {"session_id": "sess_a", "status": {"$in": ["paid", "shipped"]}},
+        "sort": {"created_at": -1},
+    })
+    second = query_shape("find", {
+        "find": "orders",
+        "filter": {"session_id": "sess_b", "status": {"$in": ["paid"]}},
+        "sort": {"created_at": -1},
+    })
+    assert first == {"filter": {"session_id": "?", "status": {"$in": ["?"]}}, "sort": {"created_at": -1}}
+    assert shape_id("find", "orders", first) == shape_id("find", "orders", second)
+    assert shape_id("find", "orders", first) != shape_id("find", "payment_transactions", first)
+
+    update = query_shape("update", {"update": "carts", "updates": [{"q": {"_id": "s1"}, "u": {"$set": {"x": 1}}}]})
+    assert update == {"filter": {"_id": "?"}}
+    assert redact([{"a": 1}, {"a": 2}, {"b": 3}]) == [{"a": "?"}, {"b": "?"}]
+
+def test_plan_summary_flags_collection_scans_and_sorts():
+    explain = {"queryPlanner": {"winningPlan": {
+        "stage": "SORT",
+        "inputStage": {"stage": "COLLSCAN"},
+    }}}
+    assert summarize_plan(explain) == {
+        "stages": ["SORT", "COLLSCAN"], "indexes": [], "collscan": True, "in_memory_sort": True
+    }
+
+    indexed = {"stages": [{"$cursor": {"queryPlanner": {"winningPlan": {
+        "stage": "FETCH",
+        "inputStage": {"stage": "IXSCAN", "indexName": "session_id_1"},
+    }}}}]}
+    summary = summarize_plan(indexed)
+    assert summary["indexes"] == ["session_id_1"] and not summary["collscan"]
+
+def test_slow_commands_are_logged_with_their_plan(mongo_db_name):
+    motor = pytest.importorskip("motor.motor_asyncio")
+
+    async def run():
+        slow_query_log = SlowQueryLog(threshold_ms=0.001)
+        client = motor.AsyncIOMotorClient(TEST_MONGO_URL, event_listeners=[slow_query_log])
+        db = client[mongo_db_name]
+        await slow_query_log.start(client, db)
+        try:
+            await db.widgets.insert_many([{"sku": f"w{i}", "secret": i} for i in range(50)])
+            await db.widgets.find_one({"secret": 7})
+            await db.widgets.find_one({"secret": 8})
+            for _ in range(50):
+                if len(await slow_query_log.recent()) >= 2:
+                    break
+                await asyncio.sleep(0.05)
+            return await slow_query_log.recent(collection="widgets")
+        finally:
+            await slow_query_log.stop()
+            client.close()
+
+    newest, oldest = asyncio.run(run())
+    assert oldest["shape"] == {"filter": {"secret": "?"}}
+    assert oldest["shape_id"] == newest["shape_id"]
+    assert oldest["plan"]["collscan"]
+    # Only the first occurrence of a shape is explained
+    assert "plan" not in newest
@@ -0,0 +1,295 @@
+"""
+Query plans of the API's MongoDB queries against the indexes in init_db.py.
+
+The real repositories, cart stores, outbox worker, idempotency store, order
+number allocator and rollup reader run against a seeded database while a
+command listener captures what they send. Each distinct query shape is then
+explained; the test fails if a plan scans a collection or sorts in memory,
+or if a read examines far more documents than it returns. Run with -s for
+the full report.
+"""
+
+import asyncio
+import random
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from fastapi.responses import Response
+from pymongo import monitoring
+
+from query_log import MONITORED_COMMANDS, explain_command, query_shape, shape_id, summarize_plan
+from tests.conftest import TEST_MONGO_URL
+
+NOW = datetime(2026, 6, 1)
+SESSIONS = [f"sess_{i:04d}" for i in range(500)]
+THEMES = [f"theme-{i:03d}" for i in range(200)]
+ORDER_STATUSES = ["processing", "shipped", "delivered", "cancelled"]
+
+# Reads may examine this many documents per document returned
+MAX_EXAMINED_RATIO = 2.0
+
+# Listings that read a whole collection on purpose
+FULL_LISTINGS = {"print_themes", "page_content"}
+
+# Filters applied on top of an indexed range; the export reads the whole range
+RESIDUAL_FILTERS = {("orders", "status")}
+
+class CommandRecorder(monitoring.CommandListener):
+    """Keeps every monitored command sent while recording is on"""
+
+    def __init__(self):
+        self.recording = False
+        self.commands = []
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        if self.recording and event.command_name in MONITORED_COMMANDS:
+            with self._lock:
+                self.commands.append((event.command_name, event.command.get(event.command_name), event.command))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+class AcceptingSender:
+    """Stands in for SMTP so the outbox worker claims and completes a batch"""
+
+    def send_batch(self, messages, now):
+        return {message["_id"]: None for message in messages}
+
+def seed_documents(rng: random.Random):
+    """A few thousand documents per collection, shaped like production data"""
+    themes = [
+        {
+            "theme_id": theme_id,
+            "theme": theme_id.title(),
+            "description": "",
+            "base_price": 19900,
+            "variants": [
+                {"id": f"{theme_id}-v{v}", "name": f"V{v}", "image_url": f"https://img/{theme_id}/{v}.jpg",
+                 "featured": v == 1}
+                for v in range(1, 5)
+            ],
+        }
+        for theme_id in THEMES
+    ]
+    cart_items = [
+        {
+            "_id": ObjectId(),
+            "session_id": rng.choice(SESSIONS),
+            "theme_id": rng.choice(THEMES),
+            "selected_variants": [],
+            "quantity": 1,
+            "unit_price": 19900,
+            "total_price": 19900,
+            "created_at": NOW,
+            "updated_at": NOW,
+        }
+        for _ in range(5000)
+    ]
+    carts = [{"_id": session_id, "items": [], "updated_at": NOW} for session_id in SESSIONS]
+    payments = [
+        {
+            "payment_id": f"cs_{i:05d}",
+            "session_id": rng.choice(SESSIONS),
+            "cart_hash": f"{rng.getrandbits(32):08x}",
+            "status": rng.choice(["pending", "open", "completed", "expired"]),
+            "created_at": NOW - timedelta(minutes=i),
+            "expires_at": NOW - timedelta(minutes=i) + timedelta(hours=1),
+        }
+        for i in range(5000)
+    ]
+    orders = [
+        {
+            "_id": ObjectId(),
+            "order_number": f"DN-{i:06d}",
+            "session_id": payments[i]["session_id"],
+            "payment_transaction_id": payments[i]["payment_id"],
+            "status": rng.choice(ORDER_STATUSES),
+            "items": [{"theme_id": rng.choice(THEMES), "quantity": 1, "total_price": 19900}],
+            "subtotal": 19900,
+            "total": 19900,
+            "created_at": NOW - timedelta(minutes=i * 7),
+        }
+        for i in range(5000)
+    ]
+    rollups = [
+        {"day": (NOW - timedelta(days=d)).date().isoformat(), "theme_id": theme_id, "revenue": 0, "quantity": 0, "orders": 0}
+        for d in range(365) for theme_id in THEMES[:20]
+    ]
+    outbox = [
+        {
+            "_id": f"order_confirmation:{i}",
+            "status": rng.choice(["pending", "sending", "sent", "sent", "sent", "failed"]),
+            "attempts": 0,
+            "next_attempt_at": NOW - timedelta(minutes=rng.randrange(10000)),
+            "lease_expires_at": NOW + timedelta(days=3650),
+        }
+        for i in range(2000)
+    ]
+    pages = [{"page_id": f"page-{i}", "title": f"Page {i}"} for i in range(20)]
+    idempotency = [
+        {"_id": f"cart_add:sess_0001:key-{i}", "status": "completed", "fingerprint": "f", "created_at": NOW}
+        for i in range(1000)
+    ]
+    counters = [{"_id": f"order_number:{(NOW - timedelta(days=d)):%Y%m%d}", "value": 50} for d in range(365)]
+    return {
+        "print_themes": themes,
+        "cart_items": cart_items,
+        "carts": carts,
+        "payment_transactions": payments,
+        "orders": orders,
+        "sales_rollups": rollups,
+        "email_outbox": outbox,
+        "page_content": pages,
+        "idempotency_keys": idempotency,
+        "counters": counters,
+    }
+
+async def exercise(db, seeded):
+    """Run every MongoDB-backed data access path the endpoints use"""
+    from cart_store import EmbeddedCartStore, LineCartStore
+    from email_outbox import OutboxWorker
+    from idempotency import IdempotencyStore
+    from order_numbers import OrderNumberAllocator
+    from repositories import Repositories
+    from sales_rollups import apply_order_to_rollups, read_rollups
+
+    repos = Repositories.mongo(db)
+    payment = seeded["payment_transactions"][42]
+    order = seeded["orders"][42]
+    session_id = seeded["cart_items"][0]["session_id"]
+
+    await repos.themes.list_all()
+    await repos.themes.list_all({"_id": 0, "theme_id": 1, "variants.image_url": 1})
+    await repos.themes.list_featured(3)
+    await repos.themes.get("theme-007")
+    await repos.themes.get("theme-007", {"_id": 0, "theme": 1})
+    await repos.themes.get_many(THEMES[:5], {"_id": 0, "theme_id": 1, "variants.id": 1})
+    await repos.themes.update("theme-007", {"theme": "Renamed"})
+    await repos.themes.update_variant("theme-007", "theme-007-v2", {"featured": True})
+    await repos.themes.bulk_upsert([dict(seeded["print_themes"][8]), {**seeded["print_themes"][9], "theme": "New"}])
+    await repos.themes.delete("theme-199")
+
+    for store in (LineCartStore(db.cart_items), EmbeddedCartStore(db.carts)):
+        item = {"_id": ObjectId(), "session_id": session_id, "theme_id": "theme-001", "quantity": 1,
+                "total_price": 19900, "created_at": NOW, "updated_at": NOW}
+        await store.get_items(session_id)
+        await store.add_item(session_id, item)
+        await store.remove_item(session_id, item["_id"])
+        await store.clear(SESSIONS[-1])
+
+    await repos.payments.get(payment["payment_id"])
+    await repos.payments.find_open(payment["session_id"], payment["cart_hash"], NOW)
+    await repos.payments.update_status(payment["payment_id"], {"status": "completed"})
+
+    await repos.orders.get_by_payment(order["payment_transaction_id"])
+    await repos.orders.list_for_session(order["session_id"])
+    await repos.orders.list_for_session(order["session_id"], {"_id": 0, "order_number": 1})
+    await repos.orders.claim_rollups(order["_id"])
+    await repos.orders.release_rollups(order["_id"])
+    await repos.orders.mark_cart_cleared(order["_id"])
+    window = {"start": NOW - timedelta(days=7), "end": NOW - timedelta(days=6)}
+    async for _ in repos.orders.iter_orders(**window):
+        pass
+    async for _ in repos.orders.iter_orders(status="shipped", **window):
+        pass
+
+    await repos.pages.get("page-3")
+    await repos.pages.list_all()
+    await repos.pages.upsert("page-3", {"title": "Updated"})
+
+    await apply_order_to_rollups(db, order)
+    await read_rollups(db, NOW.date() - timedelta(days=30), NOW.date())
+    await read_rollups(db, NOW.date() - timedelta(days=30), NOW.date(), theme_id="theme-003")
+
+    await OutboxWorker(db.email_outbox, AcceptingSender(), batch_size=5).run_once()
+
+    async def execute():
+        return Response(b"{}", media_type="application/json")
+
+    idempotency = IdempotencyStore(db.idempotency_keys)
+    await idempotency.run("cart_add:sess_0001", "key-new", "f", execute)
+    await idempotency.run("cart_add:sess_0001", "key-new", "f", execute)
+
+    await OrderNumberAllocator(db.counters).next(NOW)
+
+def is_full_listing(collection, shape):
+    if collection not in FULL_LISTINGS:
+        return False
+    if "pipeline" in shape:
+        return not any("$match" in stage for stage in shape["pipeline"])
+    return not shape.get("filter")
+
+def execution_stats(explain):
+    stats = explain.get("executionStats")
+    if stats is None:
+        for stage in explain.get("stages", []):
+            stats = stage.get("$cursor", {}).get("executionStats")
+            if stats:
+                break
+    return stats or {}
+
+def test_queries_use_indexes(mongo_db_name, capsys):
+    motor = pytest.importorskip("motor.motor_asyncio")
+    from init_db import create_indexes
+
+    recorder = CommandRecorder()
+
+    async def explain_all():
+        client = motor.AsyncIOMotorClient(TEST_MONGO_URL, event_listeners=[recorder])
+        db = client[mongo_db_name]
+        try:
+            await create_indexes(db)
+            seeded = seed_documents(random.Random(48))
+            for collection, documents in seeded.items():
+                await db[collection].insert_many(documents)
+
+            recorder.recording = True
+            await exercise(db, seeded)
+            recorder.recording = False
+
+            results, seen = [], set()
+            for command_name, collection, command in recorder.commands:
+                shape = query_shape(command_name, command)
+                key = shape_id(command_name, collection, shape)
+                if key in seen:
+                    continue
+                seen.add(key)
+                explain = await db.command(explain_command(command, verbosity="executionStats"))
+                results.append((command_name, collection, shape, summarize_plan(explain), execution_stats(explain)))
+            return results, set(seeded)
+        finally:
+            client.close()
+
+    results, collections = asyncio.run(explain_all())
+    # Every seeded collection must have been queried by the exercise
+    assert {collection for _, collection, *_ in results} == collections
+
+    failures, report = [], []
+    for command_name, collection, shape, plan, stats in results:
+        name = f"{collection}.{command_name} {shape}"
+        examined = stats.get("totalDocsExamined", 0)
+        returned = stats.get("nReturned", 0)
+        ratio = examined / max(returned, 1)
+        report.append(
+            f"{collection + '.' + command_name:<36} {'>'.join(plan['stages']):<32} "
+            f"{','.join(plan['indexes']) or '-':<40} examined={examined} returned={returned} ratio={ratio:.2f}"
+        )
+        if is_full_listing(collection, shape):
+            continue
+        if plan["collscan"]:
+            failures.append(f"{name}: collection scan")
+        if plan["in_memory_sort"]:
+            failures.append(f"{name}: in-memory sort")
+        residual = any((collection, field) in RESIDUAL_FILTERS for field in shape.get("filter") or {})
+        if command_name in ("find", "aggregate", "count", "distinct") and ratio > MAX_EXAMINED_RATIO and not residual:
+            failures.append(f"{name}: examined {examined} documents for {returned} returned")
+
+    with capsys.disabled():
+        print("\nQuery plans:\n" + "\n".join(report))
+    assert not failures, "\n".join(failures + [""] + report)
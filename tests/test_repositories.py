@@ -0,0 +1,176 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+
+from repositories import Repositories, repositories_from_env
+from tests.conftest import TEST_MONGO_URL
+
+@pytest.fixture(params=["memory", "mongo"])
+def run_with_repositories(request):
+    """Run an async test body against each repository backend"""
+    if request.param == "memory":
+        return lambda body: asyncio.run(body(Repositories.memory()))
+
+    motor = pytest.importorskip("motor.motor_asyncio")
+    db_name = request.getfixturevalue("mongo_db_name")
+
+    def run(body):
+        async def with_mongo():
+            client = motor.AsyncIOMotorClient(TEST_MONGO_URL)
+            db = client[db_name]
+            await db.print_themes.create_index("theme_id", unique=True)
+            await db.orders.create_index("payment_transaction_id", unique=True)
+            try:
+                await body(Repositories.mongo(db))
+            finally:
+                client.close()
+        asyncio.run(with_mongo())
+    return run
+
+class FakeDatabase:
+    """Hands out collection names; enough to wire up the Mongo backend"""
+
+    def __getattr__(self, name):
+        return name
+
+@pytest.mark.parametrize("cart_store", ["lines", "embedded"])
+def test_mongo_backend_can_be_built_without_a_server(monkeypatch, cart_store):
+    monkeypatch.setenv("REPOSITORY_BACKEND", "mongo")
+    monkeypatch.setenv("CART_STORE", cart_store)
+    repos = repositories_from_env(FakeDatabase())
+    assert (repos.themes.collection, repos.payments.collection) == ("print_themes", "payment_transactions")
+    assert (repos.orders.collection, repos.pages.collection) == ("orders", "page_content")
+    assert repos.carts.collection == {"lines": "cart_items", "embedded": "carts"}[cart_store]
+
+def theme(theme_id: str, variant_count: int = 3):
+    return {
+        "theme_id": theme_id,
+        "theme": theme_id.title(),
+        "description": "",
+        "base_price": 19900,
+        "variants": [
+            {"id": f"{theme_id}-v{i}", "name": f"V{i}", "image_url": f"https://img/{i}.jpg", "featured": i == 1}
+            for i in range(1, variant_count + 1)
+        ],
+    }
+
+def order(session_id: str, payment_id: str, created_at: datetime, status: str = "processing"):
+    return {
+        "_id": ObjectId(),
+        "order_number": payment_id,
+        "session_id": session_id,
+        "payment_transaction_id": payment_id,
+        "items": [],
+        "status": status,
+        "created_at": created_at,
+    }
+
+def test_themes(run_with_repositories):
+    async def body(repos):
+        created = await repos.themes.create(theme("terra-flow"))
+        assert created["_id"]
+        assert (await repos.themes.get("terra-flow"))["theme"] == "Terra-Flow"
+
+        updated = await repos.themes.update_variant("terra-flow", "terra-flow-v3", {"featured": True})
+        assert [v["featured"] for v in updated["variants"]] == [False, False, True]
+        assert await repos.themes.update_variant("terra-flow", "missing", {"name": "x"}) is None
+
+        result = await repos.themes.bulk_upsert([theme("terra-flow", 1), theme("mineral-veins")])
+        assert (result["inserted"], result["updated"], result["errors"]) == (1, 1, [])
+        assert len((await repos.themes.get("terra-flow"))["variants"]) == 1
+        assert {t["theme_id"] for t in await repos.themes.get_many(["mineral-veins", "nope"])} == {"mineral-veins"}
+
+        assert await repos.themes.delete("terra-flow")
+        assert not await repos.themes.delete("terra-flow")
+        assert [t["theme_id"] for t in await repos.themes.list_all()] == ["mineral-veins"]
+
+    run_with_repositories(body)
+
+def test_renaming_a_theme_moves_it_to_the_new_id(run_with_repositories):
+    async def body(repos):
+        await repos.themes.create(theme("terra-flow"))
+        await repos.themes.create(theme("mineral-veins"))
+
+        renamed = await repos.themes.update("terra-flow", {"theme_id": "terra-flux"})
+        assert renamed["theme_id"] == "terra-flux"
+        assert await repos.themes.get("terra-flow") is None
+        assert (await repos.themes.get("terra-flux"))["theme"] == "Terra-Flow"
+
+        with pytest.raises(DuplicateKeyError):
+            await repos.themes.update("terra-flux", {"theme_id": "mineral-veins"})
+        assert {t["theme_id"] for t in await repos.themes.list_all()} == {"terra-flux", "mineral-veins"}
+
+    run_with_repositories(body)
+
+def test_orders(run_with_repositories):
+    async def body(repos):
+        now = datetime(2026, 1, 1)
+        first = order("s1", "cs_1", now)
+        await repos.orders.create(first)
+        await repos.orders.create(order("s1", "cs_2", now + timedelta(hours=1), status="shipped"))
+        await repos.orders.create(order("s2", "cs_3", now + timedelta(hours=2)))
+        with pytest.raises(DuplicateKeyError):
+            await repos.orders.create(order("s1", "cs_1", now))
+
+        assert [o["payment_transaction_id"] for o in await repos.orders.list_for_session("s1")] == ["cs_2", "cs_1"]
+        assert await repos.orders.claim_rollups(first["_id"])
+        assert not await repos.orders.claim_rollups(first["_id"])
+        await repos.orders.release_rollups(first["_id"])
+        assert await repos.orders.claim_rollups(first["_id"])
+
+        exported = [o["payment_transaction_id"] async for o in repos.orders.iter_orders(status="processing")]
+        assert exported == ["cs_1", "cs_3"]
+        windowed = [o["payment_transaction_id"] async for o in repos.orders.iter_orders(start=now + timedelta(minutes=1))]
+        assert windowed == ["cs_2", "cs_3"]
+
+    run_with_repositories(body)
+
+def test_payments_and_pages(run_with_repositories):
+    async def body(repos):
+        now = datetime.utcnow()
+        for index, expires_in in enumerate((60, 60, -60)):
+            await repos.payments.create({
+                "payment_id": f"cs_{index}",
+                "session_id": "s1",
+                "cart_hash": "abc",
+                "status": "pending",
+                "created_at": now + timedelta(seconds=index),
+                "expires_at": now + timedelta(seconds=expires_in),
+            })
+        assert (await repos.payments.find_open("s1", "abc", now))["payment_id"] == "cs_1"
+        await repos.payments.update_status("cs_1", {"status": "completed"})
+        assert (await repos.payments.find_open("s1", "abc", now))["payment_id"] == "cs_0"
+        assert await repos.payments.find_open("s1", "other", now) is None
+
+        page = await repos.pages.upsert("about", {"title": "About"})
+        page = await repos.pages.upsert("about", {"body": "Hello"})
+        assert (page["page_id"], page["title"], page["body"]) == ("about", "About", "Hello")
+        assert [p["page_id"] for p in await repos.pages.list_all()] == ["about"]
+
+    run_with_repositories(body)
+
+def test_projections_and_featured_summaries(run_with_repositories):
+    async def body(repos):
+        await repos.themes.create(theme("terra-flow"))
+        await repos.themes.create({**theme("mineral-veins"), "variants": [
+            {"id": "mv-1", "name": "V1", "image_url": "https://img/mv.jpg", "featured": False}
+        ]})
+
+        themes = await repos.themes.list_all({"_id": 0, "theme_id": 1, "variants.id": 1})
+        assert themes[0] == {"theme_id": "terra-flow", "variants": [{"id": f"terra-flow-v{i}"} for i in (1, 2, 3)]}
+        assert set(await repos.themes.get("terra-flow", {"theme": 1})) == {"_id", "theme"}
+
+        featured = await repos.themes.list_featured()
+        assert featured[0]["variant"] == {"id": "terra-flow-v1", "name": "V1", "image_url": "https://img/1.jpg"}
+        # Themes without a featured variant fall back to their first one
+        assert featured[1]["variant"]["id"] == "mv-1"
+        assert set(featured[1]) == {"theme_id", "theme", "description", "base_price", "variant"}
+        assert len(await repos.themes.list_featured(limit=1)) == 1
+
+        await repos.orders.create(order("s1", "cs_1", datetime(2026, 1, 1)))
+        assert await repos.orders.list_for_session("s1", {"_id": 0, "status": 1}) == [{"status": "processing"}]
+
+    run_with_repositories(body)
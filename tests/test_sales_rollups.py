@@ -0,0 +1,59 @@
+import asyncio
+from datetime import date, datetime
+
+import pytest
+from pymongo.errors import BulkWriteError
+
+from sales_rollups import ROLLUP_COLLECTION, PartialRollupError, apply_order_to_rollups, read_rollups
+from tests.conftest import TEST_MONGO_URL
+
+ORDER = {
+    "created_at": datetime(2026, 6, 1, 12),
+    "items": [
+        {"theme_id": "terra-flow", "total_price": 39800, "quantity": 2},
+        {"theme_id": "mineral-veins", "total_price": 19900, "quantity": 1},
+        {"theme_id": "terra-flow", "total_price": 19900, "quantity": 1},
+    ],
+}
+
+class FailingRollups:
+    """Rejects the bulk write at one operation, as an ordered write would"""
+
+    def __init__(self, failed_at: int):
+        self.failed_at = failed_at
+        self.requests = []
+
+    async def bulk_write(self, requests, ordered=True):
+        self.requests.append(requests)
+        raise BulkWriteError({"writeErrors": [{"index": self.failed_at, "code": 1, "errmsg": "boom"}]})
+
+def test_order_is_written_in_one_bulk_write_and_partial_failures_are_reported():
+    rollups = FailingRollups(failed_at=1)
+    with pytest.raises(PartialRollupError) as raised:
+        asyncio.run(apply_order_to_rollups({ROLLUP_COLLECTION: rollups}, ORDER))
+    assert len(rollups.requests) == 1 and len(rollups.requests[0]) == 2
+    assert (raised.value.applied, raised.value.missing) == (["terra-flow"], ["mineral-veins"])
+
+    # Nothing was written, so the caller can safely retry
+    with pytest.raises(BulkWriteError):
+        asyncio.run(apply_order_to_rollups({ROLLUP_COLLECTION: FailingRollups(failed_at=0)}, ORDER))
+
+def test_rollups_accumulate_orders(mongo_db_name):
+    motor = pytest.importorskip("motor.motor_asyncio")
+
+    async def run():
+        client = motor.AsyncIOMotorClient(TEST_MONGO_URL)
+        db = client[mongo_db_name]
+        try:
+            await db[ROLLUP_COLLECTION].create_index([("day", 1), ("theme_id", 1)], unique=True)
+            await apply_order_to_rollups(db, ORDER)
+            await apply_order_to_rollups(db, ORDER)
+            return await read_rollups(db, date(2026, 6, 1), date(2026, 6, 1))
+        finally:
+            client.close()
+
+    result = asyncio.run(run())
+    assert result["themes"] == [
+        {"theme_id": "mineral-veins", "revenue": 39800, "quantity": 2, "orders": 2},
+        {"theme_id": "terra-flow", "revenue": 119400, "quantity": 6, "orders": 2},
+    ]
@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+from compression import PrecompressedPayload
+from shared_cache import CacheMetrics, SharedCache, cache_metrics, pack_payload, unpack_payload
+
+def test_payload_round_trip():
+    payload = PrecompressedPayload.from_body(b'{"prints":[]}' * 200)
+    restored = unpack_payload(pack_payload(payload))
+    assert restored == payload
+
+    without_br = PrecompressedPayload(body=b"{}", gzip=b"gz", br=None, etag='"abc def"')
+    assert unpack_payload(pack_payload(without_br)) == without_br
+
+def test_metrics_report_hit_ratio_per_tier():
+    metrics = CacheMetrics()
+    for hit in (True, True, True, False):
+        metrics.record("local", "catalog", hit)
+    metrics.record("shared", "cart", False)
+
+    stats = metrics.stats()
+    assert stats["local"]["catalog"] == {"hits": 3, "misses": 1, "hit_ratio": 0.75}
+    assert stats["shared"]["cart"]["hit_ratio"] == 0.0
+
+def test_writes_make_entries_read_before_them_stale():
+    fakeredis = pytest.importorskip("fakeredis")
+
+    async def run():
+        cache = SharedCache(fakeredis.FakeAsyncRedis())
+        value, version = await cache.get("cart", "s1:plain", "s1")
+        assert value is None
+
+        # A cart write lands between this reader's read and its cache fill
+        await cache.invalidate("cart", "s1", ttl=60)
+        await cache.set("cart", "s1:plain", version, b"stale", ttl=60)
+        value, version = await cache.get("cart", "s1:plain", "s1")
+        assert value is None
+
+        await cache.set("cart", "s1:plain", version, b"fresh", ttl=60)
+        assert (await cache.get("cart", "s1:plain", "s1"))[0] == b"fresh"
+        # Other sessions are unaffected by s1's writes
+        await cache.set("cart", "s2:plain", 0, b"other", ttl=60)
+        await cache.invalidate("cart", "s1", ttl=60)
+        assert (await cache.get("cart", "s1:plain", "s1"))[0] is None
+        assert (await cache.get("cart", "s2:plain", "s2"))[0] == b"other"
+        await cache.close()
+
+    asyncio.run(run())
+    assert cache_metrics.stats()["shared"]["cart"]["hits"] >= 2
+
+def test_unavailable_redis_degrades_to_misses():
+    redis = pytest.importorskip("redis.asyncio")
+
+    async def run():
+        client = redis.from_url("redis://127.0.0.1:1", socket_connect_timeout=0.1)
+        cache = SharedCache(client)
+        assert await cache.get("catalog", "prints", "all") == (None, -1)
+        await cache.set("catalog", "prints", -1, b"x", ttl=60)
+        await cache.invalidate("catalog", "all", ttl=60)
+        await cache.close()
+        return cache.errors
+
+    assert asyncio.run(run()) == 2